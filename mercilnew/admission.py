@@ -0,0 +1,103 @@
+"""
+Admission control for the API: caps in-flight pipeline work, bounds the
+wait queue and rejects fast (429 when the queue is full, 503 when a request
+waited longer than `queue_timeout`) instead of letting latency grow.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_inflight)
+        self._multi_lock = asyncio.Lock()
+        self.inflight = 0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._wait_ms = deque(maxlen=1024)
+
+    async def _acquire(self, weight: int) -> None:
+        if weight == 1:
+            await self._semaphore.acquire()
+            return
+        # จองหลาย slot ทีละตัว โดยให้ request หลาย slot จองได้ทีละราย (สองรายจองค้างคนละครึ่งจะรอกันตลอด)
+        async with self._multi_lock:
+            acquired = 0
+            try:
+                for _ in range(weight):
+                    await self._semaphore.acquire()
+                    acquired += 1
+            except BaseException:
+                for _ in range(acquired):
+                    self._semaphore.release()
+                raise
+
+    def weight_of(self, units: int) -> int:
+        """Slots charged for `units` queries (at most max_inflight, so it can always be admitted)."""
+        return min(max(1, units), self.max_inflight)
+
+    @asynccontextmanager
+    async def slot(self, weight: int = 1):
+        """Hold `weight` in-flight slots (one per query, see weight_of) for the duration of the block."""
+        weight = self.weight_of(weight)
+        start = time.perf_counter()
+        if not self._semaphore.locked() and self.max_inflight - self.inflight >= weight and not self._multi_lock.locked():
+            # มีที่ว่าง: acquire ได้ทันทีไม่ต้องเข้าคิว
+            await self._acquire(weight)
+            self._wait_ms.append(0.0)
+        else:
+            if self.queue_depth >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected(429, "Too many requests queued, please retry later", self.queue_timeout)
+            self.queue_depth += 1
+            try:
+                await asyncio.wait_for(self._acquire(weight), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise AdmissionRejected(503, "Service overloaded, please retry later", self.queue_timeout)
+            finally:
+                self.queue_depth -= 1
+                self._wait_ms.append((time.perf_counter() - start) * 1000)
+
+        self.inflight += weight
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.inflight -= weight
+            for _ in range(weight):
+                self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._wait_ms)
+        return {
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "queue_wait_ms": {
+                "avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0.0,
+                "max": round(waits[-1], 2) if waits else 0.0,
+            },
+        }
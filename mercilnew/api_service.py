@@ -1,27 +1,47 @@
+import asyncio
+import functools
 import logging
 import os
-from typing import Dict, Any, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+# นับ cold start จากตรงนี้ (ก่อน import อื่น ๆ)
+SERVICE_START = time.monotonic()
 
 from fastapi import FastAPI, HTTPException, Security, Depends, status
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 import uvicorn
 from dotenv import load_dotenv
 
 # 1. โหลดตัวแปรจาก .env (บรรทัดนี้สำคัญมาก มันจะไปดึง MERCIL_API_KEY มา)
 load_dotenv()
 
+from admission import AdmissionController, AdmissionRejected
+from geo_index import parse_near
+
 # Import Core Logic
 from search_pipeline import (
     execute_search, 
+    execute_search_batch,
     get_chroma_collection, 
     get_embedding_model, 
+    load_metadata_store,
+    load_retrieval_index,
     EMB_MODEL_NAME, 
     VECTOR_DB_PATH, 
     COLLECTION_NAME, 
+    intent_cache,
+    embedding_cache,
+    warmup,
     logger
 )
 
+IMPORT_MS = round((time.monotonic() - SERVICE_START) * 1000, 1)
+
 # ==========================================
 # 🔐 SECURITY ZONE: ตรวจสอบกุญแจ (Bearer Token)
 # ==========================================
@@ -57,11 +77,121 @@ class SearchRequest(BaseModel):
     query: str
     filters: Dict[str, Any] = {} 
 
+    @field_validator("filters")
+    @classmethod
+    def validate_near(cls, filters: Dict[str, Any]) -> Dict[str, Any]:
+        parse_near(filters)  # near: {lat, lon, radius_m}
+        return filters
+
 class SearchResponse(BaseModel):
     query: str
     intent_detected: Dict[str, Any]
+    intent_source: Optional[str] = None
     results: List[Dict[str, Any]]
+    timings_ms: Dict[str, float] = {}
+
+class SearchBatchRequest(BaseModel):
+    queries: List[SearchRequest]
+    explain: bool = True  # False = ไม่สร้าง RAG summary (summary เป็น null)
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchResponse]
     
+# --- Concurrency / Admission Control ---
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+SEARCH_MAX_INFLIGHT = int(os.getenv("SEARCH_MAX_INFLIGHT", str(SEARCH_WORKERS)))
+if SEARCH_MAX_INFLIGHT > SEARCH_WORKERS:
+    # slot เกินจำนวน thread จะไปรอใน queue ของ executor ซึ่ง queue timeout / metrics มองไม่เห็น
+    logger.warning(f"⚠️ SEARCH_MAX_INFLIGHT={SEARCH_MAX_INFLIGHT} > SEARCH_WORKERS={SEARCH_WORKERS}, using {SEARCH_WORKERS}")
+    SEARCH_MAX_INFLIGHT = SEARCH_WORKERS
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "32"))
+SEARCH_QUEUE_TIMEOUT = float(os.getenv("SEARCH_QUEUE_TIMEOUT", "5"))
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "64"))
+
+admission = AdmissionController(SEARCH_MAX_INFLIGHT, SEARCH_MAX_QUEUE, SEARCH_QUEUE_TIMEOUT)
+
+async def run_in_search_executor(fn, *args, slots: int = 1, **kwargs):
+    """Run blocking pipeline work off the event loop, inside `slots` admission slots."""
+    try:
+        async with admission.slot(slots):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(app.state.search_executor, functools.partial(fn, *args, **kwargs))
+    except AdmissionRejected as e:
+        logger.warning(f"Request rejected ({e.status_code}): {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(int(max(1, e.retry_after)))})
+
+# --- Readiness ---
+class ServiceReadiness:
+    """
+    Progress of the background startup: starting -> loading -> warming_up ->
+    ready, or failed. /healthz only needs the process to be alive, /readyz
+    and the search endpoints need `ready`.
+    """
+
+    def __init__(self):
+        self.status = "starting"
+        self.running: List[str] = []
+        self.error: Optional[str] = None
+        self.startup_ms: Dict[str, float] = {"import": IMPORT_MS}
+        self.warmup_ms: List[float] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def stage(self, name: str, fn, *args):
+        """Run one startup stage and record its duration in startup_ms."""
+        self.running.append(name)
+        start = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            self.startup_ms[name] = round((time.monotonic() - start) * 1000, 1)
+            self.running.remove(name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "running": list(self.running),
+            "error": self.error,
+            "uptime_s": round(time.monotonic() - SERVICE_START, 1),
+            "startup_ms": dict(self.startup_ms),
+            "warmup_ms": list(self.warmup_ms),
+        }
+
+readiness = ServiceReadiness()
+
+def load_service():
+    """Load model and collection (concurrently), the metadata store, then warm up and flip readiness."""
+    try:
+        readiness.status = "loading"
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="startup") as pool:
+            model_future = pool.submit(readiness.stage, "model", get_embedding_model, EMB_MODEL_NAME)
+            collection = readiness.stage("collection", get_chroma_collection, VECTOR_DB_PATH, COLLECTION_NAME)
+            readiness.stage("metadata_store", load_metadata_store, collection)
+            readiness.stage("vector_index", load_retrieval_index, collection)
+            embed_model = model_future.result()
+        app.state.embed_model = embed_model
+        app.state.collection = collection
+
+        readiness.status = "warming_up"
+        readiness.warmup_ms = readiness.stage("warmup", warmup, embed_model, collection)
+        readiness.startup_ms["ready"] = round((time.monotonic() - SERVICE_START) * 1000, 1)
+        readiness.status = "ready"
+        logger.info(f"✅ Service is ready ({readiness.startup_ms['ready']} ms after start, stages ms: {readiness.startup_ms})")
+    except Exception as e:
+        readiness.error = f"{type(e).__name__}: {e}"
+        readiness.status = "failed"
+        logger.error(f"FATAL: Service initialization failed: {e}", exc_info=True)
+
+async def require_ready():
+    if not readiness.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service is not ready ({readiness.status})",
+            headers={"Retry-After": "5"},
+        )
+
 # --- App Init ---
 app = FastAPI(
     title="Mercil AI API",
@@ -72,25 +202,26 @@ app = FastAPI(
 # --- Startup ---
 @app.on_event("startup")
 def startup_event():
-    try:
-        logger.info("Loading Embedding Model and ChromaDB Collection...")
-        app.state.embed_model = get_embedding_model(EMB_MODEL_NAME)
-        app.state.collection = get_chroma_collection(VECTOR_DB_PATH, COLLECTION_NAME)
-        logger.info("Startup complete. Service is ready.")
-    except Exception as e:
-        logger.error(f"FATAL: {e}", exc_info=True)
-        raise RuntimeError("Service initialization failed.")
+    # port เปิดรับ request ทันที (/healthz) ส่วน model / collection โหลดเบื้องหลัง จน /readyz ตอบ 200
+    app.state.search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    logger.info("Loading Embedding Model and ChromaDB Collection in the background...")
+    threading.Thread(target=load_service, name="service-loader", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    app.state.search_executor.shutdown(wait=False, cancel_futures=True)
 
 # --- API Endpoint (LOCKED 🔒) ---
 @app.post("/api/v1/search", 
           response_model=SearchResponse, 
           tags=["Search"],
-          dependencies=[Depends(verify_api_key)]) # <--- บรรทัดนี้คือแม่กุญแจ
+          dependencies=[Depends(verify_api_key), Depends(require_ready)]) # <--- บรรทัดนี้คือแม่กุญแจ
 async def search_endpoint(request: SearchRequest):
     try:
         logger.info(f"Received query: '{request.query}'")
         
-        search_output = execute_search(
+        search_output = await run_in_search_executor(
+            execute_search,
             query=request.query, 
             filters=request.filters,
             embed_model=app.state.embed_model,
@@ -98,10 +229,65 @@ async def search_endpoint(request: SearchRequest):
         )
         return search_output
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal AI Pipeline Error")
+
+@app.post("/api/v1/search/batch",
+          response_model=SearchBatchResponse,
+          tags=["Search"],
+          dependencies=[Depends(verify_api_key), Depends(require_ready)])
+async def search_batch_endpoint(request: SearchBatchRequest):
+    if len(request.queries) > SEARCH_BATCH_MAX:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Batch size exceeds {SEARCH_BATCH_MAX} queries")
+    try:
+        logger.info(f"Received batch of {len(request.queries)} queries")
+
+        # คิด admission ต่อ query: batch ได้ slot เท่าไหร่ก็รัน intent / RAG พร้อมกันได้เท่านั้น
+        slots = admission.weight_of(len(request.queries))
+        search_outputs = await run_in_search_executor(
+            execute_search_batch,
+            slots=slots,
+            queries=[q.query for q in request.queries],
+            filters_list=[q.filters for q in request.queries],
+            embed_model=app.state.embed_model,
+            collection=app.state.collection,
+            concurrency=slots,
+            explain=request.explain
+        )
+        return {"results": search_outputs}
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal AI Pipeline Error")
 
+# --- Probes (ไม่ต้องใช้ API key) ---
+@app.get("/healthz", tags=["Ops"])
+async def healthz():
+    """Liveness: the process serves HTTP. Fails only when initialization failed (restart needed)."""
+    if readiness.status == "failed":
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "failed", "error": readiness.error})
+    return {"status": "alive", "uptime_s": round(time.monotonic() - SERVICE_START, 1)}
+
+@app.get("/readyz", tags=["Ops"])
+async def readyz():
+    """Readiness: model and collection loaded and warmed up."""
+    code = status.HTTP_200_OK if readiness.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=code, content=readiness.snapshot())
+
+@app.get("/api/v1/metrics", tags=["Ops"], dependencies=[Depends(verify_api_key)])
+async def metrics_endpoint():
+    return {
+        "admission": admission.stats(),
+        "intent_cache": intent_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "startup": readiness.snapshot(),
+    }
+
 if __name__ == "__main__":
     logger.info("Starting Uvicorn server...")
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
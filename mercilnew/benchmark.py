@@ -0,0 +1,931 @@
+"""
+Micro-benchmarks for the search pipeline.
+
+Usage:
+    python benchmark.py rag --items 5 --min-latency 0.5 --max-latency 2.0
+    python benchmark.py intent-parity --records intents_recorded.jsonl
+    python benchmark.py record-intents --out tests/fixtures/intents_recorded.jsonl
+    python benchmark.py batch --queries 32 --llm-latency 0.3
+    python benchmark.py rerank --candidates 100 --rounds 200
+    python benchmark.py metadata-store --queries 50
+    python benchmark.py pushdown --queries 30
+    python benchmark.py geo --assets 300000 --radius 3000
+    python benchmark.py features --rows 100000
+    python benchmark.py encode --docs 2000 --workers 1,2,4
+    python benchmark.py embedding-parity --docs 2000 --queries 200
+    python benchmark.py cold-start --warmup-rounds 0,3 --queries 20
+    python benchmark.py retrieval --queries 200 --k 100 --synthetic-rows 300000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import search_pipeline
+from geo_index import GeoIndex, haversine_m
+from intent_parser import canonical_intent
+
+
+def _fake_results(n: int) -> List[Dict]:
+    return [
+        {
+            "id": str(i),
+            "metadata": {"name_th": f"ทรัพย์ทดสอบ {i}", "asset_details_selling_price": 1_000_000 + i},
+            "intent_reasons": [],
+            "intent_penalties": [],
+        }
+        for i in range(n)
+    ]
+
+
+def bench_rag(args: argparse.Namespace) -> None:
+    """Compare sequential vs concurrent RAG explanations with simulated LLM latency."""
+    rng = random.Random(args.seed)
+    latencies = [rng.uniform(args.min_latency, args.max_latency) for _ in range(args.items)]
+
+    def fake_call_openrouter(system_prompt: str, user_content: str, model: str, timeout: Optional[float] = None) -> str:
+        for i, latency in enumerate(latencies):
+            if f"ทรัพย์ทดสอบ {i}\n" in user_content:
+                time.sleep(latency)
+                return f"คำอธิบาย {i}"
+        return "{}"
+
+    search_pipeline.call_openrouter = fake_call_openrouter
+    results = _fake_results(args.items)
+
+    start = time.perf_counter()
+    sequential = [search_pipeline.rag_explain_single_item("q", {}, r, [], []) for r in results]
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = search_pipeline.rag_explain_results("q", {}, results)
+    concurrent_time = time.perf_counter() - start
+
+    assert concurrent == sequential, "concurrent explanations must keep ranked order"
+
+    print("=" * 60)
+    print(f"RAG explanations: {args.items} items, concurrency={search_pipeline.RAG_MAX_CONCURRENCY}")
+    print(f"   sum of call latencies : {sum(latencies):.2f}s")
+    print(f"   slowest call          : {max(latencies):.2f}s")
+    print(f"   sequential wall time  : {sequential_time:.2f}s")
+    print(f"   concurrent wall time  : {concurrent_time:.2f}s")
+    print("=" * 60)
+
+
+INTENT_FIXTURES = Path(__file__).resolve().parent / "tests" / "fixtures" / "intents_recorded.jsonl"
+
+
+def _load_intent_records(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def bench_intent_parity(args: argparse.Namespace) -> None:
+    """Compare the rule-based parser with recorded LLM intents (see INTENT_RECORD_PATH)."""
+    records = _load_intent_records(args.records)
+
+    covered, mismatches = 0, []
+    start = time.perf_counter()
+    for record in records:
+        parsed = search_pipeline.intent_parser.parse(record["query"])
+        if parsed is None:
+            continue
+        covered += 1
+        # "rules": "fallback" = parser ต้องส่งให้ LLM
+        if record.get("rules") == "fallback" or canonical_intent(parsed) != canonical_intent(record["intent"]):
+            mismatches.append((record, parsed))
+    elapsed_us = (time.perf_counter() - start) / max(1, len(records)) * 1e6
+    from_llm = sum(record.get("source", "llm") == "llm" for record in records)
+
+    print("=" * 60)
+    print(f"Intent parity: {len(records)} recorded queries ({from_llm} from the LLM, {len(records) - from_llm} hand-written)")
+    print(f"   handled by rules : {covered} ({covered / max(1, len(records)):.0%})")
+    print(f"   mismatches       : {len(mismatches)}")
+    print(f"   avg parse time   : {elapsed_us:.1f} us/query")
+    for record, parsed in mismatches:
+        print(f"\n   ❌ {record['query']} ({record.get('source', 'llm')})")
+        print(f"      llm  : {json.dumps(record['intent'], ensure_ascii=False)}")
+        print(f"      rules: {json.dumps(parsed, ensure_ascii=False)}")
+    print("=" * 60)
+    if mismatches:
+        sys.exit(1)
+
+
+def record_intents(args: argparse.Namespace) -> None:
+    """Ask the real LLM for the intent of each query and append {query, intent, source: "llm"} to --out."""
+    if not search_pipeline.OPENROUTER_API_KEY:
+        sys.exit("❌ OPENROUTER_API_KEY is not set")
+    queries = [r["query"] for r in _load_intent_records(args.queries)] if args.queries.endswith(".jsonl") \
+        else [line.strip() for line in Path(args.queries).read_text(encoding="utf-8").splitlines() if line.strip()]
+    done = set()
+    if Path(args.out).exists():
+        done = {r["query"] for r in _load_intent_records(args.out) if r.get("source", "llm") == "llm"}
+
+    search_pipeline.INTENT_RECORD_PATH = args.out  # _llm_intent_detection บันทึกเฉพาะคำตอบที่เรียก LLM สำเร็จ
+    todo = [q for q in dict.fromkeys(queries) if q.strip() and q not in done]
+    for query in todo:
+        search_pipeline._llm_intent_detection(query)
+    recorded = sum(r.get("source", "llm") == "llm" for r in _load_intent_records(args.out)) if Path(args.out).exists() else 0
+    print(f"✅ Recorded {recorded - len(done)}/{len(todo)} LLM intents to {args.out} ({len(done)} already recorded)")
+
+
+SAMPLE_QUERIES = [
+    "คอนโดใกล้ BTS ไม่เกิน 3 ล้าน",
+    "บ้านเดี่ยว เลี้ยงสัตว์ได้ 3-5 ล้าน",
+    "ทาวน์โฮม 2-3 ล้าน",
+    "คอนโดใกล้ MRT และห้าง",
+    "บ้านใกล้โรงเรียน ไม่ใกล้ตลาด",
+    "คอนโดแถวสุขุมวิท วิวแม่น้ำ",
+    "อาคารพาณิชย์ ใกล้ตลาด ไม่เกิน 8 ล้าน",
+    "บ้านแฝด ใกล้โรงพยาบาล",
+]
+
+
+def _install_fake_llm(latency: float) -> None:
+    """Replace OpenRouter with a fixed-latency fake so benchmarks measure the pipeline, not the LLM."""
+    intent = {"asset_types": [], "must_have": [], "nice_to_have": [], "avoid_poi": [], "pet_friendly": None, "price_range": {"min": None, "max": None}}
+
+    def fake_call_openrouter(system_prompt: str, user_content: str, model: str, timeout: Optional[float] = None) -> str:
+        time.sleep(latency)
+        if system_prompt is search_pipeline.ENHANCED_INTENT_DETECTION_PROMPT:
+            return json.dumps(intent)
+        return "คำอธิบาย (benchmark)"
+
+    search_pipeline.OPENROUTER_API_KEY = search_pipeline.OPENROUTER_API_KEY or "benchmark"
+    search_pipeline.call_openrouter = fake_call_openrouter
+
+
+def _load_pipeline(args: argparse.Namespace):
+    embed_model = search_pipeline.get_embedding_model(args.model)
+    collection = search_pipeline.get_chroma_collection(Path(args.db_path), args.collection)
+    return embed_model, collection
+
+
+def _reset_caches() -> None:
+    search_pipeline.embedding_cache.clear()
+    search_pipeline.intent_cache.clear()
+
+
+def bench_batch(args: argparse.Namespace) -> None:
+    """Throughput of execute_search_batch vs N sequential execute_search calls."""
+    _install_fake_llm(args.llm_latency)
+    embed_model, collection = _load_pipeline(args)
+    queries = [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} #{i}" for i in range(args.queries)]
+    filters_list = [{} for _ in queries]
+
+    _reset_caches()
+    start = time.perf_counter()
+    for query in queries:
+        search_pipeline.execute_search(query, {}, embed_model, collection)
+    single_time = time.perf_counter() - start
+
+    _reset_caches()
+    start = time.perf_counter()
+    search_pipeline.execute_search_batch(queries, filters_list, embed_model, collection, concurrency=args.concurrency)
+    batch_time = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"Batch search: {len(queries)} queries, concurrency {args.concurrency}, simulated LLM latency {args.llm_latency:.2f}s")
+    print(f"   {len(queries)} x execute_search : {single_time:.2f}s ({len(queries) / single_time:.1f} q/s)")
+    print(f"   execute_search_batch : {batch_time:.2f}s ({len(queries) / batch_time:.1f} q/s)")
+    print(f"   speedup              : {single_time / batch_time:.1f}x")
+    print("=" * 60)
+
+
+def _synthetic_candidates(n: int, rng: random.Random) -> List[Dict[str, Any]]:
+    candidates = []
+    for i in range(n):
+        meta = {
+            "asset_type_id": rng.choice([0, 1, 3, 4, 5, 15]),
+            "asset_type_fixed": "ทดสอบ",
+            "pet_friendly": rng.random() < 0.2,
+            "lifestyle_score": rng.random() * 10,
+        }
+        for poi_key in search_pipeline.POI_CONFIG:
+            if rng.random() < 0.9:
+                meta[poi_key] = float(rng.randint(30, 8000))
+                meta[f"{poi_key}_name"] = f"{poi_key} {i}"
+        candidates.append({"id": str(i), "semantic_score": rng.random(), "metadata": meta})
+    return candidates
+
+
+def _random_intent(rng: random.Random) -> Dict[str, Any]:
+    poi_keys = list(search_pipeline.POI_CONFIG) + ["unknown_poi"]
+    return {
+        "asset_types": rng.sample(list(search_pipeline.ASSET_ID_MAPPING) + ["ที่ดิน"], rng.randint(0, 2)),
+        "must_have": rng.sample(poi_keys, rng.randint(0, 3)),
+        "nice_to_have": rng.sample(poi_keys, rng.randint(0, 3)),
+        "avoid_poi": rng.sample(poi_keys, rng.randint(0, 2)),
+        "pet_friendly": rng.choice([None, True, False]),
+        "price_range": {"min": None, "max": None},
+    }
+
+
+def _rerank_scalar(candidates: List[Dict[str, Any]], intent: Dict[str, Any]) -> List[tuple]:
+    """The original per-candidate loop, kept as the reference implementation."""
+    ranked = []
+    for r in candidates:
+        meta = r["metadata"]
+        lifestyle_score = float(meta.get("lifestyle_score", 0))
+        intent_score, _, _ = search_pipeline.compute_intent_match_score(meta, intent)
+        nice_boost, _ = search_pipeline.apply_nice_to_have_boost(meta, intent)
+        final_score = ((intent_score * 0.7) + (r["semantic_score"] * 0.2) + (lifestyle_score * 0.05) + (nice_boost * 0.05))
+        ranked.append((r["id"], intent_score, nice_boost, final_score))
+    ranked.sort(key=lambda x: x[3], reverse=True)
+    return ranked
+
+
+def _rerank_vectorized(candidates: List[Dict[str, Any]], intent: Dict[str, Any]) -> List[tuple]:
+    engine = search_pipeline.rerank_engine
+    arrays = engine.from_results(candidates)
+    intent_scores, nice_boosts, final_scores = engine.score(arrays, intent)
+    return [(candidates[i]["id"], intent_scores[i], nice_boosts[i], final_scores[i]) for i in engine.order(final_scores)]
+
+
+def bench_rerank(args: argparse.Namespace) -> None:
+    """Exact parity + timing of the vectorized re-ranker against the scalar loop."""
+    rng = random.Random(args.seed)
+    cases = [(_synthetic_candidates(args.candidates, rng), _random_intent(rng)) for _ in range(args.rounds)]
+
+    for candidates, intent in cases:
+        expected = _rerank_scalar(candidates, intent)
+        actual = _rerank_vectorized(candidates, intent)
+        assert [e[0] for e in expected] == [a[0] for a in actual], f"ranking order differs for intent {intent}"
+        for e, a in zip(expected, actual):
+            assert (e[1], e[2], e[3]) == (float(a[1]), float(a[2]), float(a[3])), f"scores differ for {e[0]}: {e} vs {a}"
+
+    start = time.perf_counter()
+    for candidates, intent in cases:
+        _rerank_scalar(candidates, intent)
+    scalar_time = (time.perf_counter() - start) / len(cases)
+
+    engine = search_pipeline.rerank_engine
+    prebuilt = [(engine.from_results(candidates), intent) for candidates, intent in cases]
+    start = time.perf_counter()
+    for arrays, intent in prebuilt:
+        engine.order(engine.score(arrays, intent)[2])
+    vector_time = (time.perf_counter() - start) / len(cases)
+
+    start = time.perf_counter()
+    for candidates, intent in cases:
+        _rerank_vectorized(candidates, intent)
+    vector_with_build_time = (time.perf_counter() - start) / len(cases)
+
+    print("=" * 60)
+    print(f"Re-ranking: {args.rounds} random intents x {args.candidates} candidates — scores identical ✅")
+    print(f"   scalar loop                 : {scalar_time * 1000:.3f} ms/query")
+    print(f"   vectorized (arrays ready)   : {vector_time * 1000:.3f} ms/query")
+    print(f"   vectorized (+ array build)  : {vector_with_build_time * 1000:.3f} ms/query")
+    print("=" * 60)
+
+
+class _RandomQueryModel:
+    """Stands in for the embedding model: random unit vectors of the collection's dimension."""
+
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        vectors = self.rng.normal(size=(len(texts), self.dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _collection_dim(collection) -> int:
+    sample = collection.get(limit=1, include=["embeddings"])
+    return len(sample["embeddings"][0])
+
+
+def bench_metadata_store(args: argparse.Namespace) -> None:
+    """Memory and per-query allocation: metadata dicts from Chroma vs the columnar store."""
+    collection = search_pipeline.get_chroma_collection(Path(args.db_path), args.collection)
+    model = _RandomQueryModel(_collection_dim(collection))
+    intent = {"asset_types": ["คอนโด"], "must_have": ["bts_station"], "nice_to_have": ["cafe"], "avoid_poi": [], "pet_friendly": None, "price_range": {"min": None, "max": 5000000}}
+    queries = [f"q{i}" for i in range(args.queries)]
+
+    tracemalloc.start()
+    all_metas = collection.get(include=["metadatas"])["metadatas"]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del all_metas
+
+    tracemalloc.start()
+    store = search_pipeline.ColumnarMetadataStore.load(collection, search_pipeline.POI_CONFIG.keys())
+    store_traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    def run(use_store: bool) -> tuple:
+        search_pipeline.metadata_store = store if use_store else None
+        search_pipeline.embedding_cache.clear()
+        tracemalloc.start()
+        start = time.perf_counter()
+        for q in queries:
+            results = search_pipeline.chroma_query(collection, model, q, search_pipeline.TOP_K_RESULTS, {})
+            _, candidates = search_pipeline._select_candidates(results, {}, intent)
+            search_pipeline.rerank_engine.score(candidates, intent)
+        elapsed = (time.perf_counter() - start) / len(queries)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+
+    dict_time, dict_peak = run(use_store=False)
+    store_time, store_peak = run(use_store=True)
+
+    print("=" * 60)
+    print(f"Metadata store: {len(store)} assets, {args.queries} queries x top-{search_pipeline.TOP_K_RESULTS}")
+    print(f"   all metadata as dicts : {dict_bytes / 1e6:.1f} MB")
+    print(f"   columnar store        : {store.nbytes() / 1e6:.1f} MB arrays ({store_traced / 1e6:.1f} MB traced incl. id map)")
+    print(f"   per-query, dicts      : {dict_time * 1000:.2f} ms, peak alloc {dict_peak / 1e3:.0f} KB")
+    print(f"   per-query, columnar   : {store_time * 1000:.2f} ms, peak alloc {store_peak / 1e3:.0f} KB")
+    print("=" * 60)
+
+
+PUSHDOWN_INTENTS = [
+    {"asset_types": ["ทาวน์โฮม"], "price_range": {"min": 2000000, "max": 3000000}},
+    {"asset_types": ["คอนโด"], "pet_friendly": False, "price_range": {"min": None, "max": 1500000}},
+    {"asset_types": ["บ้านเดี่ยว"], "must_have": ["school"], "price_range": {"min": 8000000, "max": None}},
+    {"asset_types": ["อาคารพาณิชย์"], "price_range": {"min": None, "max": None}},
+]
+
+
+def bench_pushdown(args: argparse.Namespace) -> None:
+    """Post-filtering vs intent pushdown + adaptive k on selective intents."""
+    collection = search_pipeline.get_chroma_collection(Path(args.db_path), args.collection)
+    model = _RandomQueryModel(_collection_dim(collection))
+    search_pipeline.metadata_store = search_pipeline.ColumnarMetadataStore.load(collection, search_pipeline.POI_CONFIG.keys())
+    embeddings = model.encode([f"q{i}" for i in range(args.queries)])
+    intents = [
+        {"asset_types": [], "must_have": [], "nice_to_have": [], "avoid_poi": [], "pet_friendly": None, **intent}
+        for intent in PUSHDOWN_INTENTS
+    ]
+
+    def run(pushdown: bool) -> tuple:
+        search_pipeline.INTENT_PUSHDOWN = pushdown
+        search_pipeline.RETRIEVAL_MIN_CANDIDATES = args.min_candidates if pushdown else 0
+        usable, elapsed = [], []
+        for intent in intents:
+            for embedding in embeddings:
+                start = time.perf_counter()
+                results = search_pipeline.chroma_query(collection, model, "", search_pipeline.TOP_K_RESULTS, {}, intent, embedding)
+                _, candidates = search_pipeline._select_candidates(results, {}, intent)
+                intent_scores, _, _ = search_pipeline.rerank_engine.score(candidates, intent)
+                elapsed.append(time.perf_counter() - start)
+                # ไม่โดน -10 (ประเภท/สัตว์เลี้ยงไม่ตรง) และผ่านช่วงราคา
+                usable.append(int((intent_scores > -5).sum()))
+        return sum(usable) / len(usable), sum(elapsed) / len(elapsed) * 1000
+
+    post_usable, post_ms = run(pushdown=False)
+    push_usable, push_ms = run(pushdown=True)
+
+    print("=" * 60)
+    print(f"Intent pushdown: {len(intents)} intents x {args.queries} queries, k={search_pipeline.TOP_K_RESULTS}")
+    print(f"   post-filter only : {post_usable:6.1f} usable candidates/query, {post_ms:.2f} ms")
+    print(f"   pushdown + widen : {push_usable:6.1f} usable candidates/query, {push_ms:.2f} ms")
+    print("=" * 60)
+
+
+def bench_geo(args: argparse.Namespace) -> None:
+    """Geo index radius lookup vs a brute-force haversine scan over all assets."""
+    rng = np.random.default_rng(args.seed)
+    # ส่วนใหญ่กระจุกแถวกรุงเทพฯ/ปริมณฑล ที่เหลือกระจายทั่วประเทศ
+    n_city = int(args.assets * 0.7)
+    lats = np.concatenate([rng.normal(13.75, 0.25, n_city), rng.uniform(5.6, 20.5, args.assets - n_city)])
+    lons = np.concatenate([rng.normal(100.55, 0.25, n_city), rng.uniform(97.3, 105.6, args.assets - n_city)])
+
+    start = time.perf_counter()
+    index = GeoIndex(lats, lons)
+    build_s = time.perf_counter() - start
+
+    centers = rng.integers(0, n_city, args.queries)
+    index_ms, scan_ms, hits = [], [], []
+    for c in centers:
+        start = time.perf_counter()
+        rows = index.query_radius(lats[c], lons[c], args.radius)
+        index_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        expected = np.flatnonzero(haversine_m(lats[c], lons[c], lats, lons) <= args.radius)
+        scan_ms.append((time.perf_counter() - start) * 1000)
+        hits.append(len(rows))
+        # ขอบรัศมีอาจต่างกันที่ระดับ floating point ได้เล็กน้อย
+        assert len(np.setxor1d(rows, expected)) <= 1, "geo index disagrees with brute-force scan"
+
+    index_ms.sort()
+    scan_ms.sort()
+    print("=" * 60)
+    print(f"Geo radius search: {args.assets} assets, radius {args.radius:.0f} m, {args.queries} queries")
+    print(f"   index build        : {build_s:.2f}s")
+    print(f"   avg hits / query   : {sum(hits) / len(hits):.0f}")
+    print(f"   geo index          : avg {sum(index_ms) / len(index_ms):.2f} ms, p95 {index_ms[int(len(index_ms) * 0.95)]:.2f} ms")
+    print(f"   brute-force scan   : avg {sum(scan_ms) / len(scan_ms):.2f} ms, p95 {scan_ms[int(len(scan_ms) * 0.95)]:.2f} ms")
+    print("=" * 60)
+
+
+def _synthetic_catalogue(n: int, rng: np.random.Generator) -> pd.DataFrame:
+    """CSV-like frame with the columns build_vectorstore's feature stages read."""
+    import build_vectorstore
+
+    names = np.array(["บ้านเดี่ยว สวย", "ขาย คอนโด ใกล้ BTS", "คอนโด วิวสวน", "ทาวน์โฮม 2 ชั้น", "ตึกแถว ติดถนน", "ที่ดินพร้อมบ้าน"], dtype=object)
+    names_en = np.array(["Detached House", "Condominium Unit", "Townhome", "Shophouse", "COMMERCIAL building", np.nan], dtype=object)
+    descs = np.array(["อาคารชุด ชั้น 8", "ห้องชุด พร้อมเฟอร์", "บ้านเลี้ยงสัตว์เลี้ยงได้", "ใกล้ตลาด", np.nan], dtype=object)
+    descs_en = np.array(["Pet-friendly unit", "near pet friendly park", "quiet area", np.nan], dtype=object)
+    df = pd.DataFrame({
+        "id": np.arange(n),
+        "name_th": names[rng.integers(0, len(names), n)],
+        "name_en": names_en[rng.integers(0, len(names_en), n)],
+        "asset_details_description_th": descs[rng.integers(0, len(descs), n)],
+        "asset_details_description_en": descs_en[rng.integers(0, len(descs_en), n)],
+        "fixed_type": np.where(rng.random(n) < 0.2, " อาคารชุด ", None),
+        "asset_details_number_of_bedrooms": np.where(rng.random(n) < 0.1, np.nan, rng.integers(1, 5, n)),
+        "asset_details_number_of_bathrooms": rng.integers(1, 4, n),
+    })
+    for poi_key in build_vectorstore.POI_CONFIG:
+        distances = rng.uniform(0, 8000, n).round(1)
+        distances[rng.random(n) < 0.15] = np.nan
+        df[poi_key] = distances
+    # POI บางคอลัมน์เป็น text ปน (ค่าที่แปลงเป็นตัวเลขไม่ได้ต้องถูกข้าม)
+    df["cafe"] = df["cafe"].astype(object)
+    df.loc[rng.random(n) < 0.05, "cafe"] = "N/A"
+    return df
+
+
+def bench_features(args: argparse.Namespace) -> None:
+    """Exact parity + timing of the column-wise feature stages against df.apply(axis=1)."""
+    import build_vectorstore as bv
+
+    df = _synthetic_catalogue(args.rows, np.random.default_rng(args.seed))
+    percentiles = bv.compute_poi_percentiles(df)
+    stages = [
+        ("fix_asset_type", lambda: df.apply(bv.fix_asset_type, axis=1), lambda: bv.fix_asset_types(df)),
+        ("compute_lifestyle_score", lambda: df.apply(lambda row: bv.compute_lifestyle_score(row, percentiles), axis=1),
+         lambda: bv.compute_lifestyle_scores(df, percentiles)),
+        ("extract_features", lambda: pd.json_normalize(df.apply(bv.extract_features, axis=1)), lambda: bv.extract_features_columns(df)),
+    ]
+
+    print("=" * 60)
+    print(f"Feature engineering: {args.rows} rows x {len(bv.POI_CONFIG)} POI types")
+    total_row, total_vec = 0.0, 0.0
+    for name, row_wise, column_wise in stages:
+        start = time.perf_counter()
+        expected = row_wise()
+        row_s = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = column_wise()
+        vec_s = time.perf_counter() - start
+        total_row += row_s
+        total_vec += vec_s
+
+        if isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual.reset_index(drop=True), check_dtype=False)
+        else:
+            assert expected.tolist() == actual.tolist(), f"{name}: outputs differ"
+        print(f"   {name:<24}: apply {row_s:7.2f}s  vectorized {vec_s:6.3f}s  ({row_s / vec_s:5.0f}x) identical ✅")
+    print(f"   {'total':<24}: apply {total_row:7.2f}s  vectorized {total_vec:6.3f}s  ({total_row / total_vec:5.0f}x)")
+    print("=" * 60)
+
+
+def _embedding_texts(args: argparse.Namespace, rng: np.random.Generator) -> List[str]:
+    """text_for_embedding of the first --docs CSV rows, or synthetic listings of mixed length."""
+    import build_vectorstore
+
+    if args.csv_path:
+        _, texts, _ = build_vectorstore.prepare_chunk(pd.read_csv(args.csv_path, nrows=args.docs), args.model)
+        return texts
+    words = ["ขาย", "คอนโด", "บ้านเดี่ยว", "ใกล้", "BTS", "ห้าง", "ตกแต่งพร้อมอยู่", "วิวสวย", "ที่จอดรถ", "สระว่ายน้ำ", "ชั้น", "ตร.ม."]
+    lengths = np.clip(rng.lognormal(3.5, 0.9, args.docs).astype(int), 3, 400)
+    return [" ".join(rng.choice(words, n)) for n in lengths]
+
+
+def bench_encode(args: argparse.Namespace) -> None:
+    """docs/sec of build_vectorstore's encoder for several worker-process counts."""
+    import build_vectorstore
+
+    texts = _embedding_texts(args, np.random.default_rng(args.seed))
+    baseline = None
+    rows = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        encoder = build_vectorstore.ChunkEncoder(args.model, cache_dir=None, workers=workers)
+        try:
+            encoder.encode(texts[:64])  # โหลด model / เปิด process pool ก่อนจับเวลา
+            start = time.perf_counter()
+            embeddings = encoder.encode(texts)
+            elapsed = time.perf_counter() - start
+        finally:
+            encoder.close()
+        if baseline is None:
+            baseline = embeddings
+        max_diff = float(np.abs(embeddings - baseline).max())
+        assert max_diff < 1e-4, f"workers={workers}: embeddings differ from the first run (max |diff| {max_diff})"
+        rows.append((workers, elapsed, max_diff))
+
+    print("=" * 60)
+    print(f"Encoding {len(texts)} docs with {args.model} (avg {sum(map(len, texts)) / len(texts):.0f} chars)")
+    for workers, elapsed, max_diff in rows:
+        print(f"   workers={workers:<3}: {len(texts) / elapsed:8.1f} docs/s  ({elapsed:.1f}s, x{rows[0][1] / elapsed:.2f}, max |diff| {max_diff:.1e})")
+    print("=" * 60)
+
+
+def _backend_probe(model: str, backend: str, quantize: bool, corpus: List[str], queries: List[str]) -> Dict[str, Any]:
+    """Runs in a fresh process: load cost, per-query latency and vectors of one embedding backend."""
+    import resource
+
+    from embedding_backend import load_embedding_backend
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    embedder = load_embedding_backend(model, backend, quantize)
+    load_s = time.perf_counter() - start
+    corpus_vectors = embedder.encode(corpus, batch_size=32)
+    embedder.encode(queries[:5])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.encode([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "name": embedder.backend_id,
+        "load_s": load_s,
+        "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+        "corpus": corpus_vectors,
+        "queries": embedder.encode(queries),
+    }
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def _top_k(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(_unit(queries) @ _unit(corpus).T), axis=1, kind="stable")[:, :k]
+
+
+def bench_embedding_parity(args: argparse.Namespace) -> None:
+    """Cosine drift, top-k overlap, latency and memory of the onnx / int8 backends against torch."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    from embedding_backend import export_onnx, onnx_model_dir
+
+    rng = np.random.default_rng(args.seed)
+    corpus = _embedding_texts(args, rng)
+    words = ["คอนโด", "บ้านเดี่ยว", "ใกล้ BTS", "เลี้ยงสัตว์ได้", "ไม่เกิน 3 ล้าน", "ใกล้ห้าง", "เงียบสงบ", "ทาวน์โฮม", "บางนา", "ลาดพร้าว"]
+    queries = [" ".join(rng.choice(words, rng.integers(1, 5))) for _ in range(args.queries)]
+    if not (onnx_model_dir(args.model) / "model.int8.onnx").exists():
+        export_onnx(args.model, quantize=True)
+
+    variants = [("torch", False), ("onnx", False), ("onnx", True)]
+    results = []
+    for backend, quantize in variants:
+        # process ใหม่ต่อ backend: วัด memory / latency แยกกัน ไม่ปนกับ model ที่โหลดไว้ก่อน
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results.append(pool.submit(_backend_probe, args.model, backend, quantize, corpus, queries).result())
+
+    reference = results[0]
+    expected = _top_k(reference["queries"], reference["corpus"], args.k)
+    print("=" * 72)
+    print(f"Embedding backends: {args.model}, {len(corpus)} docs, {len(queries)} queries, top-{args.k}")
+    for r in results:
+        line = f"   {r['name']:<28} load {r['load_s']:5.1f}s  +{r['rss_mb']:6.0f} MB  query p50 {r['p50_ms']:6.1f} ms  p95 {r['p95_ms']:6.1f} ms"
+        print(line)
+        if r is reference:
+            continue
+        cos_q = (_unit(r["queries"]) * _unit(reference["queries"])).sum(axis=1)
+        cos_d = (_unit(r["corpus"]) * _unit(reference["corpus"])).sum(axis=1)
+        # สลับแค่ query encoder (collection เดิมจาก torch) / build ใหม่ทั้งหมดด้วย backend นี้
+        swap = _top_k(r["queries"], reference["corpus"], args.k)
+        rebuilt = _top_k(r["queries"], r["corpus"], args.k)
+        overlap_swap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(expected, swap)])
+        overlap_rebuilt = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(expected, rebuilt)])
+        print(f"      cosine vs torch: queries mean {cos_q.mean():.5f} min {cos_q.min():.5f} | docs mean {cos_d.mean():.5f} min {cos_d.min():.5f}")
+        print(f"      top-{args.k} overlap: query-only swap {overlap_swap:.3f}, full rebuild {overlap_rebuilt:.3f}")
+    print("=" * 72)
+
+
+def _wait_for(session, url: str, start: float, timeout: float, ok=(200,)) -> float:
+    """Poll `url` until it answers with a status in `ok`; seconds since `start`."""
+    import requests
+
+    while time.perf_counter() - start < timeout:
+        try:
+            if session.get(url, timeout=2).status_code in ok:
+                return time.perf_counter() - start
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not answering after {timeout:.0f}s")
+
+
+def _cold_start_run(args: argparse.Namespace, warmup_rounds: int, llm_url: str) -> Dict[str, Any]:
+    """Launch api_service in a fresh process and time: port up, ready, then each query."""
+    import requests
+
+    env = dict(
+        os.environ,
+        WARMUP_ROUNDS=str(warmup_rounds),
+        OPENROUTER_BASE_URL=llm_url,
+        OPENROUTER_API_KEY="benchmark",
+        MERCIL_API_KEY="benchmark",
+        EMB_MODEL_NAME=args.model,
+        VECTOR_DB_PATH=args.db_path,
+        COLLECTION_NAME=args.collection,
+    )
+    base = f"http://127.0.0.1:{args.port}"
+    session = requests.Session()
+    headers = {"Authorization": "Bearer benchmark"}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_service:app", "--port", str(args.port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        live_s = _wait_for(session, f"{base}/healthz", start, args.timeout, ok=(200, 503))
+        ready_s = _wait_for(session, f"{base}/readyz", start, args.timeout)
+        latencies = []
+        for i in range(args.queries):
+            # query ไม่ซ้ำ: ไม่ให้ embedding / intent cache ช่วย
+            query = f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} #{i}"
+            t = time.perf_counter()
+            response = session.post(f"{base}/api/v1/search", json={"query": query, "filters": {}}, headers=headers, timeout=args.timeout)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - t) * 1000)
+        snapshot = session.get(f"{base}/readyz", timeout=5).json()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    # "fast" = ไม่เกิน 1.5 เท่าของ median ครึ่งหลัง (steady state)
+    steady = float(np.median(latencies[len(latencies) // 2:]))
+    first_fast = next(i for i, ms in enumerate(latencies) if ms <= 1.5 * steady)
+    return {
+        "warmup_rounds": warmup_rounds,
+        "live_s": live_s,
+        "ready_s": ready_s,
+        "first_ms": latencies[0],
+        "steady_ms": steady,
+        "first_fast": first_fast,
+        "first_fast_s": ready_s + sum(latencies[:first_fast + 1]) / 1000,
+        "startup_ms": snapshot["startup_ms"],
+    }
+
+
+def bench_cold_start(args: argparse.Namespace) -> None:
+    """Cold start of api_service: time to liveness, readiness and the first fast query, per warmup setting."""
+    from openrouter_stub import start_stub_server
+
+    # LLM (intent ที่ rules ไม่ครอบคลุม + RAG) ชี้ไปที่ stub latency คงที่: วัดเฉพาะ service เอง
+    server, _, llm_url = start_stub_server(latency=args.llm_latency)
+    try:
+        runs = [_cold_start_run(args, int(w), llm_url) for w in args.warmup_rounds.split(",")]
+    finally:
+        server.shutdown()
+
+    print("=" * 72)
+    print(f"Cold start: {args.model}, collection '{args.collection}', {args.queries} queries after ready, LLM stub {args.llm_latency:.2f}s")
+    for r in runs:
+        stages = ", ".join(f"{k} {v:.0f}" for k, v in r["startup_ms"].items())
+        print(f"   WARMUP_ROUNDS={r['warmup_rounds']}: port up {r['live_s']:5.1f}s  ready {r['ready_s']:5.1f}s  first fast query {r['first_fast_s']:5.1f}s (query #{r['first_fast'] + 1})")
+        print(f"      first query {r['first_ms']:7.1f} ms vs steady {r['steady_ms']:7.1f} ms | startup ms: {stages}")
+    print("=" * 72)
+
+
+def _use_index(index, store_rows) -> None:
+    search_pipeline.retrieval_index = index
+    search_pipeline.retrieval_store_rows = store_rows
+
+
+def _time_engine(collection, queries: np.ndarray, k: int, scope) -> tuple:
+    """(ids per query, latencies ms) of _query_rows on the engine currently installed in search_pipeline."""
+    chroma_filter, ids = scope
+    hits, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        rows = search_pipeline._query_rows(collection, q[np.newaxis, :], k, chroma_filter, ids)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append([r["id"] for r in rows])
+    return hits, latencies
+
+
+def _recall(exact, queries: np.ndarray, hits: List[List[int]], truth: List[List[int]]) -> float:
+    """
+    recall@k against exact search, tie-aware: a hit counts when its true
+    distance is no worse than the k-th exact distance (duplicate vectors make
+    id-based recall meaningless).
+    """
+    scores = []
+    for q, h, t in zip(queries, hits, truth):
+        if not t:
+            scores.append(1.0)
+            continue
+        d = exact._distances(q[np.newaxis, :], np.asarray(h + t, dtype=np.int64))[0]
+        kth = d[len(h):].max()
+        scores.append(min(1.0, float((d[:len(h)] <= kth + 1e-5 * max(1.0, abs(kth))).sum()) / len(t)))
+    return float(np.mean(scores))
+
+
+def _latency_line(name: str, latencies: List[float], recall: float) -> str:
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return f"      {name:<7} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  recall@k vs exact {recall:.3f}"
+
+
+def _bench_synthetic_engines(args: argparse.Namespace, rng: np.random.Generator) -> None:
+    """exact vs hnsw on random unit vectors, for catalogue sizes the local collection does not reach."""
+    import tempfile
+
+    from vector_index import HnswIndex
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # กลุ่มก้อนแบบ embedding จริง (ทรัพย์คล้ายกันอยู่ใกล้กัน) ไม่ใช่ uniform noise
+        centers = rng.standard_normal((max(1, args.synthetic_rows // 200), args.synthetic_dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, len(centers), args.synthetic_rows)]
+        vectors += 0.5 * rng.standard_normal(vectors.shape).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors.tofile(Path(tmp) / "vectors.f32")
+        (Path(tmp) / "ids.json").write_text(json.dumps([str(i) for i in range(len(vectors))]))
+        (Path(tmp) / "meta.json").write_text(json.dumps({"collection": "synthetic", "count": len(vectors), "dim": args.synthetic_dim, "space": "l2"}))
+        start = time.perf_counter()
+        hnsw = HnswIndex(Path(tmp), exact_max_rows=0)
+        build_s = time.perf_counter() - start
+        exact = hnsw.exact
+        queries = vectors[rng.choice(len(vectors), args.queries)] + rng.normal(0, args.noise / np.sqrt(args.synthetic_dim), (args.queries, args.synthetic_dim)).astype(np.float32)
+        allowed = rng.random(len(vectors)) < 0.2
+
+        print(f"   synthetic {len(vectors)} x {args.synthetic_dim} (HNSW build {build_s:.1f}s)")
+        for label, mask in (("no filter", None), ("20% rows allowed", allowed)):
+            results = {}
+            for index in (exact, hnsw):
+                latencies, hits = [], []
+                for q in queries:
+                    start = time.perf_counter()
+                    rows, _ = index.search(q, args.k, mask)[0]
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits.append(rows.tolist())
+                results[index.name] = (hits, latencies)
+            print(f"   [{label}]")
+            for name, (hits, latencies) in results.items():
+                print(_latency_line(name, latencies, _recall(exact, queries, hits, results["exact"][0])))
+
+
+def bench_retrieval(args: argparse.Namespace) -> None:
+    """Chroma collection.query vs the in-process exact / HNSW engines: latency and recall@k, with and without filters."""
+    from vector_index import ExactIndex, HnswIndex, export_collection, export_status
+
+    rng = np.random.default_rng(args.seed)
+    collection = search_pipeline.get_chroma_collection(Path(args.db_path), args.collection)
+    store = search_pipeline.load_metadata_store(collection)
+    export_dir = Path(args.export_dir)
+    if export_status(export_dir, collection) is None:
+        export_collection(collection, export_dir)
+    exact = ExactIndex(export_dir)
+    hnsw = HnswIndex(export_dir, exact_max_rows=0)  # บังคับใช้ graph แม้ catalogue เล็ก
+    store_rows = store.rows_for(exact.ids)
+
+    # query = vector ของทรัพย์ในคลัง + noise (ไม่ต้องโหลด embedding model)
+    picks = rng.choice(len(exact), args.queries)
+    base = np.asarray(exact.vectors[picks], dtype=np.float32)
+    scale = np.linalg.norm(base, axis=1, keepdims=True) * args.noise / np.sqrt(exact.dim)
+    queries = (base + rng.standard_normal(base.shape).astype(np.float32) * scale).astype(np.float32)
+
+    intent = {"asset_types": ["คอนโด", "ทาวน์โฮม"], "must_have": [], "nice_to_have": [], "avoid_poi": [], "pet_friendly": None,
+              "price_range": {"min": None, "max": float(np.median(store.price))}}
+    scenarios = [("no filter", {}, None), ("intent pushdown (type + price)", {}, intent)]
+    with_coordinates = np.flatnonzero(np.isfinite(store.latitude) & np.isfinite(store.longitude))
+    if len(with_coordinates) and search_pipeline.geo_index is not None:
+        row = rng.choice(with_coordinates)
+        scenarios.append(("near (geo ids)", {"near": {"lat": store.latitude[row], "lon": store.longitude[row], "radius_m": args.radius}}, None))
+
+    print("=" * 72)
+    print(f"Retrieval engines: '{args.collection}' ({len(exact)} vectors, {exact.space}), {args.queries} queries, k={args.k}")
+    for label, filters, query_intent in scenarios:
+        scope = (search_pipeline.build_chroma_filter(filters, query_intent), search_pipeline.near_ids(filters))
+        results = {}
+        for name, index in (("exact", exact), ("hnsw", hnsw), ("chroma", None)):
+            _use_index(index, store_rows if index is not None else None)
+            results[name] = _time_engine(collection, queries, args.k, scope)
+        _use_index(None, None)
+        row_of = {asset_id: row for row, asset_id in enumerate(exact.ids)}
+        truth = [[row_of[i] for i in hits] for hits in results["exact"][0]]
+        print(f"   [{label}] ({np.mean([len(t) for t in truth]):.0f} hits per query)")
+        for name, (hits, latencies) in results.items():
+            print(_latency_line(name, latencies, _recall(exact, queries, [[row_of[i] for i in h] for h in hits], truth)))
+    if args.synthetic_rows:
+        _bench_synthetic_engines(args, rng)
+    print("=" * 72)
+
+
+def _add_pipeline_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--db_path", type=str, default=str(search_pipeline.VECTOR_DB_PATH))
+    parser.add_argument("--collection", type=str, default=search_pipeline.COLLECTION_NAME)
+    parser.add_argument("--model", type=str, default=search_pipeline.EMB_MODEL_NAME)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rag = sub.add_parser("rag", help="Sequential vs concurrent RAG explanations")
+    rag.add_argument("--items", type=int, default=search_pipeline.FINAL_TOP_N)
+    rag.add_argument("--min-latency", type=float, default=0.5)
+    rag.add_argument("--max-latency", type=float, default=2.0)
+    rag.add_argument("--seed", type=int, default=42)
+    rag.set_defaults(func=bench_rag)
+
+    parity = sub.add_parser("intent-parity", help="Rule-based intent parser vs recorded LLM intents")
+    parity.add_argument("--records", type=str, default=str(INTENT_FIXTURES), help="JSONL of {query, intent} (INTENT_RECORD_PATH output)")
+    parity.set_defaults(func=bench_intent_parity)
+
+    record = sub.add_parser("record-intents", help="Capture real LLM intents (source: llm) for the parity fixtures")
+    record.add_argument("--queries", type=str, default=str(INTENT_FIXTURES), help="Text file (one query per line) or fixture JSONL")
+    record.add_argument("--out", type=str, default=str(INTENT_FIXTURES))
+    record.set_defaults(func=record_intents)
+
+    batch = sub.add_parser("batch", help="Batch search vs N single searches")
+    _add_pipeline_args(batch)
+    batch.add_argument("--queries", type=int, default=32)
+    batch.add_argument("--llm-latency", type=float, default=0.3)
+    batch.add_argument("--concurrency", type=int, default=8, help="Admission slots the batch holds (API: min(N, SEARCH_MAX_INFLIGHT))")
+    batch.set_defaults(func=bench_batch)
+
+    rerank = sub.add_parser("rerank", help="Vectorized vs scalar re-ranking (parity + timing)")
+    rerank.add_argument("--candidates", type=int, default=search_pipeline.TOP_K_RESULTS)
+    rerank.add_argument("--rounds", type=int, default=200)
+    rerank.add_argument("--seed", type=int, default=7)
+    rerank.set_defaults(func=bench_rerank)
+
+    store = sub.add_parser("metadata-store", help="Memory / allocation of the columnar metadata store vs dicts")
+    _add_pipeline_args(store)
+    store.add_argument("--queries", type=int, default=50)
+    store.set_defaults(func=bench_metadata_store)
+
+    pushdown = sub.add_parser("pushdown", help="Post-filtering vs intent pushdown into the Chroma where clause")
+    _add_pipeline_args(pushdown)
+    pushdown.add_argument("--queries", type=int, default=30)
+    pushdown.add_argument("--min-candidates", type=int, default=search_pipeline.RETRIEVAL_MIN_CANDIDATES)
+    pushdown.set_defaults(func=bench_pushdown)
+
+    geo = sub.add_parser("geo", help="Geo index radius lookup vs brute-force haversine")
+    geo.add_argument("--assets", type=int, default=300000)
+    geo.add_argument("--radius", type=float, default=3000)
+    geo.add_argument("--queries", type=int, default=200)
+    geo.add_argument("--seed", type=int, default=11)
+    geo.set_defaults(func=bench_geo)
+
+    features = sub.add_parser("features", help="Column-wise vs df.apply feature engineering in build_vectorstore (parity + timing)")
+    features.add_argument("--rows", type=int, default=100000)
+    features.add_argument("--seed", type=int, default=5)
+    features.set_defaults(func=bench_features)
+
+    encode = sub.add_parser("encode", help="build_vectorstore encoding throughput (docs/sec) per worker-process count")
+    encode.add_argument("--model", type=str, default="thenlper/gte-large")
+    encode.add_argument("--csv_path", type=str, default=None, help="Take texts from this CSV instead of synthetic ones")
+    encode.add_argument("--docs", type=int, default=2000)
+    encode.add_argument("--workers", type=str, default="1,2,4")
+    encode.add_argument("--seed", type=int, default=3)
+    encode.set_defaults(func=bench_encode)
+
+    parity_emb = sub.add_parser("embedding-parity", help="onnx / int8 embedding backends vs torch: drift, top-k overlap, latency, memory")
+    parity_emb.add_argument("--model", type=str, default="thenlper/gte-large")
+    parity_emb.add_argument("--csv_path", type=str, default=None, help="Take corpus texts from this CSV instead of synthetic ones")
+    parity_emb.add_argument("--docs", type=int, default=2000)
+    parity_emb.add_argument("--queries", type=int, default=200)
+    parity_emb.add_argument("--k", type=int, default=10)
+    parity_emb.add_argument("--seed", type=int, default=4)
+    parity_emb.set_defaults(func=bench_embedding_parity)
+
+    cold = sub.add_parser("cold-start", help="api_service cold start: port up, ready (/readyz) and first fast query")
+    _add_pipeline_args(cold)
+    cold.add_argument("--warmup-rounds", type=str, default="0,3", help="WARMUP_ROUNDS values to compare")
+    cold.add_argument("--queries", type=int, default=20)
+    cold.add_argument("--llm-latency", type=float, default=0.0)
+    cold.add_argument("--port", type=int, default=8765)
+    cold.add_argument("--timeout", type=float, default=600)
+    cold.set_defaults(func=bench_cold_start)
+
+    retrieval = sub.add_parser("retrieval", help="Chroma vs in-process exact / HNSW retrieval over exported embeddings: latency and recall")
+    _add_pipeline_args(retrieval)
+    retrieval.add_argument("--export-dir", type=str, default=str(search_pipeline.VECTOR_INDEX_DIR))
+    retrieval.add_argument("--queries", type=int, default=200)
+    retrieval.add_argument("--k", type=int, default=search_pipeline.TOP_K_RESULTS)
+    retrieval.add_argument("--noise", type=float, default=0.5, help="Relative noise added to stored vectors to make queries")
+    retrieval.add_argument("--radius", type=float, default=5000)
+    retrieval.add_argument("--synthetic-rows", type=int, default=0, help="Also compare exact vs hnsw on this many random vectors")
+    retrieval.add_argument("--synthetic-dim", type=int, default=1024)
+    retrieval.add_argument("--seed", type=int, default=13)
+    retrieval.set_defaults(func=bench_retrieval)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import chromadb
 import argparse
 import logging
 import math
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Optional, List, Tuple, Dict, Any, Iterator
 from pathlib import Path
 import json
+import hashlib
+import os
+import queue
+import threading
+import sys
+
+from embedding_backend import EMBEDDING_BACKEND, TorchBackend, backend_id, load_embedding_backend
+from embedding_store import EmbeddingStore
+from location_codes import district_code, province_code
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -74,6 +82,11 @@ POI_CONFIG = {
     "golf_course": {"radius": 5000, "weight": 0.2, "curve": "linear"},
 }
 
+BATCH_SIZE = 1000
+QUEUE_DEPTH = 2
+
+# ฟังก์ชันทีละแถว (df.apply) ดั้งเดิม: build ใช้เวอร์ชัน column-wise ด้านล่าง ส่วนนี้เป็นค่าอ้างอิงของ
+# tests/test_features.py และ `python benchmark.py features`
 def fix_asset_type(row):
     """Fix asset type text based on name and description"""
     name = str(row.get('name_th', '')).lower()
@@ -104,6 +117,42 @@ def fix_asset_type(row):
 
     return ASSET_TYPE_MAPPING["บ้าน"]
 
+def _lower_text(df: pd.DataFrame, col: str) -> pd.Series:
+    """str(value).lower() ทั้งคอลัมน์ ("" ถ้าไม่มีคอลัมน์, NaN ไม่ match คำไหนเหมือน 'nan')"""
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].astype(str).str.lower()
+
+def _contains_any(text: pd.Series, words: List[str]) -> np.ndarray:
+    mask = np.zeros(len(text), dtype=bool)
+    for word in words:
+        mask |= text.str.contains(word, regex=False, na=False).to_numpy(dtype=bool)
+    return mask
+
+def fix_asset_types(df: pd.DataFrame) -> pd.Series:
+    """Column-wise fix_asset_type: same rules, same result for every row."""
+    name = _lower_text(df, 'name_th')
+    desc = _lower_text(df, 'asset_details_description_th')
+    eng_name = _lower_text(df, 'name_en')
+    if 'fixed_type' in df.columns:
+        # str() ต่อค่าเหมือนโค้ดเดิม (astype(str) ของ pandas 3 ปล่อย None เป็นค่าว่าง แต่ str(None) = 'None')
+        current_type = df['fixed_type'].map(str).str.strip()
+        has_current = ((current_type != '') & (current_type != 'nan')).to_numpy(dtype=bool)
+    else:
+        current_type = pd.Series("", index=df.index, dtype=object)
+        has_current = np.zeros(len(df), dtype=bool)
+
+    condo = _contains_any(eng_name, ["condominium"]) | _contains_any(name, [" คอนโด", "คอนโด "]) | _contains_any(desc, ["อาคารชุด", "ห้องชุด"])
+    townhome = _contains_any(eng_name, ["townhouse", "townhome"]) | _contains_any(name, ["ทาวน์เฮ้าส์", "ทาวน์โฮม"])
+    commercial = _contains_any(eng_name, ["commercial", "shophouse"]) | _contains_any(name, ["อาคารพาณิชย์", "ตึกแถว"])
+
+    fixed = np.select(
+        [has_current, condo, townhome, commercial],
+        [current_type.to_numpy(dtype=object), ASSET_TYPE_MAPPING["คอนโด"], ASSET_TYPE_MAPPING["ทาวน์โฮม"], ASSET_TYPE_MAPPING["อาคารพาณิชย์"]],
+        default=ASSET_TYPE_MAPPING["บ้าน"],
+    )
+    return pd.Series(fixed, index=df.index, dtype=object)
+
 def compute_poi_percentiles(df: pd.DataFrame) -> Dict[str, Dict[str, float]]:
     logger.info("Calculating POI percentiles...")
     percentiles_data = {}
@@ -150,6 +199,37 @@ def compute_lifestyle_score(row: pd.Series, percentiles: Dict[str, Dict[str, flo
     normalized_score = min(10, (total_score / total_weight) * 10)
     return normalized_score
 
+def compute_lifestyle_scores(df: pd.DataFrame, percentiles: Dict[str, Dict[str, float]]) -> pd.Series:
+    """
+    Column-wise compute_lifestyle_score: scores the whole (rows x POI) distance
+    matrix at once. Per-POI contributions are summed in POI_CONFIG order and
+    squared with the same float pow, so results match the row-wise version
+    bit for bit.
+    """
+    poi_cols = [col for col in POI_CONFIG if col in df.columns]
+    total_score = np.zeros(len(df))
+    if poi_cols:
+        # ค่าที่แปลงเป็นตัวเลขไม่ได้ = ข้าม (เหมือน try/except float() เดิม)
+        distances = np.column_stack([pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) for col in poi_cols])
+        radius = np.array([POI_CONFIG[col]["radius"] for col in poi_cols], dtype=np.float64)
+        weight = np.array([POI_CONFIG[col]["weight"] for col in poi_cols], dtype=np.float64)
+        exponential = np.array([POI_CONFIG[col].get("curve") == "exponential" for col in poi_cols])
+
+        with np.errstate(invalid='ignore'):
+            in_radius = distances <= radius
+            score = 1 - (distances / radius)
+            # ยกกำลังสองด้วย float ของ Python (libm pow) เฉพาะช่องที่ใช้จริง: numpy square ปัดเศษต่างได้ 1 ulp
+            squared = in_radius & exponential
+            score[squared] = [v ** 2 for v in score[squared].tolist()]
+            contribution = np.where(in_radius, np.maximum(0, score * weight), 0.0)
+        for j in range(len(poi_cols)):
+            total_score += contribution[:, j]
+
+    total_weight = sum(c['weight'] for c in POI_CONFIG.values())
+    if total_weight == 0:
+        return pd.Series(0.0, index=df.index)
+    return pd.Series(np.minimum(10, (total_score / total_weight) * 10), index=df.index)
+
 def extract_features(row: pd.Series) -> Dict[str, Any]:
     features = {}
     features['bedroom'] = row.get('asset_details_number_of_bedrooms', 'N/A')
@@ -164,58 +244,41 @@ def extract_features(row: pd.Series) -> Dict[str, Any]:
         
     return features
 
-def main(csv_path: str, db_path: str, model_name: str, collection_name: str):
-    logger.info(f"🚀 Starting vector store build from: {csv_path}")
-    logger.info(f"🗂️ Database path: {db_path}")
-    logger.info(f"📦 Collection name: {collection_name}")
+def extract_features_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Column-wise extract_features: bedroom, bathroom, pet_friendly for every row."""
+    features = pd.DataFrame(index=df.index)
+    for feature, col in (('bedroom', 'asset_details_number_of_bedrooms'), ('bathroom', 'asset_details_number_of_bathrooms')):
+        features[feature] = df[col] if col in df.columns else 'N/A'
 
-    # 1. Load Data
-    try:
-        df = pd.read_csv(csv_path)
-    except Exception as e:
-        logger.error(f"❌ Error loading CSV: {e}")
-        return
-    
-    logger.info(f"Loaded {len(df)} rows from CSV.")
-    
-    # 2. Pre-processing
-    logger.info("⚙️ Processing data and engineering features...")
-    
+    desc_th = _lower_text(df, 'asset_details_description_th')
+    desc_en = _lower_text(df, 'asset_details_description_en')
+    features['pet_friendly'] = _contains_any(desc_th, ["สัตว์เลี้ยง"]) | _contains_any(desc_en, ["pet-friendly", "pet friendly"])
+    return features
+
+def engineer_features(df: pd.DataFrame, percentiles: Optional[Dict[str, Dict[str, float]]] = None) -> pd.DataFrame:
     # Fix asset type (Text)
-    df['asset_type_fixed'] = df.apply(fix_asset_type, axis=1)
+    df['asset_type_fixed'] = fix_asset_types(df)
     
     # Calculate Percentiles & Lifestyle Score
-    percentiles = compute_poi_percentiles(df)
-    df['lifestyle_score'] = df.apply(lambda row: compute_lifestyle_score(row, percentiles), axis=1)
+    if percentiles is None:
+        percentiles = compute_poi_percentiles(df)
+    df['lifestyle_score'] = compute_lifestyle_scores(df, percentiles)
     
     # Extract other features
-    df_features = df.apply(extract_features, axis=1)
-    df = pd.concat([df, pd.json_normalize(df_features)], axis=1)
-    
-    logger.info("✅ Processing complete.")
+    df = pd.concat([df, extract_features_columns(df)], axis=1)
 
-    # 3. Create Embeddings
-    logger.info("Embedding text...")
-    
-    # สร้าง Text สำหรับ Semantic Search (รวม ID เข้าไปด้วยเผื่อช่วย)
-    df['text_for_embedding'] = df['name_th'].fillna('') + " | " + \
-                               df['asset_type_fixed'].fillna('') + " | " + \
-                               df['asset_details_description_th'].fillna('')
-    texts = df['text_for_embedding'].tolist()
-    
-    logger.info(f"Loading embedding model: {model_name}")
-    model = SentenceTransformer(model_name)
-    
-    logger.info("Generating embeddings... (This may take a while)")
-    embeddings = model.encode(texts, show_progress_bar=True, batch_size=32)
-    logger.info("✅ Embeddings generated.")
+    # Canonical location codes สำหรับ filter จังหวัด/เขต แบบ exact match ใน Chroma
+    for src_col, code_col, to_code in (("province_th", "province_code", province_code), ("district_th", "district_code", district_code)):
+        if src_col in df.columns:
+            codes = {name: to_code(name) for name in df[src_col].dropna().unique()}
+            df[code_col] = df[src_col].map(codes).fillna("")
+    return df
 
-    # 4. Prepare Metadata (The Most Critical Part)
-    logger.info("Preparing metadata for ChromaDB...")
-    
+def prepare_metadatas(df: pd.DataFrame) -> List[Dict[str, Any]]:
     # ✅ [CRITICAL] กำหนด Columns ที่ต้องมีให้ครบ โดยเฉพาะ asset_type_id
     metadata_cols = [
             'id', 'name_th', 'name_en', 'asset_type_fixed', 'province_th', 'district_th',
+            'province_code', 'district_code',
             'asset_details_selling_price', 'location_latitude', 'location_longitude',
             'asset_details_description_th', 'asset_details_description_en',
             'bedroom', 'bathroom', 'pet_friendly', 
@@ -238,9 +301,10 @@ def main(csv_path: str, db_path: str, model_name: str, collection_name: str):
     
     # Handle NaN Values (ChromaDB ไม่รับ NaN)
     for col in df_metadata.columns:
-        if df_metadata[col].dtype == 'object':
+        dtype = df_metadata[col].dtype
+        if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
             df_metadata[col] = df_metadata[col].fillna('N/A')
-        elif np.issubdtype(df_metadata[col].dtype, np.number):
+        elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
             if col in POI_CONFIG: # Distance
                 df_metadata[col] = df_metadata[col].fillna(99999.0)
             elif col == 'asset_type_id': # ID
@@ -248,50 +312,289 @@ def main(csv_path: str, db_path: str, model_name: str, collection_name: str):
             else:
                 df_metadata[col] = df_metadata[col].fillna(0.0)
 
-    metadatas = df_metadata.to_dict(orient="records")
-    ids_list = df["id"].astype(str).tolist()
+    return df_metadata.to_dict(orient="records")
 
-    # 5. Build ChromaDB
-    logger.info(f"Setting up ChromaDB client at path: {db_path}")
-    client = chromadb.PersistentClient(path=db_path)
-    
-    # Reset Collection
-    try:
-        if collection_name in [c.name for c in client.list_collections()]:
-            logger.warning(f"Collection '{collection_name}' already exists. Deleting and rebuilding.")
-            client.delete_collection(name=collection_name)
-    except:
-        pass
-    
-    collection = client.create_collection(name=collection_name)
+def content_hash(model_name: str, text: str, metadata: Dict[str, Any]) -> str:
+    """Fingerprint of everything a row writes to Chroma (model + document + metadata)."""
+    payload = json.dumps([model_name, text, metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
 
-    # Add to collection
-    logger.info(f"Adding {len(df)} documents to collection...")
-    
-    BATCH_SIZE = 1000
+def existing_hashes(collection, page_size: int = 5000) -> Dict[str, str]:
+    """id -> content_hash ของทุกแถวที่อยู่ใน collection (แถวจาก build เก่าที่ไม่มี hash ได้ "")"""
+    hashes = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        for id_, metadata in zip(page["ids"], page["metadatas"]):
+            hashes[id_] = (metadata or {}).get("content_hash", "")
+        if len(page["ids"]) < page_size:
+            return hashes
+        offset += page_size
+
+def write_batches(collection, ids_list: List[str], embeddings: np.ndarray, texts: List[str],
+                  metadatas: List[Dict[str, Any]], upsert: bool = False) -> int:
+    """Add / upsert in BATCH_SIZE batches; a failed batch is logged and skipped. Returns the number of rows not written."""
+    write = collection.upsert if upsert else collection.add
+    total_batches = math.ceil(len(ids_list) / BATCH_SIZE)
+    failed = 0
     for i in range(0, len(ids_list), BATCH_SIZE):
-        batch_ids = ids_list[i:i+BATCH_SIZE]
-        batch_texts = texts[i:i+BATCH_SIZE]
-        batch_embeddings_list = embeddings[i:i+BATCH_SIZE].tolist()
         batch_metadatas = metadatas[i:i+BATCH_SIZE]
-        
         try:
-            collection.add(
-                ids=batch_ids,
-                embeddings=batch_embeddings_list,
-                documents=batch_texts,
+            write(
+                ids=ids_list[i:i+BATCH_SIZE],
+                embeddings=embeddings[i:i+BATCH_SIZE].tolist(),
+                documents=texts[i:i+BATCH_SIZE],
                 metadatas=batch_metadatas
             )
-            logger.info(f"Added batch {i // BATCH_SIZE + 1} / {math.ceil(len(ids_list) / BATCH_SIZE)}")
+            logger.info(f"{'Upserted' if upsert else 'Added'} batch {i // BATCH_SIZE + 1} / {total_batches}")
         except Exception as e:
-            logger.error(f"❌ Error adding batch {i // BATCH_SIZE + 1}: {e}")
+            failed += len(batch_metadatas)
+            logger.error(f"❌ Error writing batch {i // BATCH_SIZE + 1}: {e}")
             logger.error(f"Sample metadata: {json.dumps(batch_metadatas[0], indent=2, ensure_ascii=False)}")
+    return failed
+
+def encode_length_bucketed(model: Any, texts: List[str], pool: Dict[str, Any], batch_size: int = 32) -> np.ndarray:
+    """
+    Multi-process encode with texts sorted longest-first, so every chunk a
+    worker receives holds texts of similar length (little padding) and the
+    heaviest chunks start first. Rows come back in the original order.
+    """
+    order = np.argsort([-len(t) for t in texts], kind="stable")
+    embeddings = model.encode([texts[i] for i in order], pool=pool, batch_size=batch_size)
+    restored = np.empty_like(embeddings)
+    restored[order] = embeddings
+    return restored
+
+class ChunkEncoder:
+    """Encodes chunk after chunk with one model (loaded on the first cache miss) and one embedding cache."""
+
+    def __init__(self, model_name: str, cache_dir: Optional[str] = None, workers: int = 1,
+                 backend: Optional[str] = None, quantize: Optional[bool] = None):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.backend_name = backend
+        self.quantize = quantize
+        self.model_id = backend_id(model_name, backend, quantize)
+        self.backend = None
+        self.pool = None
+        # cache ต่อ (model, text): build ใหม่ที่เปลี่ยนแค่ metadata / POI_CONFIG / ชื่อ collection ไม่ต้อง encode ซ้ำ
+        self.store = EmbeddingStore(Path(cache_dir), self.model_id) if cache_dir else None
+        self.encoded = 0
+
+    def _load(self):
+        logger.info(f"Loading embedding model: {self.model_id}")
+        self.backend = load_embedding_backend(self.model_name, self.backend_name, self.quantize)
+        if self.workers > 1 and isinstance(self.backend, TorchBackend):
+            # แบ่ง core ให้แต่ละ process เท่า ๆ กัน ไม่ให้ torch ทุก process แย่ง thread กันเอง
+            os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // self.workers)))
+            logger.info(f"Starting {self.workers} encoder processes")
+            self.pool = self.backend.model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+        elif self.workers > 1:
+            logger.warning("--workers only applies to the torch backend; onnx uses EMBEDDING_THREADS intra-op threads")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if self.backend is None:
+            self._load()
+        logger.info(f"Generating embeddings for {len(texts)} texts...")
+        self.encoded += len(texts)
+        if self.pool is not None:
+            return encode_length_bucketed(self.backend.model, texts, self.pool)
+        return self.backend.encode(texts, show_progress_bar=len(texts) > 1000, batch_size=32)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if self.store is None:
+            return self._encode(texts)
+        return self.store.encode(texts, self._encode)
+
+    def close(self):
+        if self.pool is not None:
+            self.backend.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+def scan_csv_dtypes(csv_path: str, chunk_size: int) -> Tuple[Dict[str, Any], int]:
+    """
+    One cheap parse over the CSV (no features / embeddings) to find a dtype per
+    column that every chunk will share: a column that is text in any chunk
+    stays text everywhere, int columns with NaN somewhere become float. Without
+    this a chunk where e.g. name_en happens to be all empty would be read as
+    float and get 0.0 instead of 'N/A' in metadata.
+    """
+    kinds: Dict[str, set] = {}
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        rows += len(chunk)
+        for col, dtype in chunk.dtypes.items():
+            kinds.setdefault(col, set()).add(dtype.kind)
+    dtypes: Dict[str, Any] = {}
+    for col, seen in kinds.items():
+        if len(seen) == 1:
+            continue
+        if seen & {"O", "T", "U"} or not seen <= {"i", "u", "f", "b"}:
+            dtypes[col] = object
+        elif "f" in seen:
+            dtypes[col] = np.float64
+    return dtypes, rows
+
+def read_csv_chunks(csv_path: str, chunk_size: int, dtypes: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        for col, dtype in dtypes.items():
+            if col in chunk.columns:
+                chunk[col] = chunk[col].astype(dtype)
+        yield chunk
+
+def prepare_chunk(df: pd.DataFrame, model_name: str) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """Features + embedding text + metadata (with content_hash) for one chunk of the CSV."""
+    # lifestyle score ใช้แค่ระยะทางของแถวนั้นเอง (ไม่ได้ใช้ percentiles) แบ่ง chunk จึงได้ผลเท่าเดิม
+    df = engineer_features(df, percentiles={})
+
+    # สร้าง Text สำหรับ Semantic Search (รวม ID เข้าไปด้วยเผื่อช่วย)
+    df['text_for_embedding'] = df['name_th'].fillna('') + " | " + \
+                               df['asset_type_fixed'].fillna('') + " | " + \
+                               df['asset_details_description_th'].fillna('')
+    texts = df['text_for_embedding'].tolist()
+
+    metadatas = prepare_metadatas(df)
+    ids_list = df["id"].astype(str).tolist()
+    for text, metadata in zip(texts, metadatas):
+        metadata['content_hash'] = content_hash(model_name, text, metadata)
+    return ids_list, texts, metadatas
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once another stage has failed."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return None
+
+def main(csv_path: str, db_path: str, model_name: str, collection_name: str, incremental: bool = False,
+         embedding_cache: Optional[str] = "npa_embedding_cache", chunk_size: int = 5000, workers: int = 1,
+         backend: Optional[str] = None, quantize: Optional[bool] = None) -> bool:
+    """Build (or incrementally update) the collection; returns False if the CSV or any Chroma batch failed."""
+    logger.info(f"🚀 Starting vector store build from: {csv_path}")
+    logger.info(f"🗂️ Database path: {db_path}")
+    logger.info(f"📦 Collection name: {collection_name}")
+
+    # 1. Scan CSV (dtype ต่อคอลัมน์ให้ทุก chunk ตรงกัน)
+    try:
+        dtypes, total_rows = scan_csv_dtypes(csv_path, chunk_size)
+    except Exception as e:
+        logger.error(f"❌ Error loading CSV: {e}")
+        return False
+    
+    logger.info(f"Found {total_rows} rows in CSV, streaming in chunks of {chunk_size}.")
+
+    # 2. Setup ChromaDB
+    logger.info(f"Setting up ChromaDB client at path: {db_path}")
+    client = chromadb.PersistentClient(path=db_path)
+    exists = collection_name in [c.name for c in client.list_collections()]
+
+    stored: Dict[str, str] = {}
+    if incremental and exists:
+        collection = client.get_collection(name=collection_name)
+        stored = existing_hashes(collection)
+        logger.info(f"🔁 Incremental build against {len(stored)} existing documents")
+    else:
+        incremental = False
+        # Reset Collection
+        if exists:
+            logger.warning(f"Collection '{collection_name}' already exists. Deleting and rebuilding.")
+            client.delete_collection(name=collection_name)
+        collection = client.create_collection(name=collection_name)
+
+    # 3. Pipeline: [reader: CSV chunk -> features -> metadata] -> [encode] -> [writer: Chroma]
+    # queue มีขนาดจำกัด: ใน memory มีไม่เกินราว 2 * QUEUE_DEPTH + 3 chunks ไม่ว่า CSV จะใหญ่แค่ไหน
+    encoder = ChunkEncoder(model_name, embedding_cache, workers, backend, quantize)
+    prepared: queue.Queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    encoded: queue.Queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    seen_ids: set = set()
+    counts = {"rows": 0, "changed": 0, "failed": 0}
+
+    def read_stage():
+        try:
+            for chunk in read_csv_chunks(csv_path, chunk_size, dtypes):
+                if not _put(prepared, prepare_chunk(chunk, encoder.model_id), stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(prepared, None, stop)
+
+    def write_stage():
+        try:
+            while (item := _get(encoded, stop)) is not None:
+                counts["failed"] += write_batches(collection, *item, upsert=incremental)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    reader = threading.Thread(target=read_stage, name="build-reader", daemon=True)
+    writer = threading.Thread(target=write_stage, name="build-writer", daemon=True)
+    reader.start()
+    writer.start()
+    try:
+        while (item := _get(prepared, stop)) is not None:
+            ids_list, texts, metadatas = item
+            counts["rows"] += len(ids_list)
+            if incremental:
+                seen_ids.update(ids_list)
+                changed = [i for i, (id_, metadata) in enumerate(zip(ids_list, metadatas)) if stored.get(id_) != metadata['content_hash']]
+                ids_list = [ids_list[i] for i in changed]
+                texts = [texts[i] for i in changed]
+                metadatas = [metadatas[i] for i in changed]
+            counts["changed"] += len(ids_list)
+            if ids_list:
+                embeddings = encoder.encode(texts)
+                if not _put(encoded, (ids_list, embeddings, texts, metadatas), stop):
+                    break
+            logger.info(f"Processed {counts['rows']} / {total_rows} rows")
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        _put(encoded, None, stop)
+        writer.join()
+        reader.join(timeout=5)
+        encoder.close()
+    if errors:
+        raise errors[0]
+
+    if incremental and counts["failed"]:
+        # batch ที่เขียนไม่สำเร็จยังมีของเก่า / ไม่มีใน collection: ยังไม่ลบอะไร รัน --incremental ใหม่จะ upsert แถวเหล่านั้นอีกรอบ
+        logger.error(f"🔁 Incremental build incomplete: {counts['failed']} of {counts['changed']} new/changed rows failed to upsert, "
+                     f"skipped deleting ids missing from the CSV; re-run with --incremental to retry")
+    elif incremental:
+        # ลบเฉพาะเมื่ออ่าน CSV ครบแล้วเท่านั้น
+        removed = [id_ for id_ in stored if id_ not in seen_ids]
+        for i in range(0, len(removed), BATCH_SIZE):
+            collection.delete(ids=removed[i:i+BATCH_SIZE])
+        logger.info(f"🔁 Incremental build: {counts['changed']} new/changed, "
+                    f"{counts['rows'] - counts['changed']} unchanged, {len(removed)} removed")
+    if encoder.store is not None:
+        logger.info(f"Embedding cache: {encoder.store.stats()}")
 
     print("\n" + "="*80)
-    print(f"✅ DONE: Vector DB built at {db_path}")
+    if counts["failed"]:
+        print(f"❌ INCOMPLETE: {counts['failed']} rows failed to write to {db_path} (see errors above)")
+    else:
+        print(f"✅ DONE: Vector DB built at {db_path}")
     print(f"   📊 Collection: {collection_name}")
-    print(f"   📦 Documents: {collection.count()}")
+    print(f"   📦 Documents: {collection.count()} (encoded {encoder.encoded})")
     print("="*80)
+    return not counts["failed"]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Build Chroma Vector Store")
@@ -299,9 +602,27 @@ if __name__ == "__main__":
     parser.add_argument("--db_path", type=str, default="npa_vectorstore")
     parser.add_argument("--model", type=str, default="thenlper/gte-large")
     parser.add_argument("--collection", type=str, default="npa_assets_v2")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Upsert only new/changed rows (by content hash) and delete ids missing from the CSV")
+    parser.add_argument("--embedding-cache", type=str, default="npa_embedding_cache",
+                        help="On-disk embedding cache directory keyed by (model, text); '' disables it")
+    parser.add_argument("--chunk-size", type=int, default=5000,
+                        help="Rows per pipeline chunk; peak memory scales with this, not with the CSV size")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Encoder processes (sentence-transformers multi-process pool, CPU); 1 = encode in this process")
+    parser.add_argument("--backend", type=str, default=EMBEDDING_BACKEND, choices=["torch", "onnx"],
+                        help="Embedding backend (default: EMBEDDING_BACKEND env); query with the same backend")
+    parser.add_argument("--quantize", action="store_true", help="onnx backend: use the dynamic int8 model")
     args = parser.parse_args()
     
-    main(csv_path=args.csv_path, 
-         db_path=args.db_path, 
-         model_name=args.model, 
-         collection_name=args.collection)
\ No newline at end of file
+    ok = main(csv_path=args.csv_path, 
+              db_path=args.db_path, 
+              model_name=args.model, 
+              collection_name=args.collection,
+              incremental=args.incremental,
+              embedding_cache=args.embedding_cache,
+              chunk_size=args.chunk_size,
+              workers=args.workers,
+              backend=args.backend,
+              quantize=args.quantize or None)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,42 @@
+"""
+Content fingerprint of a Chroma collection: an order-independent digest of
+every row's (id, content_hash). metadata_store.py computes it while loading
+the metadata, vector_index.py stores it with an export and compares the two
+to tell a stale export apart.
+"""
+import hashlib
+from typing import Any, Dict, List, Optional
+
+
+class ContentFingerprint:
+    """
+    Order-independent digest of (id, content_hash) over a collection's rows
+    (content_hash is written by build_vectorstore.py and changes with the
+    embedded text, metadata and model), fed page by page.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._sum = 0
+
+    def update(self, ids: List[str], metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        for asset_id, meta in zip(ids, metadatas):
+            row = f"{asset_id}\0{(meta or {}).get('content_hash', '')}".encode("utf-8")
+            self._sum = (self._sum + int.from_bytes(hashlib.blake2b(row, digest_size=8).digest(), "little")) & 0xFFFFFFFFFFFFFFFF
+        self.count += len(ids)
+
+    def hexdigest(self) -> str:
+        return f"{self.count}-{self._sum:016x}"
+
+
+def collection_fingerprint(collection, page_size: int = 5000) -> str:
+    fingerprint = ContentFingerprint()
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        fingerprint.update(ids, page["metadatas"])
+        offset += len(ids)
+    return fingerprint.hexdigest()
@@ -0,0 +1,251 @@
+"""
+Pluggable embedding backends for search_pipeline.py and build_vectorstore.py.
+
+    EMBEDDING_BACKEND=torch   SentenceTransformer (default, same as before)
+    EMBEDDING_BACKEND=onnx    the model's transformer exported to ONNX and run
+                              with ONNX Runtime; tokenizer, pooling and
+                              normalization are replayed in NumPy
+    EMBEDDING_QUANTIZE=1      (onnx) dynamically int8-quantized weights
+
+The ONNX export is written once to EMBEDDING_ONNX_DIR/<model> (on first use,
+or ahead of time with the CLI below) and needs torch + onnx only then; at
+serve time the onnx backend only imports onnxruntime and tokenizers (no
+torch / transformers). These packages are optional: requirements-onnx.txt.
+Vectors differ slightly from the torch backend (more so with int8), so
+query with the backend the collection was built with, or check the drift
+first with `python benchmark.py embedding-parity`.
+
+    python embedding_backend.py export --model thenlper/gte-large --quantize
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger("embedding_backend")
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0") == "1"
+EMBEDDING_ONNX_DIR = Path(os.getenv("EMBEDDING_ONNX_DIR", "onnx_models"))
+# 0 = ให้ onnxruntime เลือกเอง (ทุก core)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+ONNX_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+POOLING_MODES = ("mean", "cls", "max")
+
+
+class TorchBackend:
+    """SentenceTransformer as-is."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.backend_id = model_name
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        kwargs["convert_to_numpy"] = True
+        return self.model.encode(texts, batch_size=batch_size, **kwargs)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class OnnxBackend:
+    """ONNX Runtime session over an export made by export_onnx()."""
+
+    def __init__(self, model_dir: Path, quantized: bool = False, threads: int = EMBEDDING_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = Path(model_dir)
+        config = json.loads((self.model_dir / "backend.json").read_text())
+        self.model_name = config["model"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.max_seq_length = config["max_seq_length"]
+        self.dim = config["dim"]
+        self.quantized = quantized
+        self.backend_id = backend_id(self.model_name, "onnx", quantized)
+
+        # tokenizers (Rust) อ่าน tokenizer.json ตรง ๆ ไม่ต้อง import transformers / torch
+        self.tokenizer = Tokenizer.from_file(str(self.model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=config["pad_token_id"], pad_token=config["pad_token"])
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        path = self.model_dir / ("model.int8.onnx" if quantized else "model.onnx")
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        elif self.pooling == "max":
+            pooled = np.where(mask[:, :, None] > 0, hidden, -1e9).max(axis=1)
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """SentenceTransformer.encode subset; other options would be silently ignored, so they raise TypeError."""
+        if kwargs:
+            raise TypeError(f"OnnxBackend.encode() does not support {sorted(kwargs)}")
+        if not convert_to_numpy:
+            raise TypeError("OnnxBackend.encode() only returns NumPy arrays (convert_to_numpy=False is not supported)")
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size=batch_size)[0]
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        # เรียงตามความยาว: batch เดียวกันยาวใกล้กัน padding น้อย
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        starts = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+
+            starts = tqdm(starts, desc="Batches")
+        for start in starts:
+            rows = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in rows])
+            tokens = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: tokens[name] for name in self.input_names})[0]
+            out[rows] = self._pool(hidden, tokens["attention_mask"])
+        return out
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+EmbeddingBackend = Union[TorchBackend, OnnxBackend]
+
+
+def onnx_model_dir(model_name: str) -> Path:
+    if (Path(model_name) / "backend.json").exists():
+        return Path(model_name)
+    return EMBEDDING_ONNX_DIR / (re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_") or "model")
+
+
+def _pooling_mode(config: Dict[str, Any]) -> str:
+    mode = config.get("pooling_mode")
+    if mode is None:  # config แบบเก่า: pooling_mode_mean_tokens / pooling_mode_cls_token / ...
+        legacy = {"pooling_mode_mean_tokens": "mean", "pooling_mode_cls_token": "cls", "pooling_mode_max_tokens": "max"}
+        active = [name for key, name in legacy.items() if config.get(key)]
+        mode = active[0] if len(active) == 1 else active
+    if mode not in POOLING_MODES:
+        raise ValueError(f"Pooling mode {mode!r} is not supported by the onnx backend (supported: {POOLING_MODES})")
+    return mode
+
+
+def export_onnx(model_name: str, out_dir: Optional[Path] = None, quantize: bool = False) -> Path:
+    """Export the transformer of a SentenceTransformer model to ONNX (+ tokenizer and pooling config)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir) if out_dir else onnx_model_dir(model_name)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = list(model)
+    kinds = [type(m).__name__ for m in modules]
+    if kinds[:2] != ["Transformer", "Pooling"] or any(k != "Normalize" for k in kinds[2:]):
+        raise ValueError(f"Unsupported module stack for onnx export: {kinds}")
+    transformer, pooling = modules[0], modules[1]
+
+    sample = model.tokenizer(["ตัวอย่างข้อความ", "sample text"], padding=True, return_tensors="pt")
+    input_names = [name for name in ONNX_INPUTS if name in sample]
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    logger.info(f"Exporting {model_name} to {out_dir / 'model.onnx'}")
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(transformer.auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            str(out_dir / "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+            opset_version=17,
+            dynamo=False,
+        )
+    if not getattr(model.tokenizer, "is_fast", False):
+        raise ValueError(f"{model_name} has no fast tokenizer (tokenizer.json), which the onnx backend needs")
+    model.tokenizer.save_pretrained(str(out_dir))
+    (out_dir / "backend.json").write_text(json.dumps({
+        "model": model_name,
+        "pooling": _pooling_mode(pooling.get_config_dict()),
+        "normalize": "Normalize" in kinds,
+        "max_seq_length": transformer.max_seq_length,
+        "dim": model.get_sentence_embedding_dimension(),
+        "pad_token": model.tokenizer.pad_token,
+        "pad_token_id": model.tokenizer.pad_token_id,
+    }, indent=2))
+    if quantize:
+        quantize_onnx(out_dir)
+    return out_dir
+
+
+def quantize_onnx(model_dir: Path) -> Path:
+    """Dynamic int8 quantization (weights int8, activations quantized per batch at run time)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    target = Path(model_dir) / "model.int8.onnx"
+    logger.info(f"Quantizing {model_dir / 'model.onnx'} -> {target}")
+    quantize_dynamic(str(Path(model_dir) / "model.onnx"), str(target), weight_type=QuantType.QInt8)
+    return target
+
+
+def backend_id(model_name: str, backend: Optional[str] = None, quantize: Optional[bool] = None) -> str:
+    """Identity of the vectors a backend produces (embedding cache / content hash key), without loading it."""
+    if (backend or EMBEDDING_BACKEND).lower() == "onnx":
+        quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+        return f"{model_name}#onnx{'-int8' if quantize else ''}"
+    return model_name
+
+
+def load_embedding_backend(model_name: str, backend: Optional[str] = None, quantize: Optional[bool] = None) -> EmbeddingBackend:
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "torch":
+        return TorchBackend(model_name)
+    if backend == "onnx":
+        quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+        model_dir = onnx_model_dir(model_name)
+        if not (model_dir / "model.onnx").exists():
+            logger.warning(f"No ONNX export of {model_name} in {model_dir}, exporting now (one-time)")
+            export_onnx(model_name, model_dir, quantize)
+        elif quantize and not (model_dir / "model.int8.onnx").exists():
+            quantize_onnx(model_dir)
+        return OnnxBackend(model_dir, quantized=quantize)
+    raise ValueError(f"Unknown embedding backend {backend!r} (expected 'torch' or 'onnx')")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Embedding backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export a SentenceTransformer model to ONNX for EMBEDDING_BACKEND=onnx")
+    export.add_argument("--model", type=str, default="thenlper/gte-large")
+    export.add_argument("--out", type=str, default=None, help="Output directory (default: EMBEDDING_ONNX_DIR/<model>)")
+    export.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model (model.int8.onnx)")
+    args = parser.parse_args()
+    print(f"✅ Exported to {export_onnx(args.model, Path(args.out) if args.out else None, args.quantize)}")
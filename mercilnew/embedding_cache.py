@@ -0,0 +1,74 @@
+"""
+Bounded cache of query embeddings.
+
+Vectors are kept as read-only float32 NumPy arrays keyed by the exact text
+that was encoded, and evicted LRU once the total size exceeds `max_bytes`.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: np.ndarray) -> np.ndarray:
+        vector = np.ascontiguousarray(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        if vector.nbytes > self.max_bytes:
+            return vector
+        with self._lock:
+            old = self._entries.pop(text, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[text] = vector
+            self.nbytes += vector.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+        return vector
+
+    def get_or_encode(self, text: str, encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return the cached vector for `text`, encoding (and caching) it on a miss."""
+        vector = self.get(text)
+        if vector is None:
+            vector = self.put(text, encode([text])[0])
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,129 @@
+"""
+Persistent embedding cache for build_vectorstore.py, keyed by (model, text).
+
+One directory per model name holding
+  vectors.f32  raw float32 rows (append-only), read through np.memmap
+  keys.bin     20-byte sha1 of each row's text, in row order
+  meta.json    {"model": ..., "dim": ...}
+
+Cached rows are served straight from the memory map (a contiguous hit range
+is returned as a view, otherwise gathered into one output array) and only
+misses go to the model, so rebuilding with different metadata, POI config
+or collection name does not re-encode unchanged descriptions. Vectors are
+written before their keys, so a crash mid-append can only leave unindexed
+trailing bytes, which are trimmed on the next open. One writer at a time.
+"""
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("embedding_store")
+
+KEY_SIZE = 20  # sha1 digest
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def _model_dir_name(model_name: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_") or "model"
+    return f"{slug}-{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:8]}"
+
+
+class EmbeddingStore:
+    def __init__(self, root: Path, model_name: str):
+        self.model_name = model_name
+        self.dir = Path(root) / _model_dir_name(model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.dir / "vectors.f32"
+        self._keys_path = self.dir / "keys.bin"
+        self._meta_path = self.dir / "meta.json"
+        self.dim: Optional[int] = json.loads(self._meta_path.read_text())["dim"] if self._meta_path.exists() else None
+
+        keys = self._keys_path.read_bytes() if self._keys_path.exists() else b""
+        count = len(keys) // KEY_SIZE
+        if self.dim:
+            vector_bytes = self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+            count = min(count, vector_bytes // (self.dim * 4))
+        else:
+            count = 0
+        self._rows: Dict[bytes, int] = {keys[i * KEY_SIZE:(i + 1) * KEY_SIZE]: i for i in range(count)}
+        self._count = count
+        self._repair()
+        self._mmap: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _repair(self) -> None:
+        # ตัดส่วนท้ายที่เขียนไม่ครบ (โปรแกรมตายกลาง append) ให้ไฟล์ตรงกับจำนวนแถวที่ index ไว้
+        for path, size in ((self._keys_path, self._count * KEY_SIZE), (self._vectors_path, self._count * (self.dim or 0) * 4)):
+            if path.exists() and path.stat().st_size != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def matrix(self) -> np.ndarray:
+        """All cached vectors as a read-only (n, dim) memory map."""
+        if self._count == 0 or not self.dim:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if self._mmap is None or self._mmap.shape[0] != self._count:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._count, self.dim))
+        return self._mmap
+
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """Row of each key in matrix(), -1 for a miss."""
+        return np.fromiter((self._rows.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+
+    def add(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(keys) == 0:
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}))
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim {vectors.shape[1]} != cached dim {self.dim} for {self.model_name}")
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._keys_path, "ab") as f:
+            f.write(b"".join(keys))
+        for offset, key in enumerate(keys):
+            self._rows[key] = self._count + offset
+        self._count += len(keys)
+
+    def encode(self, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings for `texts` in order: cached rows come from the memory map,
+        only missing (unique) texts are passed to `encode` and then stored.
+        """
+        keys = [text_key(t) for t in texts]
+        rows = self.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if len(missing):
+            new_keys: Dict[bytes, str] = {}
+            for i in missing:
+                new_keys.setdefault(keys[i], texts[i])
+            logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, encoding {len(new_keys)} new texts")
+            self.add(list(new_keys), encode(list(new_keys.values())))
+            rows = self.lookup(keys)
+        else:
+            logger.info(f"Embedding cache: all {len(texts)} texts cached, model not needed")
+
+        matrix = self.matrix()
+        if len(rows) and rows[-1] - rows[0] == len(rows) - 1 and np.all(np.diff(rows) == 1):
+            return matrix[rows[0]:rows[-1] + 1]  # view ของ memmap ไม่ copy
+        return matrix[rows]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "entries": self._count, "dim": self.dim, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,136 @@
+"""
+Cache for validated intent dicts, keyed by a normalized query.
+
+Two tiers:
+  * in-memory LRU with TTL (per process)
+  * optional SQLite file (survives restarts, shared by all workers on the host)
+"""
+import copy
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("intent_cache")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical cache key: NFKC, Thai/Arabic-Indic digits -> ASCII,
+    case-folded, whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFKC", query)
+    chars = []
+    for ch in text:
+        if not ch.isascii():
+            digit = unicodedata.decimal(ch, None)
+            if digit is not None:
+                ch = str(digit)
+        chars.append(ch)
+    return " ".join("".join(chars).casefold().split())
+
+
+class IntentCache:
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 86400, db_path: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if db_path:
+            self._open_db(Path(db_path))
+
+    def _open_db(self, db_path: Path) -> None:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), timeout=5.0, check_same_thread=False, isolation_level=None)
+        # WAL ให้หลาย worker อ่าน/เขียนไฟล์เดียวกันได้พร้อมกัน
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS intent_cache (key TEXT PRIMARY KEY, intent TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        logger.info(f"Intent cache persisted at: {db_path}")
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, intent = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(intent)
+                del self._entries[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT intent, created_at FROM intent_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    intent = json.loads(row[0])
+                    self._put(key, intent, row[1])
+                    self.disk_hits += 1
+                    return copy.deepcopy(intent)
+
+            self.misses += 1
+            return None
+
+    def set(self, query: str, intent: Dict[str, Any]) -> None:
+        key = normalize_query(query)
+        now = time.time()
+        intent = copy.deepcopy(intent)
+        with self._lock:
+            self._put(key, intent, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intent_cache (key, intent, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(intent, ensure_ascii=False), now),
+                )
+
+    def _put(self, key: str, intent: Dict[str, Any], created_at: float) -> None:
+        self._entries[key] = (created_at, intent)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired rows from the SQLite tier. Returns number of rows removed."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM intent_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intent_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,187 @@
+"""
+Rule-based fast path for intent detection.
+
+Compiles the same synonym / price / asset-type tables the LLM prompt uses
+into a single regex and produces the intent dict locally. `parse` returns
+None whenever anything in the query is left unexplained (place names,
+nice-to-have wording, ambiguous terms, unparsed numbers, contradictory or
+inverted prices, empty queries...), so the caller falls back to the LLM
+only for queries the rules cannot fully cover.
+"""
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from intent_cache import normalize_query
+
+# ประเภททรัพย์ (ตรงกับตัวเลือกใน ENHANCED_INTENT_DETECTION_PROMPT)
+ASSET_TYPE_SYNONYMS = {
+    "คอนโด": ["คอนโด"],
+    "คอนโดมิเนียม": ["คอนโด"],
+    "อาคารชุด": ["คอนโด"],
+    "ห้องชุด": ["คอนโด"],
+    "condo": ["คอนโด"],
+    "บ้านเดี่ยว": ["บ้านเดี่ยว"],
+    "บ้านแฝด": ["บ้านแฝด"],
+    "ทาวน์โฮม": ["ทาวน์โฮม"],
+    "ทาวน์เฮ้าส์": ["ทาวน์โฮม"],
+    "ทาวน์เฮาส์": ["ทาวน์โฮม"],
+    "townhome": ["ทาวน์โฮม"],
+    "townhouse": ["ทาวน์โฮม"],
+    "อาคารพาณิชย์": ["อาคารพาณิชย์"],
+    "ตึกแถว": ["อาคารพาณิชย์"],
+    "shophouse": ["อาคารพาณิชย์"],
+    "ที่ดิน": ["ที่ดิน"],
+    # "บ้าน" เฉยๆ -> บ้านเดี่ยว + บ้านแฝด (ตามกฎใน prompt)
+    "บ้าน": ["บ้านเดี่ยว", "บ้านแฝด"],
+}
+
+PET_PHRASES = {
+    "ไม่เลี้ยงสัตว์": False,
+    "ห้ามเลี้ยงสัตว์": False,
+    "ไม่มีสัตว์เลี้ยง": False,
+    "เลี้ยงสัตว์ได้": True,
+    "เลี้ยงสัตว์": True,
+    "สัตว์เลี้ยง": True,
+    "เลี้ยงหมา": True,
+    "เลี้ยงแมว": True,
+    "pet friendly": True,
+    "pet-friendly": True,
+}
+
+# คำที่บอกว่า POI ถัดไปเป็น must_have / avoid_poi
+MUST_HAVE_CUES = ["ใกล้", "ติด", "เดินไป", "near"]
+AVOID_CUES = ["ไม่ใกล้", "ไม่เอาใกล้", "ไม่อยากอยู่ใกล้", "ไม่อยากใกล้", "ไกลจาก", "ห่างจาก", "หนีห่าง", "หนี"]
+
+# คำที่ไม่มีผลกับ intent
+FILLER_WORDS = [
+    "หา", "อยากได้", "อยาก", "ต้องการ", "ขอ", "ราคา", "งบ", "ที่", "และ", "กับ", "หรือ", "มี", "ได้",
+    "ครับ", "ค่ะ", "คะ", "นะ", "หน่อย", "ๆ", "ซื้อ", "ขาย", "บาท", "ทรัพย์", "แบบ", "for", "and", "with", "sale",
+]
+
+# คำที่ตีความได้หลายแบบ หรือเป็นความต้องการแบบ nice-to-have -> ให้ LLM ตัดสิน
+AMBIGUOUS_WORDS = ["มหาลัย", "ถ้ามี", "เผื่อ", "ก็ดี", "พอ", "แถว", "ย่าน", "โซน"]
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_MILLION = r"(?:ล้าน(?:บาท)?|ล\.|m(?![a-z])|mb)"
+# pattern ต้องอยู่ในรูป NFKC เดียวกับ query (NFKC แยก "ำ" เป็น "ํ" + "า")
+_PRICE_RANGE = re.compile(unicodedata.normalize("NFKC", _NUMBER + r"\s*(?:-|–|ถึง|to)\s*" + _NUMBER + r"\s*" + _MILLION))
+_PRICE_MAX = re.compile(unicodedata.normalize("NFKC", r"(?:ไม่เกิน|ต่ำกว่า|ไม่ถึง|under|below|<=?)\s*" + _NUMBER + r"\s*" + _MILLION))
+_PRICE_MIN = re.compile(unicodedata.normalize("NFKC", r"(?:ตั้งแต่|มากกว่า|ขั้นต่ำ|เกิน|over|above|>=?)\s*" + _NUMBER + r"\s*" + _MILLION))
+_RESIDUE = re.compile(r"[\s,.!?/()\-]+")
+
+
+def _millions(value: str) -> int:
+    return int(round(float(value) * 1_000_000))
+
+
+class RuleBasedIntentParser:
+    def __init__(self, asset_id_mapping: Dict[str, List[int]], poi_keys: Iterable[str], poi_synonyms: Dict[str, str]):
+        poi_keys = set(poi_keys)
+        known_types = set(asset_id_mapping) | {"ที่ดิน"}
+        self._tokens: Dict[str, Tuple[str, Any]] = {}
+        for word in FILLER_WORDS:
+            self._tokens[word] = ("filler", None)
+        for word in AMBIGUOUS_WORDS:
+            self._tokens[word] = ("ambiguous", None)
+        for word, types in ASSET_TYPE_SYNONYMS.items():
+            if all(t in known_types for t in types):
+                self._tokens[word] = ("asset", types)
+        for word, poi_key in poi_synonyms.items():
+            if poi_key in poi_keys:
+                self._tokens[word] = ("poi", poi_key)
+        for word, value in PET_PHRASES.items():
+            self._tokens[word] = ("pet", value)
+        for word in MUST_HAVE_CUES:
+            self._tokens[word] = ("cue", "must_have")
+        for word in AVOID_CUES:
+            self._tokens[word] = ("cue", "avoid_poi")
+        # ตารางคำต้อง normalize แบบเดียวกับ query ก่อนนำไป match
+        self._tokens = {normalize_query(word): value for word, value in self._tokens.items()}
+        # เรียงคำยาวก่อน เพื่อให้ "บ้านเดี่ยว" ชนะ "บ้าน" และ "ไม่ใกล้" ชนะ "ใกล้"
+        words = sorted(self._tokens, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(w) for w in words))
+
+    def _extract_price(self, text: str) -> Tuple[Optional[Dict[str, Optional[int]]], str]:
+        """price_range + text with the price phrases blanked out; price_range is None when the phrases contradict."""
+        price_range: Dict[str, Optional[int]] = {"min": None, "max": None}
+
+        def set_bound(key: str, value: int) -> bool:
+            if price_range[key] is not None and price_range[key] != value:
+                return False
+            price_range[key] = value
+            return True
+
+        for pattern in (_PRICE_RANGE, _PRICE_MAX, _PRICE_MIN):
+            for match in pattern.finditer(text):
+                if pattern is _PRICE_RANGE:
+                    ok = set_bound("min", _millions(match.group(1))) and set_bound("max", _millions(match.group(2)))
+                elif pattern is _PRICE_MAX:
+                    ok = set_bound("max", _millions(match.group(1)))
+                else:
+                    ok = set_bound("min", _millions(match.group(1)))
+                # ราคาขัดกันเอง ("ไม่เกิน 3 ล้าน ... ไม่เกิน 5 ล้าน") -> ให้ LLM ตัดสิน
+                if not ok:
+                    return None, text
+                text = text[:match.start()] + " " * (match.end() - match.start()) + text[match.end():]
+        # ช่วงกลับด้าน ("5-3 ล้าน") ไม่มีทางตรงกับทรัพย์ไหนเลย
+        if price_range["min"] is not None and price_range["max"] is not None and price_range["min"] > price_range["max"]:
+            return None, text
+        return price_range, text
+
+    def parse(self, query: str) -> Optional[Dict[str, Any]]:
+        """Intent dict in the same shape as the LLM intent (detect_intent), or None if not confident."""
+        text = normalize_query(query).replace(",", "")
+        price_range, text = self._extract_price(text)
+        if price_range is None:
+            return None
+
+        intent: Dict[str, Any] = {
+            "asset_types": [], "must_have": [], "nice_to_have": [], "avoid_poi": [],
+            "pet_friendly": None, "price_range": price_range,
+        }
+        poi_slot = "must_have"
+        residue = []
+        last_end = 0
+        for match in self._pattern.finditer(text):
+            residue.append(text[last_end:match.start()])
+            last_end = match.end()
+            kind, value = self._tokens[match.group(0)]
+            if kind == "ambiguous":
+                return None
+            if kind == "asset":
+                intent["asset_types"].extend(t for t in value if t not in intent["asset_types"])
+            elif kind == "poi":
+                if value not in intent[poi_slot]:
+                    intent[poi_slot].append(value)
+            elif kind == "cue":
+                poi_slot = value
+            elif kind == "pet":
+                if intent["pet_friendly"] is not None and intent["pet_friendly"] != value:
+                    return None
+                intent["pet_friendly"] = value
+        residue.append(text[last_end:])
+
+        # เหลือคำที่ไม่รู้จัก (ชื่อย่าน, ตัวเลขที่ไม่ใช่ราคา ฯลฯ) -> ไม่มั่นใจ
+        if _RESIDUE.sub("", "".join(residue)):
+            return None
+        if set(intent["must_have"]) & set(intent["avoid_poi"]):
+            return None
+        # query ว่าง / มีแต่คำเติม -> ไม่มีอะไรให้ตอบ ให้ LLM ตัดสิน
+        if not any(intent[key] for key in ("asset_types", "must_have", "avoid_poi")) and intent["pet_friendly"] is None \
+                and price_range["min"] is None and price_range["max"] is None:
+            return None
+        return intent
+
+
+def canonical_intent(intent: Dict[str, Any]) -> Dict[str, Any]:
+    """Order-insensitive lists and numeric prices, so 3e6 == 3000000 (for comparing parser vs LLM intents)."""
+    price_range = intent.get("price_range") or {}
+    return {
+        "asset_types": sorted(intent.get("asset_types") or []),
+        "must_have": sorted(intent.get("must_have") or []),
+        "nice_to_have": sorted(intent.get("nice_to_have") or []),
+        "avoid_poi": sorted(intent.get("avoid_poi") or []),
+        "pet_friendly": intent.get("pet_friendly"),
+        "price_range": {k: (float(price_range[k]) if price_range.get(k) is not None else None) for k in ("min", "max")},
+    }
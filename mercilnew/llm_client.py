@@ -0,0 +1,193 @@
+"""
+Shared HTTP clients for OpenRouter (OpenAI-compatible chat completions).
+
+Both flavors (OpenRouterClient for threads, AsyncOpenRouterClient for
+asyncio) keep a pooled, keep-alive connection to the upstream, apply
+explicit connect/read timeouts and retry transient failures (connection
+errors, timeouts, 429, 5xx) with exponential backoff + full jitter, bounded
+by a retry count and a total time budget. A 200 whose body is not a chat
+completion raises LLMClientError like any other failure.
+
+Point OPENROUTER_BASE_URL at a local stub (see openrouter_stub.py) to test
+without calling the real API.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("llm_client")
+
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3.05"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BUDGET = float(os.getenv("LLM_RETRY_BUDGET", "45"))  # วินาที รวมทุก attempt
+LLM_BACKOFF_BASE = 0.25
+LLM_BACKOFF_MAX = 4.0
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "16"))
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMClientError(Exception):
+    """Raised when a chat completion cannot be obtained within the retry budget."""
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when it is a number."""
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _build_payload(model: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    return {"model": model, "messages": messages}
+
+
+def _extract_content(response: Any, url: str) -> str:
+    """Message text of a 200 response (requests or httpx); LLMClientError if the body is not a completion."""
+    try:
+        content = response.json()['choices'][0]['message']['content']
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise LLMClientError(f"Malformed completion from {url}: {e!r}") from e
+    if not isinstance(content, str):
+        raise LLMClientError(f"Malformed completion from {url}: content is {type(content).__name__}")
+    return content
+
+
+def _deadline(retry_budget: float, budget: Optional[float]) -> float:
+    return time.monotonic() + (retry_budget if budget is None else min(budget, retry_budget))
+
+
+class OpenRouterClient:
+    """Thread-safe synchronous client backed by a pooled requests.Session."""
+
+    def __init__(self, api_key: Optional[str], base_url: str = OPENROUTER_BASE_URL,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, retry_budget: float = LLM_RETRY_BUDGET,
+                 pool_size: int = LLM_POOL_SIZE):
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        # Retry เองด้านล่าง (มี jitter + budget) จึงปิด retry ของ urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def chat(self, messages: List[Dict[str, str]], model: str, budget: Optional[float] = None) -> str:
+        """`budget` (seconds) caps this call below the client's retry budget, read timeout included."""
+        deadline = _deadline(self.retry_budget, budget)
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                remaining = max(0.01, deadline - time.monotonic())
+                timeout = (min(self.timeout[0], remaining), min(self.timeout[1], remaining))
+                response = self.session.post(self.url, json=_build_payload(model, messages), timeout=timeout)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return _extract_content(response, self.url)
+                retry_after = response.headers.get("Retry-After")
+                error: Exception = LLMClientError(f"HTTP {response.status_code} from {self.url}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError as e:
+                raise LLMClientError(str(e)) from e
+
+            delay = _backoff_delay(attempt, retry_after)
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                raise LLMClientError(f"OpenRouter request failed after {attempt + 1} attempt(s): {error}") from error
+            logger.warning(f"OpenRouter attempt {attempt + 1} failed ({error}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncOpenRouterClient:
+    """asyncio client backed by a pooled httpx.AsyncClient (usable only on the event loop that created it)."""
+
+    def __init__(self, api_key: Optional[str], base_url: str = OPENROUTER_BASE_URL,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, retry_budget: float = LLM_RETRY_BUDGET,
+                 pool_size: int = LLM_POOL_SIZE):
+        self.url = f"{base_url.rstrip('/')}/chat/completions"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def chat(self, messages: List[Dict[str, str]], model: str, budget: Optional[float] = None) -> str:
+        """Same contract as OpenRouterClient.chat."""
+        deadline = _deadline(self.retry_budget, budget)
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                remaining = max(0.01, deadline - time.monotonic())
+                timeout = httpx.Timeout(min(self.timeout[1], remaining), connect=min(self.timeout[0], remaining))
+                response = await self.client.post(self.url, json=_build_payload(model, messages), timeout=timeout)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    return _extract_content(response, self.url)
+                retry_after = response.headers.get("Retry-After")
+                error: Exception = LLMClientError(f"HTTP {response.status_code} from {self.url}")
+            except httpx.TransportError as e:
+                error = e
+            except httpx.HTTPStatusError as e:
+                raise LLMClientError(str(e)) from e
+
+            delay = _backoff_delay(attempt, retry_after)
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                raise LLMClientError(f"OpenRouter request failed after {attempt + 1} attempt(s): {error}") from error
+            logger.warning(f"OpenRouter attempt {attempt + 1} failed ({error}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_sync_client: Optional[OpenRouterClient] = None
+_sync_client_lock = threading.Lock()
+
+
+def get_openrouter_client(api_key: Optional[str], pool_size: int = LLM_POOL_SIZE) -> OpenRouterClient:
+    """Process-wide sync client, so every call reuses the same connection pool (sized by the first caller)."""
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = OpenRouterClient(api_key, pool_size=pool_size)
+        return _sync_client
+
+
+# httpx.AsyncClient ผูกกับ event loop ที่สร้าง จึงเก็บ client แยกต่อ loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenRouterClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_openrouter_client(api_key: Optional[str], pool_size: int = LLM_POOL_SIZE) -> AsyncOpenRouterClient:
+    """Async client of the running event loop (one per loop). Must be called from a coroutine."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOpenRouterClient(api_key, pool_size=pool_size)
+    return client
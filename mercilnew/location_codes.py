@@ -0,0 +1,82 @@
+"""
+Canonical province / district codes.
+
+build_vectorstore.py writes `province_code` / `district_code` into every
+asset's metadata; the search side maps user input to the same codes once
+and filters with exact equality (`$eq` / `$in`) inside the Chroma query,
+instead of a substring test per candidate.
+
+A code is the place name with administrative prefixes ("จังหวัด", "อำเภอ",
+"เขต", ...) and "มหานคร" removed, NFKC + casefold, no whitespace, with a
+few common aliases folded in ("กทม", "Bangkok" -> "กรุงเทพ").
+"""
+import re
+import unicodedata
+from typing import Any, Callable, List
+
+PROVINCE_PREFIXES = ["จังหวัด", "จ."]
+DISTRICT_PREFIXES = ["กิ่งอำเภอ", "อำเภอ", "อ.", "เขต", "ข."]
+
+PROVINCE_ALIASES = {
+    "กทม": "กรุงเทพ",
+    "กทม.": "กรุงเทพ",
+    "กรุงเทพฯ": "กรุงเทพ",
+    "bangkok": "กรุงเทพ",
+    "bkk": "กรุงเทพ",
+    "nonthaburi": "นนทบุรี",
+    "pathumthani": "ปทุมธานี",
+    "samutprakan": "สมุทรปราการ",
+    "samutsakhon": "สมุทรสาคร",
+    "nakhonpathom": "นครปฐม",
+    "chonburi": "ชลบุรี",
+    "chiangmai": "เชียงใหม่",
+    "phuket": "ภูเก็ต",
+    "โคราช": "นครราชสีมา",
+    "อยุธยา": "พระนครศรีอยุธยา",
+}
+
+_WHITESPACE = re.compile(r"\s+")
+_MISSING = {"", "n/a", "nan", "none"}
+
+
+def _clean(name: Any) -> str:
+    if name is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(name)).casefold()
+    text = _WHITESPACE.sub("", text)
+    return "" if text in _MISSING else text
+
+
+# prefix / alias ผ่าน _clean ด้วย (NFKC แยก "ำ" ใน "อำเภอ" เป็น "ํ" + "า")
+_PROVINCE_PREFIXES = [_clean(p) for p in PROVINCE_PREFIXES]
+_DISTRICT_PREFIXES = [_clean(p) for p in DISTRICT_PREFIXES]
+_PROVINCE_ALIASES = {_clean(k): _clean(v) for k, v in PROVINCE_ALIASES.items()}
+
+
+def _strip_prefix(text: str, prefixes: List[str]) -> str:
+    for prefix in prefixes:
+        if text.startswith(prefix) and len(text) > len(prefix):
+            return text[len(prefix):]
+    return text
+
+
+def province_code(name: Any) -> str:
+    text = _strip_prefix(_clean(name), _PROVINCE_PREFIXES)
+    text = _PROVINCE_ALIASES.get(text, text)
+    text = text.replace("มหานคร", "").replace("ฯ", "")
+    return _PROVINCE_ALIASES.get(text, text)
+
+
+def district_code(name: Any) -> str:
+    return _strip_prefix(_clean(name), _DISTRICT_PREFIXES)
+
+
+def location_codes(value: Any, to_code: Callable[[Any], str]) -> List[str]:
+    """Codes for a filter value that may be a single name or a list of names (empty codes dropped)."""
+    names = value if isinstance(value, (list, tuple, set)) else [value]
+    codes = []
+    for name in names:
+        code = to_code(name)
+        if code and code not in codes:
+            codes.append(code)
+    return codes
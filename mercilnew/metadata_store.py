@@ -0,0 +1,186 @@
+"""
+In-process columnar copy of the asset metadata needed for filtering and
+scoring, loaded once from the Chroma collection at startup.
+
+Numeric fields live in NumPy arrays indexed by row; province/district are
+stored as canonical location codes (see location_codes.py), interned
+(int32 code + vocabulary). Long text fields are not kept here —
+callers fetch full metadata from Chroma only for the final results.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from content_fingerprint import ContentFingerprint
+from location_codes import district_code, province_code
+from ranking import CandidateArrays, MISSING_DISTANCE, as_float
+
+logger = logging.getLogger("metadata_store")
+
+_COMPARE = {
+    "$eq": np.equal, "$ne": np.not_equal,
+    "$lt": np.less, "$lte": np.less_equal, "$gt": np.greater, "$gte": np.greater_equal,
+}
+
+
+class StringColumn:
+    """Interned string column: codes[i] indexes into vocab."""
+
+    def __init__(self):
+        self.vocab: List[str] = []
+        self._lookup: Dict[str, int] = {}
+        self._codes: List[int] = []
+        self.codes: Optional[np.ndarray] = None
+
+    def append(self, value: Any) -> None:
+        value = str(value) if value is not None else "N/A"
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.vocab)
+            self.vocab.append(value)
+        self._codes.append(code)
+
+    def freeze(self) -> None:
+        self.codes = np.array(self._codes, dtype=np.int32)
+        self._codes = []
+
+    def code_of(self, value: str) -> int:
+        return self._lookup.get(value, -1)
+
+    def codes_of(self, values: Iterable[str]) -> np.ndarray:
+        """Interned codes of the values present in the column (unknown values dropped)."""
+        return np.array([self._lookup[v] for v in values if v in self._lookup], dtype=np.int32)
+
+    def nbytes(self) -> int:
+        return self.codes.nbytes + sum(len(v.encode("utf-8")) for v in self.vocab)
+
+
+class ColumnarMetadataStore:
+    def __init__(self, poi_keys: Iterable[str]):
+        self.poi_keys = list(poi_keys)
+        self.ids: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        self.province_code = StringColumn()
+        self.district_code = StringColumn()
+        self._price: List[float] = []
+        self._asset_type_id: List[float] = []
+        self._pet_friendly: List[bool] = []
+        self._lifestyle: List[float] = []
+        self._latitude: List[float] = []
+        self._longitude: List[float] = []
+        self._poi: List[List[float]] = []
+        self.fingerprint = ""  # ContentFingerprint ของ collection ตอนโหลด (ใช้เช็ค export ของ vector_index)
+
+    @classmethod
+    def load(cls, collection, poi_keys: Iterable[str], page_size: int = 5000) -> "ColumnarMetadataStore":
+        store = cls(poi_keys)
+        fingerprint = ContentFingerprint()
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            for asset_id, meta in zip(ids, page["metadatas"]):
+                store._append(asset_id, meta or {})
+            fingerprint.update(ids, page["metadatas"])
+            offset += len(ids)
+        store._freeze()
+        store.fingerprint = fingerprint.hexdigest()
+        logger.info(f"✅ Columnar metadata store loaded: {len(store)} rows, {store.nbytes() / 1e6:.1f} MB")
+        return store
+
+    def _append(self, asset_id: str, meta: Dict[str, Any]) -> None:
+        self.row_of[asset_id] = len(self.ids)
+        self.ids.append(asset_id)
+        self._price.append(as_float(meta.get("asset_details_selling_price", 0), 0.0))
+        self._asset_type_id.append(as_float(meta.get("asset_type_id", 0), 0.0))
+        self._pet_friendly.append(meta.get("pet_friendly", False) is True)
+        self._lifestyle.append(as_float(meta.get("lifestyle_score", 0), 0.0))
+        self._latitude.append(as_float(meta.get("location_latitude"), np.nan))
+        self._longitude.append(as_float(meta.get("location_longitude"), np.nan))
+        self._poi.append([as_float(meta.get(key, MISSING_DISTANCE), MISSING_DISTANCE) for key in self.poi_keys])
+        # collection เก่าที่ยังไม่มี *_code ก็คำนวณจากชื่อได้
+        self.province_code.append(meta.get("province_code") or province_code(meta.get("province_th")))
+        self.district_code.append(meta.get("district_code") or district_code(meta.get("district_th")))
+
+    def _freeze(self) -> None:
+        self.price = np.array(self._price, dtype=np.float64)
+        self.asset_type_id = np.array(self._asset_type_id, dtype=np.float64)
+        self.pet_friendly = np.array(self._pet_friendly, dtype=bool)
+        self.lifestyle = np.array(self._lifestyle, dtype=np.float64)
+        self.latitude = np.array(self._latitude, dtype=np.float64)
+        self.longitude = np.array(self._longitude, dtype=np.float64)
+        self.poi_distance = np.array(self._poi, dtype=np.float64).reshape(len(self.ids), len(self.poi_keys))
+        self.province_code.freeze()
+        self.district_code.freeze()
+        self._price = self._asset_type_id = self._pet_friendly = self._lifestyle = self._poi = []
+        self._latitude = self._longitude = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows_for(self, ids: List[str]) -> np.ndarray:
+        """Row index per id, -1 for ids not in the store (added after startup)."""
+        return np.fromiter((self.row_of.get(i, -1) for i in ids), dtype=np.int64, count=len(ids))
+
+    def where_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """
+        Rows matching a Chroma `where` clause, for the fields and operators
+        search_pipeline builds ($and / $or, $eq / $ne / $in / $nin / $lt /
+        $lte / $gt / $gte). Raises ValueError for anything else.
+        """
+        if not where:
+            return np.ones(len(self.ids), dtype=bool)
+        if len(where) > 1:  # {a: ..., b: ...} = $and
+            return self.where_mask({"$and": [{k: v} for k, v in where.items()]})
+        field, condition = next(iter(where.items()))
+        if field in ("$and", "$or"):
+            masks = [self.where_mask(clause) for clause in condition]
+            return np.logical_and.reduce(masks) if field == "$and" else np.logical_or.reduce(masks)
+        column, encode = self._where_column(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        mask = np.ones(len(self.ids), dtype=bool)
+        for op, value in condition.items():
+            if op in ("$in", "$nin"):
+                hit = np.isin(column, [encode(v) for v in value])
+                mask &= hit if op == "$in" else ~hit
+            elif op in _COMPARE:
+                mask &= _COMPARE[op](column, encode(value))
+            else:
+                raise ValueError(f"Unsupported where operator {op!r}")
+        return mask
+
+    def _where_column(self, field: str):
+        numeric = {
+            "asset_details_selling_price": self.price, "asset_type_id": self.asset_type_id,
+            "lifestyle_score": self.lifestyle, "location_latitude": self.latitude, "location_longitude": self.longitude,
+        }
+        if field in numeric:
+            return numeric[field], float
+        if field == "pet_friendly":
+            return self.pet_friendly, bool
+        # province_th / district_th (collection เก่า) เทียบผ่าน code ที่ normalize แล้ว
+        strings = {
+            "province_code": (self.province_code, str), "district_code": (self.district_code, str),
+            "province_th": (self.province_code, province_code), "district_th": (self.district_code, district_code),
+        }
+        if field in strings:
+            column, to_code = strings[field]
+            return column.codes, lambda value: column.code_of(to_code(value))
+        raise ValueError(f"Field {field!r} is not in the columnar metadata store")
+
+    def candidate_arrays(self, rows: np.ndarray, semantic: np.ndarray) -> CandidateArrays:
+        return CandidateArrays(
+            semantic=semantic,
+            asset_type_id=self.asset_type_id[rows],
+            pet_friendly=self.pet_friendly[rows],
+            lifestyle=self.lifestyle[rows],
+            poi_distance=self.poi_distance[rows],
+        )
+
+    def nbytes(self) -> int:
+        arrays = (self.price, self.asset_type_id, self.pet_friendly, self.lifestyle, self.latitude, self.longitude, self.poi_distance)
+        return sum(a.nbytes for a in arrays) + self.province_code.nbytes() + self.district_code.nbytes()
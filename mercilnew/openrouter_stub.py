@@ -0,0 +1,124 @@
+"""
+Minimal OpenRouter-compatible stub server for local testing.
+
+Serves POST /api/v1/chat/completions with a canned answer, an optional
+artificial latency and an optional number of initial failures (to exercise
+retries). Connections are kept alive (HTTP/1.1).
+
+Usage:
+    python openrouter_stub.py --port 8099 --latency 0.5 --fail-first 1
+    OPENROUTER_BASE_URL=http://127.0.0.1:8099/api/v1 python api_service.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+DEFAULT_INTENT = {
+    "asset_types": ["คอนโด"],
+    "must_have": ["bts_station"],
+    "nice_to_have": [],
+    "avoid_poi": [],
+    "pet_friendly": None,
+    "price_range": {"min": None, "max": 3000000},
+}
+
+
+class StubState:
+    def __init__(self, latency: float = 0.0, fail_first: int = 0, fail_status: int = 503, content: Optional[str] = None,
+                 raw_body: Optional[bytes] = None):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.content = content
+        self.raw_body = raw_body  # ตอบ 200 ด้วย body นี้แทน completion (ทดสอบ body เสีย)
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with state.lock:
+                state.connections += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            with state.lock:
+                state.requests += 1
+                fail = state.requests <= state.fail_first
+            if state.latency:
+                time.sleep(state.latency)
+            if fail:
+                self._send_json(state.fail_status, {"error": {"message": "stub failure"}})
+                return
+            if state.raw_body is not None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(state.raw_body)))
+                self.end_headers()
+                self.wfile.write(state.raw_body)
+                return
+            system_prompt = request.get("messages", [{}])[0].get("content", "")
+            if state.content is not None:
+                content = state.content
+            elif "JSON" in system_prompt:
+                content = json.dumps(DEFAULT_INTENT, ensure_ascii=False)
+            else:
+                content = "ทรัพย์นี้อยู่ใกล้ BTS (stub)"
+            self._send_json(200, {
+                "id": "stub",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            })
+
+    return Handler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, **kwargs) -> tuple:
+    """Start the stub in a daemon thread. Returns (server, state, base_url)."""
+    state = StubState(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/api/v1"
+    return server, state, base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenRouter-compatible stub server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--fail-first", type=int, default=0)
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    state = StubState(latency=args.latency, fail_first=args.fail_first, fail_status=args.fail_status)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"🧪 OpenRouter stub listening on http://{args.host}:{args.port}/api/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,82 @@
+"""
+Persistent cache of nearest-POI lookups for poi_fetcher.py.
+
+SQLite (WAL) keyed by "<lat:.6f>_<lon:.6f>_<poi_type>": the file is opened
+once, every lookup / write touches a single row, and each write is its own
+committed transaction, so a crash loses at most the lookup in flight.
+A cached None means "looked up, nothing found" and is not re-fetched.
+The old whole-file JSON cache (poi_cache_enhanced.json) can be imported.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("poi_cache")
+
+
+def poi_cache_key(lat: float, lon: float, poi_type: str) -> str:
+    return f"{lat:.6f}_{lon:.6f}_{poi_type}"
+
+
+class PoiCache:
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS poi_cache (key TEXT PRIMARY KEY, result TEXT)")
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def lookup(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(found, result); result may be None for a cached "not found"."""
+        with self._lock:
+            row = self._db.execute("SELECT result FROM poi_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, json.loads(row[0]) if row[0] is not None else None
+
+    def set(self, key: str, result: Optional[Dict[str, Any]]) -> None:
+        value = json.dumps(result, ensure_ascii=False) if result is not None else None
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO poi_cache (key, result) VALUES (?, ?)", (key, value))
+            self.writes += 1
+
+    def import_json(self, json_path: Path) -> int:
+        """Import an old poi_cache*.json file (existing keys win). Returns number of rows added."""
+        data = json.loads(Path(json_path).read_text())
+        rows = [(key, json.dumps(value, ensure_ascii=False) if value is not None else None) for key, value in data.items()]
+        with self._lock:
+            before = self._count()
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR IGNORE INTO poi_cache (key, result) VALUES (?, ?)", rows)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            added = self._count() - before
+        logger.info(f"Imported {added} / {len(rows)} entries from {json_path}")
+        return added
+
+    def _count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM poi_cache").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses, "writes": self.writes}
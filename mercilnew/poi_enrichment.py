@@ -0,0 +1,214 @@
+"""
+Parallel, rate-limited and resumable POI enrichment for poi_fetcher.py.
+
+* a thread pool resolves properties concurrently (one task = all POI types
+  of one property), sharing one token bucket that caps Maps requests/sec
+* results go into preallocated columnar buffers (distance float matrix +
+  name object matrix) instead of per-cell DataFrame writes
+* finished rows are appended to a checkpoint CSV every `checkpoint_every`
+  properties; `resume=True` reloads it and skips those properties. Every
+  row ends with a marker column, so a row cut short by a crash is refetched.
+  An existing checkpoint is never discarded unless `overwrite=True`
+* a property whose resolver raised (API error, not "not found") is neither
+  marked done nor checkpointed, so the next `resume=True` run fetches it
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, bursts up to `capacity`.
+    The default capacity of 1 spaces requests evenly, so no 1-second window
+    ever sees more than ~`rate` requests (a per-second quota).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_s = 0.0
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                self.waited_s += wait
+            time.sleep(wait)
+
+
+class RateLimitedMaps:
+    """Wraps a googlemaps.Client (or FakeMapsClient): every API call takes a token first."""
+
+    def __init__(self, client: Any, bucket: TokenBucket):
+        self._client = client
+        self.bucket = bucket
+        self.calls: Dict[str, int] = {"places_nearby": 0, "distance_matrix": 0}
+        self._lock = threading.Lock()
+
+    def _call(self, name: str, **kwargs) -> Any:
+        self.bucket.acquire()
+        with self._lock:
+            self.calls[name] += 1
+        return getattr(self._client, name)(**kwargs)
+
+    def places_nearby(self, **kwargs) -> Any:
+        return self._call("places_nearby", **kwargs)
+
+    def distance_matrix(self, **kwargs) -> Any:
+        return self._call("distance_matrix", **kwargs)
+
+
+class PoiBuffers:
+    """Preallocated results: distances[n, P] (NaN = not found), names[n, P], done[n]."""
+
+    def __init__(self, ids: np.ndarray, poi_keys: List[str]):
+        self.ids = ids
+        self.poi_keys = poi_keys
+        self.distances = np.full((len(ids), len(poi_keys)), np.nan)
+        self.names = np.full((len(ids), len(poi_keys)), None, dtype=object)
+        self.done = np.zeros(len(ids), dtype=bool)
+
+    def to_frame(self, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        rows = np.arange(len(self.ids)) if rows is None else rows
+        columns: Dict[str, Any] = {"id": self.ids[rows]}
+        for j, poi_key in enumerate(self.poi_keys):
+            columns[poi_key] = self.distances[rows, j]
+            columns[f"{poi_key}_name"] = self.names[rows, j]
+        return pd.DataFrame(columns)
+
+
+class Checkpoint:
+    """Append-only CSV of finished rows; on resume the last copy of an id wins."""
+
+    # คอลัมน์สุดท้ายของทุกแถว: แถวที่เขียนไม่ครบ (โปรแกรมตายกลางคัน) จะไม่มีค่านี้
+    ROW_END = "_row_end"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def _drop_partial_tail(self) -> None:
+        """Cut a last line left without its newline, so the next append starts on a fresh line."""
+        data = self.path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            with open(self.path, "r+b") as f:
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, frame: pd.DataFrame) -> None:
+        if frame.empty:
+            return
+        frame = frame.assign(**{self.ROW_END: 1})
+        header = not self.path.exists() or self.path.stat().st_size == 0
+        with open(self.path, "a", encoding="utf-8", newline="") as f:
+            frame.to_csv(f, index=False, header=header)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def restore(self, buffers: PoiBuffers) -> int:
+        """Fill buffers from the checkpoint; returns the number of properties restored."""
+        if not self.path.exists():
+            return 0
+        # บรรทัดสุดท้ายอาจเขียนไม่ครบถ้าโปรแกรมตายกลางคัน: ตัดทิ้ง แล้วกรองแถวที่ไม่มี marker อีกชั้น
+        # (on_bad_lines ข้ามเฉพาะแถวที่ field เกิน แถวที่ขาด field จะได้ NaN)
+        self._drop_partial_tail()
+        if self.path.stat().st_size == 0:
+            return 0
+        saved = pd.read_csv(self.path, on_bad_lines="skip", dtype={"id": str})
+        if self.ROW_END in saved.columns:
+            saved = saved[pd.to_numeric(saved[self.ROW_END], errors="coerce") == 1]
+        saved = saved.drop_duplicates("id", keep="last")
+        row_of = {str(i): r for r, i in enumerate(buffers.ids)}
+        rows = saved["id"].map(row_of)
+        saved, rows = saved[rows.notna()], rows[rows.notna()].astype(int).to_numpy()
+        for j, poi_key in enumerate(buffers.poi_keys):
+            if poi_key in saved.columns:
+                buffers.distances[rows, j] = pd.to_numeric(saved[poi_key], errors="coerce").to_numpy()
+                names = saved[f"{poi_key}_name"].astype(object).to_numpy()
+                buffers.names[rows, j] = np.where(pd.isna(names), None, names)
+        buffers.done[rows] = True
+        return len(rows)
+
+
+def enrich_parallel(df: pd.DataFrame, poi_types: Dict[str, str], resolve: Callable[[Any, float, float, str], Optional[dict]],
+                    maps: RateLimitedMaps, workers: int = 8, checkpoint: Optional[Checkpoint] = None,
+                    checkpoint_every: int = 200, resume: bool = False, overwrite: bool = False) -> PoiBuffers:
+    """
+    Resolve every POI type for every property with `resolve(maps, lat, lon, google_type)`
+    (poi_fetcher.find_nearest_poi) on a worker pool. `resolve` returns None
+    for "not found" and raises on errors. Returns the filled buffers.
+
+    An existing checkpoint is resumed with `resume=True` or replaced with
+    `overwrite=True`; otherwise FileExistsError is raised before any API call.
+    """
+    poi_keys = list(poi_types)
+    buffers = PoiBuffers(df["id"].to_numpy(), poi_keys)
+    lats = pd.to_numeric(df["location_latitude"], errors="coerce").to_numpy(dtype=np.float64)
+    lons = pd.to_numeric(df["location_longitude"], errors="coerce").to_numpy(dtype=np.float64)
+
+    if checkpoint is not None and resume:
+        restored = checkpoint.restore(buffers)
+        print(f" Resumed {restored} properties from checkpoint {checkpoint.path}")
+    elif checkpoint is not None and checkpoint.path.exists():
+        if not overwrite:
+            raise FileExistsError(f"Checkpoint {checkpoint.path} already exists: resume it or pass overwrite=True")
+        checkpoint.path.unlink()
+
+    invalid = np.isnan(lats) | np.isnan(lons)
+    buffers.done[invalid] = True  # ไม่มีพิกัด: ข้ามเหมือน engine เดิม
+    pending = np.flatnonzero(~buffers.done)
+    print(f" {len(pending)} properties to fetch with {workers} workers ({int(invalid.sum())} without coordinates)")
+
+    def fetch_row(row: int) -> Tuple[int, bool]:
+        """(row, ok); ok=False when any POI type failed (the rest are still resolved and cached)."""
+        ok = True
+        for j, (poi_key, poi_type) in enumerate(poi_types.items()):
+            try:
+                result = resolve(maps, lats[row], lons[row], poi_type)
+            except Exception:
+                ok = False
+                continue
+            if result and isinstance(result, dict):
+                buffers.distances[row, j] = result.get("distance", np.nan)
+                buffers.names[row, j] = result.get("name", "Unknown")
+        return row, ok
+
+    finished: List[int] = []
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="poi") as executor:
+        futures = [executor.submit(fetch_row, row) for row in pending]
+        try:
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                row, ok = future.result()
+                if not ok:
+                    failed += 1
+                    continue
+                buffers.done[row] = True
+                finished.append(row)
+                if checkpoint is not None and len(finished) >= checkpoint_every:
+                    checkpoint.append(buffers.to_frame(np.array(finished)))
+                    finished = []
+        finally:
+            # ถูก interrupt ก็ยังเก็บแถวที่เสร็จแล้วไว้ resume ได้
+            for future in futures:
+                future.cancel()
+            if checkpoint is not None and finished:
+                checkpoint.append(buffers.to_frame(np.array(finished)))
+    if failed:
+        print(f"⚠️ {failed} properties had API errors and were not checkpointed; re-run with --resume to retry them")
+    return buffers
@@ -2,9 +2,13 @@
 POI Fetcher using Google Maps API - ENHANCED VERSION
 Includes tourism, landmarks, lifestyle, and beach/water locations
 COMPLETE AND READY TO RUN
+
+Engines:
+    python poi_fetcher.py                                  # Google Maps (ต้องมี GOOGLE_MAPS_API_KEY)
+    python poi_fetcher.py --engine local --poi-dump pois.parquet   # offline จาก POI dump (name,type,lat,lon)
 """
+import argparse
 import os
-import json
 import time
 from pathlib import Path
 from typing import Optional
@@ -12,13 +16,19 @@ import pandas as pd
 import googlemaps
 from tqdm import tqdm
 from dotenv import load_dotenv
+
+from poi_cache import PoiCache, poi_cache_key
+from poi_enrichment import Checkpoint, RateLimitedMaps, TokenBucket, enrich_parallel
+from poi_local import LocalPoiIndex, enrich_offline, load_poi_dump
+from poi_planner import enrich_planned
 load_dotenv()
 
 # ============ CONFIGURATION ============
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 CSV_PATH = Path(r"C:\Users\bokthaiban\Desktop\mercilnew\data\assets_rows.csv")
 OUTPUT_PATH = Path(r"C:\Users\bokthaiban\Desktop\mercilnew\poi_results_enhanced.csv")
-CACHE_FILE = Path("poi_cache_enhanced.json")
+CACHE_FILE = Path("poi_cache_enhanced.json")  # cache แบบเก่า (import เข้า SQLite อัตโนมัติครั้งแรก)
+CACHE_DB = Path("poi_cache_enhanced.sqlite")
 
 #  ENHANCED POI TYPES - Include tourism, landmarks, and Thai lifestyle
 POI_TYPES = {
@@ -62,53 +72,69 @@ POI_TYPES = {
 
 SEARCH_RADIUS = 3000  # meters
 
-print("🔑 Google Maps API Configuration")
-if not GOOGLE_MAPS_API_KEY:
-    print("❌ GOOGLE_MAPS_API_KEY not found!")
-    print("   Set it: set GOOGLE_MAPS_API_KEY=your_api_key")
-    exit(1)
+# ============ HELPERS ============
+def require_api_key():
+    print("🔑 Google Maps API Configuration")
+    if not GOOGLE_MAPS_API_KEY:
+        print("❌ GOOGLE_MAPS_API_KEY not found!")
+        print("   Set it: set GOOGLE_MAPS_API_KEY=your_api_key")
+        exit(1)
+
+    print(f" API Key found: {GOOGLE_MAPS_API_KEY[:20]}...")
 
-print(f" API Key found: {GOOGLE_MAPS_API_KEY[:20]}...")
+_poi_cache: Optional[PoiCache] = None
 
-# ============ HELPERS ============
-def load_cache():
-    if CACHE_FILE.exists():
-        return json.loads(CACHE_FILE.read_text())
-    return {}
+def open_cache(db_path: Path = CACHE_DB, legacy_json: Path = CACHE_FILE) -> PoiCache:
+    """Open the SQLite POI cache once per run; an empty cache imports the old JSON cache."""
+    global _poi_cache
+    if _poi_cache is None:
+        _poi_cache = PoiCache(db_path)
+        if len(_poi_cache) == 0 and legacy_json.exists():
+            print(f" Importing legacy cache {legacy_json} -> {db_path}")
+            _poi_cache.import_json(legacy_json)
+        print(f" POI cache: {db_path} ({len(_poi_cache)} entries)")
+    return _poi_cache
 
-def save_cache(cache):
-    CACHE_FILE.write_text(json.dumps(cache, indent=2))
+def _quiet(*args, **kwargs):
+    pass
 
-def find_nearest_poi(gmaps, lat: float, lon: float, poi_type: str, location_name: str = "") -> Optional[dict]:
+def find_nearest_poi(gmaps, lat: float, lon: float, poi_type: str, location_name: str = "", verbose: bool = True,
+                     raise_errors: bool = False) -> Optional[dict]:
     """
     Find nearest POI using Google Maps Nearby Search
-    Returns dict with {'distance': meters, 'name': poi_name}, or None if not found
+    Returns dict with {'distance': meters, 'name': poi_name}, or None if not found.
+    API errors also return None (not cached) unless raise_errors=True, in
+    which case they propagate so the caller can retry the property later.
     """
+    log = print if verbose else _quiet
     try:
-        cache_key = f"{lat:.6f}_{lon:.6f}_{poi_type}"
-        cache = load_cache()
+        cache_key = poi_cache_key(lat, lon, poi_type)
+        cache = open_cache()
         
-        if cache_key in cache:
-            print(f"      [CACHE HIT]", end=" ")
-            return cache[cache_key]
+        found, cached = cache.lookup(cache_key)
+        if found:
+            log(f"      [CACHE HIT]", end=" ")
+            return cached
         
-        print(f"\n      [API CALL]", end=" ")
+        log(f"\n      [API CALL]", end=" ")
         
         # Nearby search
         try:
-            print(f"places_nearby(location=({lat:.4f},{lon:.4f}), type={poi_type})...", end=" ")
+            log(f"places_nearby(location=({lat:.4f},{lon:.4f}), type={poi_type})...", end=" ")
             results = gmaps.places_nearby(
                 location=(lat, lon),
                 radius=SEARCH_RADIUS,
                 type=poi_type,
                 language="th"
             )
-            print(f"OK", end=" ")
+            log(f"OK", end=" ")
         except Exception as e:
-            print(f"❌ API ERROR: {str(e)[:80]}")
+            log(f"❌ API ERROR: {str(e)[:80]}")
+            if raise_errors:
+                raise
             return None
         
-        print(f"Found {len(results.get('results', []))} results", end=" ")
+        log(f"Found {len(results.get('results', []))} results", end=" ")
         
         if results["results"]:
             nearest = results["results"][0]
@@ -116,7 +142,7 @@ def find_nearest_poi(gmaps, lat: float, lon: float, poi_type: str, location_name
             lon_dest = nearest["geometry"]["location"]["lng"]
             name = nearest.get("name", "Unknown")
             
-            print(f"| Nearest: {name[:30]}", end=" ")
+            log(f"| Nearest: {name[:30]}", end=" ")
             
             # Calculate distance
             try:
@@ -127,47 +153,54 @@ def find_nearest_poi(gmaps, lat: float, lon: float, poi_type: str, location_name
                     language="th"
                 )
             except Exception as e:
-                print(f"❌ distance_matrix ERROR: {str(e)[:60]}")
+                log(f"❌ distance_matrix ERROR: {str(e)[:60]}")
+                if raise_errors:
+                    raise
                 return None
             
             status = distance_result["rows"][0]["elements"][0]["status"]
-            print(f"| distance_status: {status}", end=" ")
+            log(f"| distance_status: {status}", end=" ")
             
             if status == "OK":
                 dist_meters = distance_result["rows"][0]["elements"][0]["distance"]["value"]
                 
-                print(f"| {dist_meters}m → RETURN ")
+                log(f"| {dist_meters}m → RETURN ")
                 
                 result_dict = {
                     "distance": dist_meters,
                     "name": name,
                     "place_id": nearest.get("place_id", "")
                 }
-                cache[cache_key] = result_dict
-                save_cache(cache)
+                cache.set(cache_key, result_dict)
                 return result_dict
             else:
-                print(f"❌ Not OK status")
+                log(f"❌ Not OK status")
         else:
-            print(f"❌ No results")
+            log(f"❌ No results")
         
-        cache[cache_key] = None
-        save_cache(cache)
+        cache.set(cache_key, None)
         return None
         
     except Exception as e:
-        print(f"❌ Exception: {str(e)[:80]}")
+        log(f"❌ Exception: {str(e)[:80]}")
+        if raise_errors:
+            raise
         return None
 
-def main():
+def load_properties(csv_path: Path) -> Optional[pd.DataFrame]:
     print("\n📍 Loading property data...")
-    if not CSV_PATH.exists():
-        print(f"❌ CSV not found: {CSV_PATH}")
-        return
+    if not csv_path.exists():
+        print(f"❌ CSV not found: {csv_path}")
+        return None
     
-    df = pd.read_csv(CSV_PATH).fillna("")
+    df = pd.read_csv(csv_path).fillna("")
     print(f" Loaded {len(df)} properties")
     
+    # Check if lat/lon exist
+    if "location_latitude" not in df.columns or "location_longitude" not in df.columns:
+        print("❌ location_latitude or location_longitude columns not found!")
+        return None
+    
     # Validate location data
     valid_locations = df[df['location_latitude'].notna() & df['location_longitude'].notna()]
     missing_locations = len(df) - len(valid_locations)
@@ -180,16 +213,15 @@ def main():
     
     if missing_locations > 0:
         print("\n⚠️ Warning: Some properties are missing location data")
-    
+    return df
+
+def fetch_google(df: pd.DataFrame) -> pd.DataFrame:
+    require_api_key()
+
     # Initialize Google Maps client
     print("\n Initializing Google Maps client...")
     gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
     
-    # Check if lat/lon exist
-    if "location_latitude" not in df.columns or "location_longitude" not in df.columns:
-        print("❌ location_latitude or location_longitude columns not found!")
-        return
-    
     # Create POI results dataframe
     poi_results = pd.DataFrame()
     poi_results["id"] = df["id"]
@@ -234,53 +266,142 @@ def main():
         
         # Rate limiting (Google Maps API)
         time.sleep(0.1)
+    return poi_results
+
+def make_maps_client(args: argparse.Namespace):
+    if args.fake_maps:
+        from fake_maps import FakeMapsClient  # test double ไม่ต้อง import ตอนรันจริง
+
+        print("\n Using FakeMapsClient (no API calls)")
+        return FakeMapsClient(latency=args.fake_latency)
+    require_api_key()
+    print("\n Initializing Google Maps client...")
+    return googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+
+def fetch_google_planned(df: pd.DataFrame, args: argparse.Namespace) -> pd.DataFrame:
+    client = make_maps_client(args)
+    maps = RateLimitedMaps(client, TokenBucket(args.qps))
+    print(f"\n🔍 Planned POI fetch: {args.workers} workers, <= {args.qps} requests/s (re-run resumes from the POI cache)")
+    start = time.perf_counter()
+    buffers, report = enrich_planned(
+        df, POI_TYPES, maps, open_cache(), radius_m=SEARCH_RADIUS,
+        tolerance_m=args.cluster_tolerance, workers=args.workers,
+    )
+    print(f" Done in {time.perf_counter() - start:.1f}s")
+    print(report.summary())
+    if args.fake_maps:
+        print(f" FakeMapsClient peak rate: {client.max_qps()} requests/s")
+    return buffers.to_frame()
+
+def checkpoint_path(args: argparse.Namespace) -> Path:
+    return args.checkpoint or args.output.with_name(args.output.stem + ".partial.csv")
+
+def fetch_google_parallel(df: pd.DataFrame, args: argparse.Namespace) -> pd.DataFrame:
+    client = make_maps_client(args)
+    maps = RateLimitedMaps(client, TokenBucket(args.qps))
+    checkpoint = Checkpoint(checkpoint_path(args))
+
+    print(f"\n🔍 Fetching POI data: {args.workers} workers, <= {args.qps} requests/s, checkpoint {checkpoint.path}")
+    start = time.perf_counter()
+    buffers = enrich_parallel(
+        df, POI_TYPES,
+        resolve=lambda gmaps, lat, lon, poi_type: find_nearest_poi(gmaps, lat, lon, poi_type, verbose=False, raise_errors=True),
+        maps=maps, workers=args.workers, checkpoint=checkpoint,
+        checkpoint_every=args.checkpoint_every, resume=args.resume, overwrite=args.overwrite_checkpoint,
+    )
+    elapsed = time.perf_counter() - start
+    print(f" Done in {elapsed:.1f}s | API calls: {maps.calls} | rate-limit wait: {maps.bucket.waited_s:.1f}s | cache: {open_cache().stats()}")
+    if args.fake_maps:
+        print(f" FakeMapsClient peak rate: {client.max_qps()} requests/s")
+    return buffers.to_frame()
+
+def fetch_local(df: pd.DataFrame, poi_dump: Path, radius: float) -> pd.DataFrame:
+    print(f"\n📦 Loading local POI dump: {poi_dump}")
+    pois = load_poi_dump(poi_dump)
+    index = LocalPoiIndex(pois, POI_TYPES)
+    missing_types = [k for k in POI_TYPES if k not in index.covered_types()]
+    print(f"   {len(pois)} POIs, {len(index.covered_types())}/{len(POI_TYPES)} POI types covered")
+    if missing_types:
+        print(f"⚠️ No POIs in dump for: {missing_types}")
+
+    start = time.perf_counter()
+    poi_results = enrich_offline(df, pois, POI_TYPES, radius, index=index)
+    print(f" Enriched {len(poi_results)} properties x {len(POI_TYPES)} POI types in {time.perf_counter() - start:.2f}s (great-circle distance)")
+    return poi_results
+
+def print_summary(poi_results: pd.DataFrame):
+    groups = {
+        "ESSENTIAL SERVICES": ["school", "park", "hospital", "veterinary"],
+        "SHOPPING & CONVENIENCE": ["convenience_store", "shopping_mall", "market", "supermarket"],
+        "TRANSPORTATION": ["bts_station", "train_station", "bus_station"],
+        "TOURISM & LANDMARKS": ["beach", "temple", "museum", "tourist_attraction", "viewpoint", "river", "golf_course"],
+        "LIFESTYLE & WELLNESS": ["restaurant", "cafe", "gym", "spa", "hotel", "university"],
+    }
+    print("\n POI Summary:")
+    for title, poi_keys in groups.items():
+        print(f"\n=== {title} ===")
+        for poi_key in poi_keys:
+            if poi_key in poi_results.columns:
+                found = poi_results[poi_key].notna().sum()
+                valid_data = pd.to_numeric(poi_results[poi_results[poi_key] != float('inf')][poi_key], errors="coerce")
+                avg_dist = valid_data.mean() if valid_data.notna().any() else 0
+                print(f"   {poi_key}: {found}/{len(poi_results)} found | Avg distance: {avg_dist:.0f}m")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch nearest POIs for every property")
+    parser.add_argument("--engine", choices=["google", "local"], default="google")
+    parser.add_argument("--csv_path", type=Path, default=CSV_PATH)
+    parser.add_argument("--output", type=Path, default=OUTPUT_PATH)
+    parser.add_argument("--poi-dump", type=Path, default=None, help="CSV/Parquet with name,type,lat,lon (engine=local)")
+    parser.add_argument("--radius", type=float, default=SEARCH_RADIUS, help="max POI distance in metres (engine=local)")
+    parser.add_argument("--cache-db", type=Path, default=CACHE_DB, help="SQLite POI cache (engine=google)")
+    parser.add_argument("--import-json", type=Path, default=None, help="import an old poi_cache*.json into --cache-db")
+    parser.add_argument("--workers", type=int, default=0, help="engine=google: worker pool size (0 = original sequential loop)")
+    parser.add_argument("--qps", type=float, default=10.0, help="max Maps API requests per second (token bucket)")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="checkpoint CSV (default: <output>.partial.csv)")
+    parser.add_argument("--checkpoint-every", type=int, default=200, help="append finished properties every N")
+    parser.add_argument("--resume", action="store_true", help="skip properties already in the checkpoint")
+    parser.add_argument("--overwrite-checkpoint", action="store_true", help="discard an existing checkpoint and start over")
+    parser.add_argument("--fake-maps", action="store_true", help="use the local FakeMapsClient instead of Google")
+    parser.add_argument("--fake-latency", type=float, default=0.05)
+    parser.add_argument("--plan", action="store_true", help="cluster nearby coordinates and batch distance_matrix calls")
+    parser.add_argument("--cluster-tolerance", type=float, default=25.0, help="metres; properties this close share POI lookups (--plan)")
+    args = parser.parse_args()
+
+    if args.import_json:
+        open_cache(args.cache_db).import_json(args.import_json)
+
+    df = load_properties(args.csv_path)
+    if df is None:
+        return
+
+    if args.engine == "local":
+        if args.poi_dump is None:
+            print("❌ --poi-dump is required with --engine local")
+            return
+        poi_results = fetch_local(df, args.poi_dump, args.radius)
+    else:
+        open_cache(args.cache_db)
+        if args.plan:
+            args.workers = max(1, args.workers)
+            poi_results = fetch_google_planned(df, args)
+        elif args.workers > 0 or args.fake_maps:
+            args.workers = max(1, args.workers)
+            # ลืม --resume แล้วลบ checkpoint ทิ้ง = เสีย API call ที่ทำไปแล้วทั้งหมด
+            if checkpoint_path(args).exists() and not (args.resume or args.overwrite_checkpoint):
+                print(f"❌ Checkpoint {checkpoint_path(args)} already exists: pass --resume to continue it or --overwrite-checkpoint to start over")
+                return
+            poi_results = fetch_google_parallel(df, args)
+        else:
+            poi_results = fetch_google(df)
     
     # Save results
-    print(f"\n Saving POI results to {OUTPUT_PATH}...")
-    poi_results.to_csv(OUTPUT_PATH, index=False)
+    print(f"\n Saving POI results to {args.output}...")
+    poi_results.to_csv(args.output, index=False)
     print(f" Saved {len(poi_results)} records")
     
     # Display summary
-    print("\n POI Summary:")
-    print("\n=== ESSENTIAL SERVICES ===")
-    for poi_key in ["school", "park", "hospital", "veterinary"]:
-        if poi_key in poi_results.columns:
-            found = poi_results[poi_key].notna().sum()
-            valid_data = poi_results[poi_results[poi_key] != float('inf')][poi_key]
-            avg_dist = valid_data.mean() if len(valid_data) > 0 else 0
-            print(f"   {poi_key}: {found}/{len(poi_results)} found | Avg distance: {avg_dist:.0f}m")
-    
-    print("\n=== SHOPPING & CONVENIENCE ===")
-    for poi_key in ["convenience_store", "shopping_mall", "market", "supermarket"]:
-        if poi_key in poi_results.columns:
-            found = poi_results[poi_key].notna().sum()
-            valid_data = poi_results[poi_results[poi_key] != float('inf')][poi_key]
-            avg_dist = valid_data.mean() if len(valid_data) > 0 else 0
-            print(f"   {poi_key}: {found}/{len(poi_results)} found | Avg distance: {avg_dist:.0f}m")
-    
-    print("\n=== TRANSPORTATION ===")
-    for poi_key in ["bts_station", "train_station", "bus_station"]:
-        if poi_key in poi_results.columns:
-            found = poi_results[poi_key].notna().sum()
-            valid_data = poi_results[poi_results[poi_key] != float('inf')][poi_key]
-            avg_dist = valid_data.mean() if len(valid_data) > 0 else 0
-            print(f"   {poi_key}: {found}/{len(poi_results)} found | Avg distance: {avg_dist:.0f}m")
-    
-    print("\n=== TOURISM & LANDMARKS ===")
-    for poi_key in ["beach", "temple", "museum", "tourist_attraction", "viewpoint", "river", "golf_course"]:
-        if poi_key in poi_results.columns:
-            found = poi_results[poi_key].notna().sum()
-            valid_data = poi_results[poi_results[poi_key] != float('inf')][poi_key]
-            avg_dist = valid_data.mean() if len(valid_data) > 0 else 0
-            print(f"   {poi_key}: {found}/{len(poi_results)} found | Avg distance: {avg_dist:.0f}m")
-    
-    print("\n=== LIFESTYLE & WELLNESS ===")
-    for poi_key in ["restaurant", "cafe", "gym", "spa", "hotel", "university"]:
-        if poi_key in poi_results.columns:
-            found = poi_results[poi_key].notna().sum()
-            valid_data = poi_results[poi_results[poi_key] != float('inf')][poi_key]
-            avg_dist = valid_data.mean() if len(valid_data) > 0 else 0
-            print(f"   {poi_key}: {found}/{len(poi_results)} found | Avg distance: {avg_dist:.0f}m")
+    print_summary(poi_results)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
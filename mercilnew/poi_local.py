@@ -0,0 +1,95 @@
+"""
+Offline nearest-POI engine for poi_fetcher.py.
+
+Loads a local POI dump (CSV or Parquet with name, type, lat, lon columns —
+e.g. an OSM extract) into one KD-tree per POI type and finds the nearest POI
+of every type for all properties in one vectorized pass. Points are placed
+on the unit sphere, so the nearest neighbour by chord length is also the
+nearest by great-circle distance (and much faster than a haversine
+BallTree).
+
+`type` may be either our poi_key ("bts_station") or the Google Places type
+used in POI_TYPES ("subway_station"); a poi_key match wins. Distances are
+great-circle metres (Google engine: driving distance), and POIs farther
+than the search radius count as not found, like places_nearby.
+"""
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from geo_index import EARTH_RADIUS_M, has_coordinates
+
+REQUIRED_COLUMNS = ["name", "type", "lat", "lon"]
+
+
+def to_unit_xyz(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def load_poi_dump(path: Path) -> pd.DataFrame:
+    path = Path(path)
+    df = pd.read_parquet(path) if path.suffix.lower() in (".parquet", ".pq") else pd.read_csv(path)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"POI dump {path} is missing columns: {missing}")
+    df = df[REQUIRED_COLUMNS].copy()
+    df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
+    df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
+    df["type"] = df["type"].astype(str).str.strip()
+    df["name"] = df["name"].fillna("Unknown").astype(str)
+    return df[has_coordinates(df["lat"].to_numpy(), df["lon"].to_numpy())].reset_index(drop=True)
+
+
+class LocalPoiIndex:
+    def __init__(self, pois: pd.DataFrame, poi_types: Dict[str, str]):
+        self._trees: Dict[str, Tuple[cKDTree, np.ndarray]] = {}
+        by_type = {t: group for t, group in pois.groupby("type")}
+        for poi_key, google_type in poi_types.items():
+            group = by_type.get(poi_key)
+            if group is None:
+                group = by_type.get(google_type)
+            if group is None or group.empty:
+                continue
+            xyz = to_unit_xyz(group["lat"].to_numpy(dtype=np.float64), group["lon"].to_numpy(dtype=np.float64))
+            self._trees[poi_key] = (cKDTree(xyz), group["name"].to_numpy(dtype=object))
+
+    def covered_types(self):
+        return list(self._trees)
+
+    def nearest(self, poi_key: str, lats: np.ndarray, lons: np.ndarray, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(distance_m, name) per property; NaN / None when nothing within radius_m or no coordinates."""
+        n = len(lats)
+        distances = np.full(n, np.nan)
+        names = np.full(n, None, dtype=object)
+        entry = self._trees.get(poi_key)
+        valid = has_coordinates(lats, lons)
+        if entry is None or not valid.any():
+            return distances, names
+        tree, poi_names = entry
+        max_chord = 2 * np.sin(min(radius_m / EARTH_RADIUS_M, np.pi) / 2)
+        chord, idx = tree.query(to_unit_xyz(lats[valid], lons[valid]), k=1, distance_upper_bound=max_chord * (1 + 1e-9), workers=-1)
+        found = np.isfinite(chord)
+        dist_m = 2 * np.arcsin(np.clip(chord[found] / 2, 0.0, 1.0)) * EARTH_RADIUS_M
+        found_rows = np.flatnonzero(valid)[found]
+        within = dist_m <= radius_m
+        distances[found_rows[within]] = np.round(dist_m[within])
+        names[found_rows[within]] = poi_names[idx[found][within]]
+        return distances, names
+
+
+def enrich_offline(df: pd.DataFrame, pois: pd.DataFrame, poi_types: Dict[str, str], radius_m: float,
+                   index: Optional[LocalPoiIndex] = None) -> pd.DataFrame:
+    """poi_results frame (id, <poi_key>, <poi_key>_name) for every property, same layout as the Google engine."""
+    index = index or LocalPoiIndex(pois, poi_types)
+    lats = pd.to_numeric(df["location_latitude"], errors="coerce").to_numpy(dtype=np.float64)
+    lons = pd.to_numeric(df["location_longitude"], errors="coerce").to_numpy(dtype=np.float64)
+    columns = {"id": df["id"].to_numpy()}
+    for poi_key in poi_types:
+        distances, names = index.nearest(poi_key, lats, lons, radius_m)
+        columns[poi_key] = distances
+        columns[f"{poi_key}_name"] = names
+    return pd.DataFrame(columns)
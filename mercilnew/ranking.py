@@ -0,0 +1,116 @@
+"""
+Vectorized re-ranking over columnar candidate arrays.
+
+Computes the same intent score, nice-to-have boost and final score as
+search_pipeline.compute_intent_match_score / apply_nice_to_have_boost, but
+for all candidates at once with NumPy. The additions are applied in the same
+order as the scalar code, so the float results are bit-for-bit identical.
+Reason/penalty strings are not built here; the caller builds them with the
+scalar functions for the final top-N only.
+"""
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+MISSING_DISTANCE = 99999.0
+
+
+def as_float(value: Any, default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class CandidateArrays:
+    """Columnar view of a candidate set (one row per candidate)."""
+
+    __slots__ = ("semantic", "asset_type_id", "pet_friendly", "lifestyle", "poi_distance")
+
+    def __init__(self, semantic: np.ndarray, asset_type_id: np.ndarray, pet_friendly: np.ndarray,
+                 lifestyle: np.ndarray, poi_distance: np.ndarray):
+        self.semantic = semantic
+        self.asset_type_id = asset_type_id
+        self.pet_friendly = pet_friendly
+        self.lifestyle = lifestyle
+        self.poi_distance = poi_distance  # (n, len(poi_keys))
+
+    def __len__(self) -> int:
+        return len(self.semantic)
+
+
+class RerankEngine:
+    def __init__(self, poi_config: Dict[str, Dict[str, Any]], asset_id_mapping: Dict[str, List[int]]):
+        self.poi_keys = list(poi_config)
+        self.poi_index = {key: i for i, key in enumerate(self.poi_keys)}
+        self.poi_radius = np.array([cfg.get("radius", 2000) for cfg in poi_config.values()], dtype=np.float64)
+        self.asset_id_mapping = asset_id_mapping
+
+    def from_results(self, results: List[Dict[str, Any]]) -> CandidateArrays:
+        """Build candidate arrays from chroma_query results (dicts with 'metadata')."""
+        metas = [r.get("metadata", {}) for r in results]
+        poi_distance = np.array(
+            [[as_float(m.get(key, MISSING_DISTANCE), MISSING_DISTANCE) for key in self.poi_keys] for m in metas],
+            dtype=np.float64,
+        ).reshape(len(metas), len(self.poi_keys))
+        return CandidateArrays(
+            semantic=np.array([r["semantic_score"] for r in results], dtype=np.float64),
+            asset_type_id=np.array([as_float(m.get("asset_type_id", 0), 0.0) for m in metas], dtype=np.float64),
+            pet_friendly=np.array([m.get("pet_friendly", False) is True for m in metas], dtype=bool),
+            lifestyle=np.array([float(m.get("lifestyle_score", 0)) for m in metas], dtype=np.float64),
+            poi_distance=poi_distance,
+        )
+
+    def score(self, c: CandidateArrays, intent: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (intent_score, nice_boost, final_score) arrays."""
+        n = len(c)
+        score = np.zeros(n, dtype=np.float64)
+
+        # 1. Asset Type Matching (By ID)
+        intent_types = intent.get("asset_types", [])
+        if intent_types:
+            accepted_ids = []
+            for t in intent_types:
+                accepted_ids.extend(self.asset_id_mapping.get(t, []))
+            score += np.where(np.isin(c.asset_type_id, accepted_ids), 1.0, -10.0)
+
+        # 2. Pet-Friendly Matching
+        intent_pet = intent.get("pet_friendly")
+        if intent_pet is True:
+            asset_id = c.asset_type_id
+            condo_delta = 0.0 if "คอนโด" in intent.get("asset_types", []) else -10.0
+            score += np.select(
+                [c.pet_friendly, asset_id == 3, asset_id == 4, np.isin(asset_id, [1, 15, 5])],
+                [1.5, condo_delta, 1.0, -0.5],
+                default=-10.0,
+            )
+            vet_dist = c.poi_distance[:, self.poi_index["veterinary"]] if "veterinary" in self.poi_index else np.full(n, MISSING_DISTANCE)
+            near_vet = vet_dist <= 2000
+            score[near_vet] += 0.5
+        elif intent_pet is False:
+            score[c.pet_friendly] -= 10.0
+
+        # 3. Must-Have POI / 4. Avoid POI (Dynamic Radius)
+        for poi_key in intent.get("must_have", []):
+            if poi_key in self.poi_index:
+                j = self.poi_index[poi_key]
+                score += np.where(c.poi_distance[:, j] <= self.poi_radius[j], 1.0, -1.0)
+        for poi_key in intent.get("avoid_poi", []):
+            if poi_key in self.poi_index:
+                j = self.poi_index[poi_key]
+                score += np.where(c.poi_distance[:, j] <= self.poi_radius[j], -5.0, 1.0)
+
+        # Nice-to-have boost
+        nice_boost = np.zeros(n, dtype=np.float64)
+        for poi_key in intent.get("nice_to_have", []):
+            if poi_key in self.poi_index:
+                j = self.poi_index[poi_key]
+                nice_boost[c.poi_distance[:, j] <= self.poi_radius[j]] += 0.25
+
+        final_score = (score * 0.7) + (c.semantic * 0.2) + (c.lifestyle * 0.05) + (nice_boost * 0.05)
+        return score, nice_boost, final_score
+
+    @staticmethod
+    def order(final_score: np.ndarray) -> np.ndarray:
+        """Indices by descending final score; ties keep input order (like list.sort(reverse=True))."""
+        return np.argsort(-final_score, kind="stable")
@@ -5,30 +5,103 @@ load_dotenv()
 import json
 import logging
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional, List, Tuple, Dict, Any
+from typing import TYPE_CHECKING, Optional, List, Tuple, Dict, Any
 
-import requests
-from sentence_transformers import SentenceTransformer
-import chromadb
+import numpy as np
+
+if TYPE_CHECKING:  # chromadb (~1 s) / torch import ตอนใช้จริงเท่านั้น
+    import chromadb
+
+from embedding_backend import EmbeddingBackend, load_embedding_backend
+from embedding_cache import EmbeddingCache
+from intent_cache import IntentCache
+from geo_index import GeoIndex, bounding_box, has_coordinates, haversine_m, parse_near
+from intent_parser import RuleBasedIntentParser
+from location_codes import district_code, location_codes, province_code
+from metadata_store import ColumnarMetadataStore
+from ranking import RerankEngine, as_float
+from llm_client import get_async_openrouter_client, get_openrouter_client
+from vector_index import VectorIndex, export_collection, export_status, load_vector_index
 
 # ============ CONFIGURATION ============
-VECTOR_DB_PATH = Path("npa_vectorstore") 
-COLLECTION_NAME = "npa_assets_v2" 
+VECTOR_DB_PATH = Path(os.getenv("VECTOR_DB_PATH", "npa_vectorstore"))
+COLLECTION_NAME = os.getenv("COLLECTION_NAME", "npa_assets_v2")
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     print("⚠️ WARNING: OPENROUTER_API_KEY is not set.")
 
-EMB_MODEL_NAME = "thenlper/gte-large"
+EMB_MODEL_NAME = os.getenv("EMB_MODEL_NAME", "thenlper/gte-large")
 TOP_K_RESULTS = 100 # กวาดมาเยอะๆ ก่อนกันหลุด
 FINAL_TOP_N = 5 
 LLM_MODEL = "openai/gpt-4o-mini" 
 
+# RAG explanation fan-out (ยิง LLM พร้อมกันแทนทีละตัว): RAG_MAX_CONCURRENCY = ต่อ request,
+# pool รวม (RAG_POOL_SIZE) รองรับทุก search worker พร้อมกัน
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "5"))
+RAG_ITEM_TIMEOUT = float(os.getenv("RAG_ITEM_TIMEOUT", "20"))
+RAG_POOL_SIZE = int(os.getenv("RAG_POOL_SIZE", str(int(os.getenv("SEARCH_WORKERS", "8")) * FINAL_TOP_N)))
+RAG_FALLBACK_TEXT = "ไม่สามารถสร้างคำอธิบายได้"
+
+# Thread pool สำหรับรัน stage ที่ไม่ขึ้นต่อกันพร้อมกัน (เช่น intent detection กับ vector retrieval)
+PIPELINE_STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "8"))
+
+# connection pool ของ OpenRouter client ต้องพอสำหรับทุก thread ที่ยิง LLM (RAG pool + stage workers)
+# ไม่งั้น urllib3 ทิ้ง connection ส่วนเกิน (เสีย keep-alive + "Connection pool is full")
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", str(RAG_POOL_SIZE + PIPELINE_STAGE_WORKERS)))
+
+# Intent cache (query ซ้ำไม่ต้องถาม LLM ใหม่) - ตั้ง INTENT_CACHE_DB เพื่อเก็บลง SQLite
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+INTENT_CACHE_TTL = float(os.getenv("INTENT_CACHE_TTL", "86400"))
+INTENT_CACHE_DB = os.getenv("INTENT_CACHE_DB")
+
+# Rule-based intent parser (ข้าม LLM ถ้า query ง่ายพอ) / INTENT_RECORD_PATH = เก็บผล LLM ไว้ทำ parity
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "1") == "1"
+INTENT_RECORD_PATH = os.getenv("INTENT_RECORD_PATH")
+
+# โหลด metadata ที่ใช้กรอง/ให้คะแนนเป็น NumPy columns ตอน startup (ไม่ต้องดึง metadata dict ทุก query)
+COLUMNAR_METADATA = os.getenv("COLUMNAR_METADATA", "1") == "1"
+
+# Query embedding cache (MB)
+EMBEDDING_CACHE_MB = float(os.getenv("EMBEDDING_CACHE_MB", "64"))
+
+# Intent pushdown: แปลง price_range / asset_types / pet_friendly=False เป็น where ของ Chroma
+INTENT_PUSHDOWN = os.getenv("INTENT_PUSHDOWN", "1") == "1"
+# ถ้าผ่าน filter เหลือน้อยกว่านี้ ขยาย k (x2) แล้ว query ใหม่ จนถึง RETRIEVAL_MAX_K
+RETRIEVAL_MIN_CANDIDATES = int(os.getenv("RETRIEVAL_MIN_CANDIDATES", "20"))
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "800"))
+# id ในรัศมี "near" ที่ส่งเป็น ids= ของ Chroma: เกินนี้แบ่งเป็นหลาย query แล้วรวม top-k (ไม่ส่ง id ทั้งก้อนใน query เดียว)
+NEAR_IDS_CHUNK = int(os.getenv("NEAR_IDS_CHUNK", "5000"))
+
+# Retrieval engine: chroma (collection.query) / exact (NumPy matmul) / hnsw (hnswlib) / auto (exact ถ้าไม่เกิน VECTOR_EXACT_MAX_ROWS แถว)
+# engine อื่นนอกจาก chroma ใช้ embeddings ที่ export ไว้ใน VECTOR_INDEX_DIR (export ให้ตอน startup ถ้ายังไม่มี) และต้องเปิด COLUMNAR_METADATA
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "chroma").lower()
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", "npa_vector_index"))
+
+# Warmup ตอน startup (ก่อน /readyz ตอบ ready): query สังเคราะห์วิ่งผ่าน encode / retrieval / re-rank, 0 = ปิด
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "3"))
+WARMUP_QUERIES = [
+    "คอนโด ใกล้ BTS ไม่เกิน 3 ล้าน",
+    "บ้านเดี่ยว เลี้ยงสัตว์ได้ ใกล้โรงเรียน",
+    "ทาวน์โฮม ใกล้ห้าง ราคา 2-4 ล้าน",
+    "ที่ดิน ใกล้โรงพยาบาล",
+]
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("search_pipeline")
 
+intent_cache = IntentCache(
+    max_entries=INTENT_CACHE_SIZE,
+    ttl_seconds=INTENT_CACHE_TTL,
+    db_path=Path(INTENT_CACHE_DB) if INTENT_CACHE_DB else None,
+)
+embedding_cache = EmbeddingCache(max_bytes=int(EMBEDDING_CACHE_MB * 1024 * 1024))
+
 # ============ PROMPT ENGINEERING ============
 
 ENHANCED_INTENT_DETECTION_PROMPT = """
@@ -104,6 +177,20 @@ RAG_SYSTEM_PROMPT = """
 จงเขียนคำอธิบายสั้นๆ โดยสรุปจาก "ผลการวิเคราะห์" ที่ผู้ใช้ป้อนมา
 """
 
+# ต้องตรงกับ [กฎ POI key มาตรฐาน] ใน prompt ด้านบน (ใช้กับ rule-based intent parser)
+POI_SYNONYMS = {
+    "bts": "bts_station", "รถไฟฟ้า": "bts_station", "บีทีเอส": "bts_station",
+    "เซเว่น": "convenience_store", "7-11": "convenience_store", "ร้านสะดวกซื้อ": "convenience_store",
+    "mrt": "mrt", "ใต้ดิน": "mrt",
+    "ห้าง": "shopping_mall", "สรรพสินค้า": "shopping_mall", "ห้างสรรพสินค้า": "shopping_mall",
+    "โรงเรียน": "school",
+    "โรงพยาบาล": "hospital", "คลินิก": "hospital",
+    "สวน": "park", "สวนสาธารณะ": "park",
+    "ตลาด": "market",
+    "ร้านอาหาร": "restaurant",
+    "คาเฟ่": "cafe",
+}
+
 def create_rag_user_content(query: str, meta: Dict, reasons: List[str], penalties: List[str]) -> str:
     return f"""
 [ข้อมูลสำหรับวิเคราะห์]
@@ -172,23 +259,36 @@ ASSET_ID_MAPPING = {
     "อาคารพาณิชย์": [5] 
 }
 
+intent_parser = RuleBasedIntentParser(ASSET_ID_MAPPING, POI_CONFIG.keys(), POI_SYNONYMS)
+rerank_engine = RerankEngine(POI_CONFIG, ASSET_ID_MAPPING)
+metadata_store: Optional[ColumnarMetadataStore] = None
+# collection มี province_code / district_code (build ด้วย build_vectorstore.py เวอร์ชันใหม่) หรือยัง
+location_codes_indexed = False
+geo_index: Optional[GeoIndex] = None
+# in-process vector index (RETRIEVAL_ENGINE) + แถวใน metadata_store ของแต่ละแถวใน index
+retrieval_index: Optional[VectorIndex] = None
+retrieval_store_rows: Optional[np.ndarray] = None
+
 # ============ SERVICE FUNCTIONS ============\
 
-def get_embedding_model(model_name: str) -> SentenceTransformer:
+def get_embedding_model(model_name: str) -> EmbeddingBackend:
+    """Embedding model on the backend chosen by EMBEDDING_BACKEND (torch / onnx)."""
     logger.info(f"Loading embedding model: {model_name}")
     try:
-        model = SentenceTransformer(model_name)
-        logger.info("✅ Embedding model loaded.")
+        model = load_embedding_backend(model_name)
+        logger.info(f"✅ Embedding model loaded ({model.backend_id}).")
         return model
     except Exception as e:
         logger.error(f"❌ Failed to load embedding model: {e}")
         raise
 
-def get_chroma_collection(db_path: Path, collection_name: str) -> chromadb.Collection:
+def get_chroma_collection(db_path: Path, collection_name: str) -> "chromadb.Collection":
     if not db_path.exists():
         logger.error(f"❌ Vector DB path not found: {db_path}")
         raise FileNotFoundError(f"Vector DB path not found: {db_path}")
     logger.info(f"Connecting to ChromaDB at: {db_path}")
+    import chromadb
+
     client = chromadb.PersistentClient(path=str(db_path))
     try:
         collection = client.get_collection(name=collection_name)
@@ -198,27 +298,100 @@ def get_chroma_collection(db_path: Path, collection_name: str) -> chromadb.Colle
         logger.error(f"❌ Failed to connect to collection '{collection_name}'.")
         raise e
 
-def call_openrouter(system_prompt: str, user_content: str, model: str) -> str:
+def load_metadata_store(collection: "chromadb.Collection") -> Optional[ColumnarMetadataStore]:
+    """Load the columnar metadata store used by the search path (no-op if COLUMNAR_METADATA=0)."""
+    global metadata_store, geo_index
+    detect_location_codes(collection)
+    if COLUMNAR_METADATA:
+        metadata_store = ColumnarMetadataStore.load(collection, POI_CONFIG.keys())
+        geo_index = GeoIndex(metadata_store.latitude, metadata_store.longitude)
+    return metadata_store
+
+def load_retrieval_index(collection: "chromadb.Collection", engine: str = RETRIEVAL_ENGINE) -> Optional[VectorIndex]:
+    """Load the in-process vector index that replaces collection.query (None = keep using Chroma)."""
+    global retrieval_index, retrieval_store_rows
+    if engine == "chroma":
+        retrieval_index = None
+        return None
+    if metadata_store is None:
+        logger.warning(f"⚠️ RETRIEVAL_ENGINE={engine} needs the columnar metadata store (COLUMNAR_METADATA=1), using Chroma")
+        return None
+    if export_status(VECTOR_INDEX_DIR, collection, metadata_store.fingerprint) is None:
+        logger.warning(f"⚠️ No up-to-date embedding export of '{collection.name}' in {VECTOR_INDEX_DIR}, exporting now")
+        export_collection(collection, VECTOR_INDEX_DIR)
+    index = load_vector_index(VECTOR_INDEX_DIR, engine)
+    retrieval_store_rows = metadata_store.rows_for(index.ids)
+    retrieval_index = index
+    return index
+
+def detect_location_codes(collection: "chromadb.Collection") -> bool:
+    """Check whether the collection carries province_code / district_code so location filters can run in Chroma."""
+    global location_codes_indexed
+    sample = collection.get(limit=1, include=["metadatas"])
+    metadatas = sample.get("metadatas") or [{}]
+    location_codes_indexed = "province_code" in (metadatas[0] or {})
+    if not location_codes_indexed:
+        logger.warning("⚠️ Collection has no province_code/district_code, rebuild with build_vectorstore.py to filter locations in Chroma")
+    return location_codes_indexed
+
+def call_openrouter(system_prompt: str, user_content: str, model: str, timeout: Optional[float] = None) -> str:
+    """`timeout` caps the whole call including retries (default: the client's retry budget)."""
     if not OPENROUTER_API_KEY:
         logger.error("OPENROUTER_API_KEY is not set. Cannot call OpenRouter.")
         return "{}"
     try:
         messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}]
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {OPENROUTER_API_KEY}"},
-            data=json.dumps({"model": model, "messages": messages})
-        )
-        response.raise_for_status()
-        content = response.json()['choices'][0]['message']['content']
-        return content
+        return get_openrouter_client(OPENROUTER_API_KEY, pool_size=LLM_POOL_SIZE).chat(messages, model, budget=timeout)
+    except Exception as e:
+        logger.error(f"Error calling OpenRouter: {e}")
+        return "{}"
+
+async def acall_openrouter(system_prompt: str, user_content: str, model: str, timeout: Optional[float] = None) -> str:
+    """asyncio counterpart of call_openrouter (same fallback behaviour)."""
+    if not OPENROUTER_API_KEY:
+        logger.error("OPENROUTER_API_KEY is not set. Cannot call OpenRouter.")
+        return "{}"
+    try:
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_content}]
+        return await get_async_openrouter_client(OPENROUTER_API_KEY, pool_size=LLM_POOL_SIZE).chat(messages, model, budget=timeout)
     except Exception as e:
         logger.error(f"Error calling OpenRouter: {e}")
         return "{}"
 
 # ============ SEARCH PIPELINE FUNCTIONS ============\
 
+def detect_intent_locally(query: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """Intent from the rule parser ("rules") or intent_cache ("cache"), None when the LLM is needed."""
+    if INTENT_FAST_PATH:
+        parsed_intent = intent_parser.parse(query)
+        if parsed_intent is not None:
+            logger.info(f"Intent parsed by rules: {parsed_intent}")
+            return parsed_intent, "rules"
+    cached_intent = intent_cache.get(query)
+    if cached_intent is not None:
+        logger.info(f"Intent cache hit: {cached_intent}")
+        return cached_intent, "cache"
+    return None
+
+def detect_intent(query: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Intent for `query` plus the path that produced it: "rules" (local parser),
+    "cache" (intent_cache) or "llm".
+    """
+    return detect_intent_locally(query) or (_llm_intent_detection(query), "llm")
+
 def enhanced_intent_detection(query: str) -> Dict[str, Any]:
+    """Intent dict only (the original API); same fast path / cache / LLM as detect_intent."""
+    return detect_intent(query)[0]
+
+def _record_llm_intent(query: str, intent: Dict[str, Any]) -> None:
+    try:
+        with open(INTENT_RECORD_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"query": query, "intent": intent, "source": "llm"}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning(f"Failed to record intent: {e}")
+
+def _llm_intent_detection(query: str) -> Dict[str, Any]:
     system_prompt = ENHANCED_INTENT_DETECTION_PROMPT
     user_content = query
     logger.info("Detecting intent...")
@@ -241,56 +414,270 @@ def enhanced_intent_detection(query: str) -> Dict[str, Any]:
                 "price_range": intent_json.get("price_range", {"min": None, "max": None})
             }
         logger.info(f"Intent detected: {validated_intent}")
+        # "{}" คือ fallback ตอนเรียก LLM ไม่สำเร็จ ห้าม cache
+        if raw_response.strip() != "{}":
+            intent_cache.set(query, validated_intent)
+            if INTENT_RECORD_PATH:
+                _record_llm_intent(query, validated_intent)
         return validated_intent
     except json.JSONDecodeError:
         logger.error(f"Failed to decode JSON from LLM response: {raw_response}")
         return { "asset_types": [], "must_have": [], "nice_to_have": [], "avoid_poi": [], "pet_friendly": None, "price_range": {"min": None, "max": None} }
 
-def chroma_query(collection: chromadb.Collection, embed_model: SentenceTransformer, query: str, k: int, filters: Dict = {}) -> List[Dict[str, Any]]:
-    logger.info("Performing semantic search...")
-    query_embedding = embed_model.encode([query]).tolist()
-    chroma_filter = None 
+def encode_query(embed_model: EmbeddingBackend, query: str) -> np.ndarray:
+    """float32 query vector, served from embedding_cache when possible."""
+    return embedding_cache.get_or_encode(query, lambda texts: embed_model.encode(texts, convert_to_numpy=True))
+
+def encode_queries(embed_model: EmbeddingBackend, queries: List[str]) -> np.ndarray:
+    """(n, dim) float32 matrix; cache misses are encoded in a single batch."""
+    vectors: List[Optional[np.ndarray]] = [embedding_cache.get(q) for q in queries]
+    misses = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+    if misses:
+        encoded = embed_model.encode(misses, convert_to_numpy=True, batch_size=32)
+        fresh = {q: embedding_cache.put(q, vec) for q, vec in zip(misses, encoded)}
+        vectors = [fresh[q] if v is None else v for q, v in zip(queries, vectors)]
+    return np.stack(vectors)
+
+def build_chroma_filter(filters: Dict, intent: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+    filter_list = []
     if filters:
-        filter_list = []
         if "max_price" in filters and filters["max_price"] > 0:
             filter_list.append({"asset_details_selling_price": {"$lte": filters["max_price"]}})
-        if "province" in filters and isinstance(filters["province"], str):
-            filter_list.append({"province_th": {"$eq": filters["province"]}})
-        if filter_list:
-            chroma_filter = {"$and": filter_list} if len(filter_list) > 1 else filter_list[0]
+        filter_list.extend(location_filter_clauses(filters))
+        filter_list.extend(near_filter_clauses(filters))
+    if intent and INTENT_PUSHDOWN:
+        filter_list.extend(intent_filter_clauses(filters or {}, intent))
+    if not filter_list:
+        return None
+    return {"$and": filter_list} if len(filter_list) > 1 else filter_list[0]
+
+def location_filter_codes(filters: Dict) -> Tuple[List[str], List[str]]:
+    """Province / district codes requested by the filters ("province" / "district": a name or a list of names)."""
+    return location_codes(filters.get("province"), province_code), location_codes(filters.get("district"), district_code)
+
+def location_filter_clauses(filters: Dict) -> List[Dict[str, Any]]:
+    if not location_codes_indexed:
+        # collection เก่า: exact match กับชื่อจังหวัดเหมือนเดิม ที่เหลือกรองใน apply_filters
+        if isinstance(filters.get("province"), str):
+            return [{"province_th": {"$eq": filters["province"]}}]
+        return []
+    clauses = []
+    for field, codes in zip(("province_code", "district_code"), location_filter_codes(filters)):
+        if codes:
+            clauses.append({field: {"$eq": codes[0]}} if len(codes) == 1 else {field: {"$in": codes}})
+    return clauses
+
+def near_filter_clauses(filters: Dict) -> List[Dict[str, Any]]:
+    """Bounding box of filters["near"] as a `where` pre-filter, only when there is no geo index (ids are used instead)."""
+    near = parse_near(filters)
+    if near is None or geo_index is not None:
+        return []
+    min_lat, max_lat, min_lon, max_lon = bounding_box(*near)
+    return [
+        {"location_latitude": {"$gte": min_lat}}, {"location_latitude": {"$lte": max_lat}},
+        {"location_longitude": {"$gte": min_lon}}, {"location_longitude": {"$lte": max_lon}},
+    ]
+
+def near_ids(filters: Dict) -> Optional[List[str]]:
+    """Asset ids within filters["near"] from the geo index (None = no restriction)."""
+    near = parse_near(filters)
+    if near is None or geo_index is None:
+        return None
+    return [metadata_store.ids[row] for row in geo_index.query_radius(*near)]
+
+def intent_filter_clauses(filters: Dict, intent: Dict) -> List[Dict[str, Any]]:
+    """
+    Chroma `where` clauses for the intent constraints that can only remove
+    candidates: the price range (as in apply_filters), asset types (anything
+    else scores -10) and pet_friendly=False (pet-friendly assets score -10).
+    """
+    clauses = []
+    price_range = intent.get("price_range") or {}
+    if filters.get("max_price") is None and price_range.get("max") is not None:
+        clauses.append({"asset_details_selling_price": {"$lte": price_range["max"]}})
+    if price_range.get("min") is not None:
+        clauses.append({"asset_details_selling_price": {"$gte": price_range["min"]}})
+    accepted_ids = sorted({i for t in intent.get("asset_types", []) for i in ASSET_ID_MAPPING.get(t, [])})
+    if accepted_ids:
+        clauses.append({"asset_type_id": {"$in": accepted_ids}})
+    if intent.get("pet_friendly") is False:
+        clauses.append({"pet_friendly": {"$ne": True}})
+    return clauses
+
+def _query_include() -> List[str]:
+    # มี columnar store แล้ว ไม่ต้องดึง metadata ทั้งก้อนมาทุก query
+    return ["distances"] if metadata_store is not None else ["metadatas", "distances"]
+
+def _process_query_results(results: Dict[str, Any], row: int) -> List[Dict[str, Any]]:
+    processed_results = []
+    metadatas = results.get('metadatas')
+    for i, dist in enumerate(results['distances'][row]):
+        semantic_score = max(0, 1 - (dist / 2.0))
+        item = {"id": results['ids'][row][i], "semantic_score": semantic_score}
+        if metadatas:
+            item["metadata"] = metadatas[row][i]
+        processed_results.append(item)
+    return processed_results
+
+def _index_query_rows(embeddings: np.ndarray, k: int, chroma_filter: Optional[Dict[str, Any]], ids: Optional[List[str]]) -> List[List[Dict[str, Any]]]:
+    """_query_rows on retrieval_index: the `where` clause and ids become a row mask from the columnar store."""
+    known = retrieval_store_rows >= 0
+    allowed = None
+    if chroma_filter is not None:
+        allowed = known & metadata_store.where_mask(chroma_filter)[retrieval_store_rows]
+    if ids is not None:
+        in_ids = np.zeros(len(metadata_store), dtype=bool)
+        rows = metadata_store.rows_for(ids)
+        in_ids[rows[rows >= 0]] = True
+        allowed = (known if allowed is None else allowed) & in_ids[retrieval_store_rows]
+    return [
+        [{"id": retrieval_index.ids[row], "semantic_score": max(0, 1 - (float(dist) / 2.0))} for row, dist in zip(hit_rows, distances)]
+        for hit_rows, distances in retrieval_index.search(embeddings, k, allowed)
+    ]
+
+def _chroma_query(collection: "chromadb.Collection", embeddings: np.ndarray, k: int, chroma_filter: Optional[Dict[str, Any]], ids: Optional[List[str]]) -> Dict[str, Any]:
+    """collection.query; more than NEAR_IDS_CHUNK ids are queried chunk by chunk and merged by distance into one top-k."""
+    if ids is None or len(ids) <= NEAR_IDS_CHUNK:
+        return collection.query(query_embeddings=embeddings, n_results=k, where=chroma_filter, ids=ids, include=_query_include())
+    fields = ["ids"] + _query_include()
+    merged: Dict[str, List[list]] = {field: [[] for _ in range(len(embeddings))] for field in fields}
+    for start in range(0, len(ids), NEAR_IDS_CHUNK):
+        part = collection.query(query_embeddings=embeddings, n_results=k, where=chroma_filter, ids=ids[start:start + NEAR_IDS_CHUNK], include=_query_include())
+        for field in fields:
+            for row, values in enumerate(part.get(field) or []):
+                merged[field][row].extend(values)
+    for row, distances in enumerate(merged["distances"]):
+        top = np.argsort(distances, kind="stable")[:k]
+        for field in fields:
+            merged[field][row] = [merged[field][row][i] for i in top]
+    return merged
+
+def _query_rows(collection: "chromadb.Collection", embeddings: np.ndarray, k: int, chroma_filter: Optional[Dict[str, Any]], ids: Optional[List[str]] = None) -> List[List[Dict[str, Any]]]:
+    if ids is not None and not ids:
+        return [[] for _ in range(len(embeddings))]
+    if retrieval_index is not None:
+        return _index_query_rows(embeddings, k, chroma_filter, ids)
+    results = _chroma_query(collection, embeddings, k, chroma_filter, ids)
+    if 'ids' not in results or not results['ids']:
+        return [[] for _ in range(len(embeddings))]
+    return [_process_query_results(results, row) for row in range(len(embeddings))]
+
+def count_surviving(results: List[Dict], filters: Dict, intent: Dict) -> int:
+    """How many retrieved candidates pass apply_filters (on the columnar store when loaded)."""
+    if metadata_store is None or (results and "metadata" in results[0]):
+        return len(apply_filters(results, filters, intent))
+    rows = metadata_store.rows_for([r["id"] for r in results])
+    rows = rows[rows >= 0]
+    return int(filter_mask_columnar(metadata_store, rows, filters, intent).sum())
+
+def widen_until_enough(collection: "chromadb.Collection", query_embedding: np.ndarray, k: int, filters: Dict, intent: Optional[Dict], results: List[Dict],
+                       ids: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Adaptive over-fetch: while fewer than RETRIEVAL_MIN_CANDIDATES of the
+    top-k survive the filters and the index may still hold more (a full page
+    came back), double k and query again, up to RETRIEVAL_MAX_K. `ids` is
+    near_ids(filters) when the caller already has it.
+    """
+    chroma_filter = build_chroma_filter(filters, intent)
+    if ids is None:
+        ids = near_ids(filters)
+    while len(results) >= k and k < RETRIEVAL_MAX_K and count_surviving(results, filters, intent or {}) < RETRIEVAL_MIN_CANDIDATES:
+        k = min(k * 2, RETRIEVAL_MAX_K)
+        logger.info(f"Too few candidates survived filtering, widening k to {k}")
+        results = _query_rows(collection, query_embedding[np.newaxis, :], k, chroma_filter, ids)[0]
+    return results
+
+def chroma_query(collection: "chromadb.Collection", embed_model: EmbeddingBackend, query: str, k: int, filters: Dict = {}, intent: Optional[Dict] = None, query_embedding: Optional[np.ndarray] = None,
+                 ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Top-k for `query` under filters + intent pushdown; `ids` = near_ids(filters) if already computed."""
+    logger.info("Performing semantic search...")
+    if query_embedding is None:
+        query_embedding = encode_query(embed_model, query)
+    chroma_filter = build_chroma_filter(filters, intent)
     try:
-        results = collection.query(query_embeddings=query_embedding, n_results=k, where=chroma_filter, include=["metadatas", "distances"])
-        processed_results = []
-        if 'ids' not in results or not results['ids']:
+        if ids is None:
+            ids = near_ids(filters)
+        results = _query_rows(collection, query_embedding[np.newaxis, :], k, chroma_filter, ids)[0]
+        if not results:
             logger.warning("ChromaDB query returned no results.")
             return []
-        for i, dist in enumerate(results['distances'][0]):
-            meta = results['metadatas'][0][i]
-            semantic_score = max(0, 1 - (dist / 2.0))
-            processed_results.append({"id": results['ids'][0][i], "semantic_score": semantic_score, "metadata": meta})
-        return processed_results
+        return widen_until_enough(collection, query_embedding, k, filters, intent, results, ids)
     except Exception as e:
         logger.error(f"❌ Error during Chroma query: {e}", exc_info=True)
         return []
 
+def chroma_query_batch(collection: "chromadb.Collection", embed_model: EmbeddingBackend, queries: List[str], k: int, filters_list: List[Dict], intents: Optional[List[Dict]] = None, embeddings: Optional[np.ndarray] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Batched chroma_query: one encode for all queries and one collection.query
+    per distinct `where` clause. Queries left with too few candidates are
+    widened individually. Returns results in the order of `queries`.
+    """
+    logger.info(f"Performing batched semantic search for {len(queries)} queries...")
+    if embeddings is None:
+        embeddings = encode_queries(embed_model, queries)
+    if intents is None:
+        intents = [None] * len(queries)
+    groups: Dict[str, List[int]] = {}
+    scopes: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[List[str]]]] = {}
+    for i, (filters, intent) in enumerate(zip(filters_list, intents)):
+        chroma_filter = build_chroma_filter(filters, intent)
+        key = json.dumps([chroma_filter, (filters or {}).get("near")], sort_keys=True, ensure_ascii=False)
+        groups.setdefault(key, []).append(i)
+        if key not in scopes:
+            scopes[key] = (chroma_filter, near_ids(filters))
+
+    all_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+    for key, indices in groups.items():
+        try:
+            for i, results in zip(indices, _query_rows(collection, embeddings[indices], k, *scopes[key])):
+                all_results[i] = widen_until_enough(collection, embeddings[i], k, filters_list[i], intents[i], results, scopes[key][1])
+        except Exception as e:
+            logger.error(f"❌ Error during batched Chroma query: {e}", exc_info=True)
+    return all_results
+
 def apply_filters(results: List[Dict], filters_cli: Dict, intent: Dict) -> List[Dict]:
     if not filters_cli and not intent.get("price_range"): return results 
     filtered_results = []
     price_range = intent.get("price_range", {})
     final_max_price = filters_cli.get("max_price") if filters_cli.get("max_price") is not None else price_range.get("max")
     final_min_price = price_range.get("min")
-    final_province = filters_cli.get("province")
+    province_codes, district_codes = location_filter_codes(filters_cli)
+    near = parse_near(filters_cli)
     for r in results:
         meta = r.get("metadata", {})
         keep = True
         price = float(meta.get("asset_details_selling_price", 0))
         if final_max_price is not None and price > final_max_price: keep = False
         if final_min_price is not None and price < final_min_price: keep = False
-        if final_province:
-            if final_province.replace("มหานคร", "").strip() not in meta.get("province_th", "N/A").replace("มหานคร", "").strip(): keep = False
+        if province_codes and (meta.get("province_code") or province_code(meta.get("province_th"))) not in province_codes: keep = False
+        if district_codes and (meta.get("district_code") or district_code(meta.get("district_th"))) not in district_codes: keep = False
+        if near:
+            lat, lon = as_float(meta.get("location_latitude"), np.nan), as_float(meta.get("location_longitude"), np.nan)
+            if not has_coordinates(lat, lon) or haversine_m(near[0], near[1], lat, lon) > near[2]: keep = False
         if keep: filtered_results.append(r)
     return filtered_results
 
+def filter_mask_columnar(store: ColumnarMetadataStore, rows: np.ndarray, filters_cli: Dict, intent: Dict) -> np.ndarray:
+    """Same rules as apply_filters, evaluated on the columnar store for many rows at once."""
+    keep = np.ones(len(rows), dtype=bool)
+    if not filters_cli and not intent.get("price_range"): return keep
+    price_range = intent.get("price_range", {})
+    final_max_price = filters_cli.get("max_price") if filters_cli.get("max_price") is not None else price_range.get("max")
+    final_min_price = price_range.get("min")
+    province_codes, district_codes = location_filter_codes(filters_cli)
+    price = store.price[rows]
+    if final_max_price is not None: keep &= ~(price > final_max_price)
+    if final_min_price is not None: keep &= ~(price < final_min_price)
+    if province_codes:
+        keep &= np.isin(store.province_code.codes[rows], store.province_code.codes_of(province_codes))
+    if district_codes:
+        keep &= np.isin(store.district_code.codes[rows], store.district_code.codes_of(district_codes))
+    near = parse_near(filters_cli)
+    if near:
+        lats, lons = store.latitude[rows], store.longitude[rows]
+        keep &= has_coordinates(lats, lons) & (haversine_m(near[0], near[1], lats, lons) <= near[2])
+    return keep
+
 def compute_intent_match_score(metadata: Dict[str, Any], intent: Dict[str, Any]) -> Tuple[float, List[str], List[str]]:
     """
     คำนวณคะแนน "ความตรงใจ" (Intent Score) โดยใช้ ID และ POI Config (Dynamic Radius)
@@ -394,56 +781,245 @@ def apply_nice_to_have_boost(metadata: Dict[str, Any], intent: Dict[str, Any]) -
                 nice_reasons.append(f"มี {poi_name} ใกล้ๆ ({distance:.0f} ม.)")
     return nice_boost, nice_reasons
 
-def rag_explain_single_item(query: str, intent: Dict, result: Dict, reasons: List[str], penalties: List[str]) -> str:
+def rag_explain_single_item(query: str, intent: Dict, result: Dict, reasons: List[str], penalties: List[str], timeout: Optional[float] = None) -> str:
     meta = result.get("metadata", {})
     system_prompt = RAG_SYSTEM_PROMPT
     user_content = create_rag_user_content(query, meta, reasons, penalties)
     try:
-        explanation = call_openrouter(system_prompt, user_content, LLM_MODEL)
+        explanation = call_openrouter(system_prompt, user_content, LLM_MODEL, timeout=timeout)
         if explanation.strip() == "{}":
-            return "ไม่สามารถสร้างคำอธิบายได้"
+            return RAG_FALLBACK_TEXT
         return explanation.strip().replace('"', '') 
     except Exception as e:
         logger.warning(f"Failed to generate RAG explanation: {e}")
-        return "ไม่สามารถสร้างคำอธิบายได้"
+        return RAG_FALLBACK_TEXT
 
-def execute_search(query: str, filters: Dict, embed_model: SentenceTransformer, collection: chromadb.Collection) -> Dict[str, Any]:
-    query_intent = enhanced_intent_detection(query)
-    results = chroma_query(collection, embed_model, query, TOP_K_RESULTS, filters)
+_rag_executor: Optional[ThreadPoolExecutor] = None
+_rag_executor_lock = threading.Lock()
+
+def get_rag_executor() -> ThreadPoolExecutor:
+    """Pool shared by every request's RAG calls, sized so all search workers can fan out at once."""
+    global _rag_executor
+    with _rag_executor_lock:
+        if _rag_executor is None:
+            _rag_executor = ThreadPoolExecutor(max_workers=max(1, RAG_POOL_SIZE, RAG_MAX_CONCURRENCY), thread_name_prefix="rag")
+        return _rag_executor
+
+def rag_explain_results(query: str, intent: Dict, results: List[Dict], timeout: Optional[float] = None) -> List[str]:
+    """
+    Generate RAG explanations for ranked results concurrently, at most
+    RAG_MAX_CONCURRENCY in flight for this call. Each item's timeout runs
+    from when it starts (or from when it was handed to the pool, if the
+    pool is saturated and it has not started yet), and the LLM call itself
+    is capped at the same timeout so a timed-out item frees its slot.
+    Summaries come back in the same order as `results`; items that fail or
+    time out get RAG_FALLBACK_TEXT.
+    """
     if not results:
-        return { "query": query, "intent_detected": query_intent, "results": [], "message": f"🤷 ไม่พบผลลัพธ์ที่ตรงกับคำค้นหา: \"{query}\"" }
+        return []
+    timeout = RAG_ITEM_TIMEOUT if timeout is None else timeout
+    workers = max(1, RAG_MAX_CONCURRENCY)
+    executor = get_rag_executor()
+    summaries = [RAG_FALLBACK_TEXT] * len(results)
+    started: Dict[int, float] = {}
+
+    def run(i: int) -> str:
+        started[i] = time.monotonic()
+        r = results[i]
+        return rag_explain_single_item(query, intent, r, r.get('intent_reasons', []), r.get('intent_penalties', []), timeout=timeout)
+
+    running: Dict[Future, Tuple[int, float]] = {}  # future -> (index, เวลาที่ส่งเข้า pool)
+    next_item = 0
+    while next_item < len(results) or running:
+        while next_item < len(results) and len(running) < workers:
+            running[executor.submit(run, next_item)] = (next_item, time.monotonic())
+            next_item += 1
+        deadline = min(started.get(i, submitted) + timeout for i, submitted in running.values())
+        done, _ = wait(list(running), timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            i, _ = running.pop(future)
+            try:
+                summaries[i] = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to generate RAG explanation: {e}")
+        now = time.monotonic()
+        for future, (i, submitted) in list(running.items()):
+            if started.get(i, submitted) + timeout <= now:
+                # ที่รันอยู่แล้ว cancel ไม่ได้ แต่ call_openrouter ถูกจำกัดเวลาไว้เท่ากัน จึงคืน slot เองไม่นาน
+                future.cancel()
+                del running[future]
+                logger.warning(f"RAG explanation #{i + 1} timed out after {timeout:.1f}s")
+    return summaries
+
+_stage_executor: Optional[ThreadPoolExecutor] = None
+_stage_executor_lock = threading.Lock()
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    global _stage_executor
+    with _stage_executor_lock:
+        if _stage_executor is None:
+            _stage_executor = ThreadPoolExecutor(max_workers=max(1, PIPELINE_STAGE_WORKERS), thread_name_prefix="stage")
+        return _stage_executor
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+def _timed_call(fn, *args) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, _elapsed_ms(start)
+
+def execute_search(query: str, filters: Dict, embed_model: EmbeddingBackend, collection: "chromadb.Collection") -> Dict[str, Any]:
+    timings = {}
+    search_start = time.perf_counter()
+
+    local_intent, local_ms = _timed_call(detect_intent_locally, query)
+    if local_intent is not None:
+        # intent จาก rules / cache ได้ทันที: pushdown ไปกับ query แรกได้เลย
+        (query_intent, intent_source), timings["intent"] = local_intent, local_ms
+        query_embedding, timings["encode"] = _timed_call(encode_query, embed_model, query)
+        results, timings["retrieval"] = _timed_call(chroma_query, collection, embed_model, query, TOP_K_RESULTS, filters, query_intent, query_embedding)
+    else:
+        # ต้องรอ LLM: encode + retrieval ด้วย filter ของ request ไประหว่างรอ
+        # แล้ว query ใหม่เฉพาะเมื่อ intent เพิ่มเงื่อนไข pushdown (where เปลี่ยน)
+        intent_future = get_stage_executor().submit(_timed_call, _llm_intent_detection, query)
+        query_embedding, timings["encode"] = _timed_call(encode_query, embed_model, query)
+        ids = near_ids(filters)  # geo lookup ครั้งเดียว ใช้ทั้ง query แรก, query ใหม่ และ widen
+        results, timings["retrieval"] = _timed_call(chroma_query, collection, embed_model, query, TOP_K_RESULTS, filters, None, query_embedding, ids)
+        join_start = time.perf_counter()
+        query_intent, intent_ms = intent_future.result()
+        intent_source = "llm"
+        timings["intent"] = round(local_ms + intent_ms, 1)
+        timings["intent_wait"] = _elapsed_ms(join_start)
+        if build_chroma_filter(filters, query_intent) != build_chroma_filter(filters):
+            results, timings["requery"] = _timed_call(chroma_query, collection, embed_model, query, TOP_K_RESULTS, filters, query_intent, query_embedding, ids)
+        elif results:
+            # where เหมือนเดิม แต่ post-filter ตาม intent (เช่นช่วงราคา) อาจเหลือ candidate น้อยลง
+            results = widen_until_enough(collection, query_embedding, max(TOP_K_RESULTS, len(results)), filters, query_intent, results, ids)
+    timings["intent_and_retrieval"] = _elapsed_ms(search_start)
+
+    return rank_and_explain(query, filters, query_intent, intent_source, results, timings, search_start, collection)
+
+def _windowed_map(executor: ThreadPoolExecutor, fn, items: List[tuple], width: int) -> List[Any]:
+    """fn(*item) for every item on `executor`, at most `width` in flight, results in order."""
+    outputs: List[Any] = [None] * len(items)
+    running: Dict[Future, int] = {}
+    next_item = 0
+    while next_item < len(items) or running:
+        while next_item < len(items) and len(running) < max(1, width):
+            running[executor.submit(fn, *items[next_item])] = next_item
+            next_item += 1
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        for future in done:
+            outputs[running.pop(future)] = future.result()
+    return outputs
+
+def execute_search_batch(queries: List[str], filters_list: List[Dict], embed_model: EmbeddingBackend, collection: "chromadb.Collection",
+                         concurrency: int = 1, explain: bool = True) -> List[Dict[str, Any]]:
+    """
+    Run many searches at once: intents are detected while all queries are
+    encoded in batch, then retrieved grouped by `where` clause, and each
+    query is re-ranked and explained. Intent and rank/explain work runs at
+    most `concurrency` queries at a time (the admission slots the batch
+    holds), so a batch costs what `concurrency` single searches cost;
+    explain=False skips the RAG summaries. Each item has the same shape as
+    execute_search.
+    """
+    if not queries:
+        return []
+    search_start = time.perf_counter()
+    executor = get_stage_executor()
+
+    # encode ทั้ง batch บน stage executor ระหว่างที่ thread นี้ทยอยส่ง intent ทีละ `concurrency` query
+    encode_future = executor.submit(_timed_call, encode_queries, embed_model, queries)
+    intents = _windowed_map(executor, _timed_call, [(detect_intent, q) for q in queries], concurrency)
+    embeddings, encode_ms = encode_future.result()
+    query_intents = [query_intent for (query_intent, _), _ in intents]
+    all_results, retrieval_ms = _timed_call(chroma_query_batch, collection, embed_model, queries, TOP_K_RESULTS, filters_list, query_intents, embeddings)
+    joined_ms = _elapsed_ms(search_start)
+
+    rank_items = []
+    for query, filters, results, ((query_intent, intent_source), intent_ms) in zip(queries, filters_list, all_results, intents):
+        timings = {"encode": encode_ms, "intent": intent_ms, "retrieval": retrieval_ms, "intent_and_retrieval": joined_ms}
+        rank_items.append((query, filters, query_intent, intent_source, results, timings, search_start, collection, explain))
+    outputs = _windowed_map(executor, rank_and_explain, rank_items, concurrency)
+    logger.info(f"Batch search of {len(queries)} queries done in {_elapsed_ms(search_start)} ms")
+    return outputs
+
+def _select_candidates(results: List[Dict], filters: Dict, query_intent: Dict) -> Tuple[List[Dict], Any]:
+    """Apply filters and build candidate arrays, from the columnar store when results carry no metadata."""
+    if metadata_store is None or (results and "metadata" in results[0]):
+        filtered_results = apply_filters(results, filters, query_intent)
+        return filtered_results, rerank_engine.from_results(filtered_results)
+
+    rows = metadata_store.rows_for([r["id"] for r in results])
+    known = rows >= 0
+    if not known.all():
+        logger.warning(f"{int((~known).sum())} ids are missing from the metadata store (restart to reload)")
+    keep = known.copy()
+    keep[known] = filter_mask_columnar(metadata_store, rows[known], filters, query_intent)
+    kept = np.flatnonzero(keep)
+    filtered_results = [results[i] for i in kept]
+    semantic = np.array([r["semantic_score"] for r in filtered_results], dtype=np.float64)
+    return filtered_results, metadata_store.candidate_arrays(rows[kept], semantic)
+
+def _attach_metadata(collection: "chromadb.Collection", results: List[Dict]) -> None:
+    """Fetch full metadata (names, descriptions, POI names) for the final results only."""
+    missing = [r["id"] for r in results if "metadata" not in r]
+    if not missing:
+        return
+    fetched = collection.get(ids=missing, include=["metadatas"])
+    by_id = dict(zip(fetched["ids"], fetched["metadatas"]))
+    for r in results:
+        if "metadata" not in r:
+            r["metadata"] = by_id.get(r["id"]) or {}
+
+def rank_and_explain(query: str, filters: Dict, query_intent: Dict, intent_source: str, results: List[Dict], timings: Dict[str, float], search_start: float, collection: "chromadb.Collection", explain: bool = True) -> Dict[str, Any]:
+    """Filter, re-rank and explain retrieved candidates for one query (shared by single and batch search); explain=False leaves summary None."""
+    if not results:
+        timings["total"] = _elapsed_ms(search_start)
+        return { "query": query, "intent_detected": query_intent, "intent_source": intent_source, "results": [], "message": f"🤷 ไม่พบผลลัพธ์ที่ตรงกับคำค้นหา: \"{query}\"", "timings_ms": timings }
     
-    filtered_results = apply_filters(results, filters, query_intent)
+    rerank_start = time.perf_counter()
+    filtered_results, candidates = _select_candidates(results, filters, query_intent)
     logger.info("Re-ranking results...")
-    ranked_results = []
-    for r in filtered_results:
-        meta = r.get("metadata", {})
-        lifestyle_score = float(meta.get("lifestyle_score", 0))
-        intent_score, reasons, penalties = compute_intent_match_score(meta, query_intent)
-        nice_boost, nice_reasons = apply_nice_to_have_boost(meta, query_intent)
-        r["intent_reasons"] = reasons + nice_reasons
-        r["intent_penalties"] = penalties
-        final_score = ((intent_score * 0.7) + (r["semantic_score"] * 0.2) + (lifestyle_score * 0.05) + (nice_boost * 0.05))
-        r["final_score"] = final_score
-        r["intent_score"] = intent_score
-        r["lifestyle_score"] = lifestyle_score 
-        ranked_results.append(r)
-
-    ranked_results.sort(key=lambda x: x["final_score"], reverse=True)
+    intent_scores, _, final_scores = rerank_engine.score(candidates, query_intent)
+    order = rerank_engine.order(final_scores)
+    timings["rerank"] = _elapsed_ms(rerank_start)
     
     # ✅ [QUALITY GATE] เพิ่มตรงนี้! ถ้าคะแนนต่ำเกินไป ตัดจบเลย
-    if not ranked_results or ranked_results[0]['final_score'] < 0.35:
+    if len(order) == 0 or final_scores[order[0]] < 0.35:
+        timings["total"] = _elapsed_ms(search_start)
         return {
             "query": query,
             "intent_detected": query_intent,
+            "intent_source": intent_source,
             "results": [],
-            "message": "🤔 ไม่พบทรัพย์สินที่ตรงกับความต้องการ หรือคำค้นหาอาจไม่ชัดเจนครับ (Low Matching Score)"
+            "message": "🤔 ไม่พบทรัพย์สินที่ตรงกับความต้องการ หรือคำค้นหาอาจไม่ชัดเจนครับ (Low Matching Score)",
+            "timings_ms": timings
         }
+
+    # สร้างข้อความ reasons/penalties เฉพาะ Top N
+    top_results = [filtered_results[i] for i in order[:FINAL_TOP_N]]
+    _attach_metadata(collection, top_results)
+    for i, r in zip(order[:FINAL_TOP_N], top_results):
+        meta = r.get("metadata", {})
+        _, reasons, penalties = compute_intent_match_score(meta, query_intent)
+        _, nice_reasons = apply_nice_to_have_boost(meta, query_intent)
+        r["intent_reasons"] = reasons + nice_reasons
+        r["intent_penalties"] = penalties
+        r["final_score"] = float(final_scores[i])
+        r["intent_score"] = float(intent_scores[i])
+        r["lifestyle_score"] = float(candidates.lifestyle[i])
     
+    if explain:
+        summaries, timings["rag"] = _timed_call(rag_explain_results, query, query_intent, top_results)
+    else:
+        summaries = [None] * len(top_results)
+
     final_results_list = []
-    for r in ranked_results[:FINAL_TOP_N]:
+    for r, summary_text in zip(top_results, summaries):
         meta = r.get("metadata", {})
-        summary_text = rag_explain_single_item(query, query_intent, r, r.get('intent_reasons', []), r.get('intent_penalties', []))
         final_results_list.append({
             "id": r['id'],
             "final_score": round(r['final_score'], 2),
@@ -461,4 +1037,32 @@ def execute_search(query: str, filters: Dict, embed_model: SentenceTransformer,
             }
         })
     
-    return { "query": query, "intent_detected": query_intent, "results": final_results_list, "message": "Search completed successfully." }
\ No newline at end of file
+    timings["total"] = _elapsed_ms(search_start)
+    logger.info(f"Search timings (ms): {timings}")
+    return { "query": query, "intent_detected": query_intent, "intent_source": intent_source, "results": final_results_list, "message": "Search completed successfully.", "timings_ms": timings }
+
+def warmup(embed_model: EmbeddingBackend, collection: "chromadb.Collection", rounds: int = WARMUP_ROUNDS) -> List[float]:
+    """
+    Run synthetic searches through the local stages (encode, rule-based
+    intent, retrieval, filtering, re-rank, metadata fetch) so the first real
+    query does not pay for cold kernels, allocators and SQLite pages. No LLM
+    calls and no cache writes. Returns the wall time of each round in ms.
+    """
+    round_ms = []
+    for i in range(max(0, rounds)):
+        start = time.perf_counter()
+        query = WARMUP_QUERIES[i % len(WARMUP_QUERIES)]
+        # encode ตรงกับ model (ไม่ผ่าน embedding_cache): ทั้ง batch และ query เดี่ยว
+        embed_model.encode(WARMUP_QUERIES, convert_to_numpy=True, batch_size=32)
+        query_embedding = embed_model.encode([query], convert_to_numpy=True)[0]
+        query_intent = intent_parser.parse(query)
+        results = chroma_query(collection, embed_model, query, TOP_K_RESULTS, {}, query_intent, query_embedding)
+        if results and query_intent is not None:
+            filtered_results, candidates = _select_candidates(results, {}, query_intent)
+            _, _, final_scores = rerank_engine.score(candidates, query_intent)
+            order = rerank_engine.order(final_scores)
+            _attach_metadata(collection, [filtered_results[j] for j in order[:FINAL_TOP_N]])
+        round_ms.append(_elapsed_ms(start))
+    if round_ms:
+        logger.info(f"🔥 Warmup done: {len(round_ms)} rounds, ms per round {round_ms}")
+    return round_ms
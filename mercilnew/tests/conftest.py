@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# โมดูลอยู่ระดับบนสุดของ mercilnew/ (ไม่ได้เป็น package)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,34 @@
+"""write_batches reports the rows it could not write (incremental builds must not delete after a failure)."""
+import numpy as np
+
+import build_vectorstore as bv
+
+
+class FlakyCollection:
+    def __init__(self, fail_batches):
+        self.fail_batches = set(fail_batches)
+        self.written = []
+        self.calls = 0
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.calls += 1
+        if self.calls in self.fail_batches:
+            raise RuntimeError("disk full")
+        self.written.extend(ids)
+
+
+def write(collection, n):
+    ids = [str(i) for i in range(n)]
+    return bv.write_batches(collection, ids, np.zeros((n, 4), dtype=np.float32), ids, [{"i": i} for i in range(n)], upsert=True)
+
+
+def test_write_batches_counts_failed_rows(monkeypatch):
+    monkeypatch.setattr(bv, "BATCH_SIZE", 10)
+    collection = FlakyCollection(fail_batches=[2, 4])
+    assert write(collection, 35) == 10 + 5
+    assert collection.written == [str(i) for i in range(10)] + [str(i) for i in range(20, 30)]
+
+
+def test_write_batches_returns_zero_when_all_written(monkeypatch):
+    monkeypatch.setattr(bv, "BATCH_SIZE", 10)
+    assert write(FlakyCollection(fail_batches=[]), 25) == 0
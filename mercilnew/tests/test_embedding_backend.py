@@ -0,0 +1,11 @@
+"""OnnxBackend.encode rejects SentenceTransformer options it cannot honour."""
+import pytest
+
+from embedding_backend import OnnxBackend
+
+
+@pytest.mark.parametrize("kwargs", [{"normalize_embeddings": True}, {"precision": "int8"}, {"convert_to_numpy": False}])
+def test_onnx_encode_rejects_unsupported_options(kwargs):
+    backend = OnnxBackend.__new__(OnnxBackend)  # ไม่ต้องมี export / onnxruntime: ตรวจ argument ก่อนใช้ session
+    with pytest.raises(TypeError):
+        backend.encode(["คอนโด"], **kwargs)
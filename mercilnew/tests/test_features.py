@@ -0,0 +1,67 @@
+"""Column-wise feature stages of build_vectorstore.py vs the original row-wise functions."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import build_vectorstore as bv
+from build_vectorstore import compute_lifestyle_score, extract_features, fix_asset_type
+
+
+def fixture_frame() -> pd.DataFrame:
+    """A few rows per edge case: NaN / empty / 'nan' text, odd fixed_type values, mixed POI columns."""
+    df = pd.DataFrame({
+        "id": range(12),
+        "name_th": ["ขาย คอนโด ใกล้ BTS", "คอนโด", "ทาวน์โฮม 2 ชั้น", "ตึกแถว ติดถนน", "", np.nan,
+                    "บ้านเดี่ยว", "NAN", "อาคารพาณิชย์", " คอนโด", "บ้าน", "ทาวน์เฮ้าส์"],
+        "name_en": ["Condominium Unit", np.nan, "", "SHOPHOUSE", "Commercial", "townhome",
+                    np.nan, "nan", "", "", "Detached House", np.nan],
+        "asset_details_description_th": ["ห้องชุด ชั้น 8", "", np.nan, "เลี้ยงสัตว์เลี้ยงได้", "อาคารชุด", "nan",
+                                         "สัตว์เลี้ยง", "", np.nan, "ใกล้ตลาด", "", "อาคารชุด"],
+        "asset_details_description_en": [np.nan, "Pet-Friendly", "pet friendly park", "", "nan", np.nan,
+                                         "PET FRIENDLY", "petfriendly", "", np.nan, "quiet", ""],
+        # fixed_type แปลก ๆ: มีช่องว่าง, ค่าว่าง, 'nan' เป็น text, NaN, None, ตัวเลข
+        "fixed_type": [" อาคารชุด ", "", "nan", np.nan, None, "ที่ดิน", 5, "  ", "บ้าน", np.nan, "NaN", ""],
+        "asset_details_number_of_bedrooms": [1, np.nan, 3, 2, np.nan, 0, 4, 1, np.nan, 2, 3, 1],
+        "asset_details_number_of_bathrooms": [1, 2, np.nan, 1, 1, 0, 3, 1, 2, np.nan, 2, 1],
+    })
+    radius = {key: cfg["radius"] for key, cfg in bv.POI_CONFIG.items()}
+    for j, poi_key in enumerate(bv.POI_CONFIG):
+        r = radius[poi_key]
+        # ในรัศมี, พอดีรัศมี, เกินรัศมี, 0, NaN, ค่าลบ
+        values = [r * 0.3, r, r + 1, 0.0, np.nan, r * 0.99, -5.0, r * 2, np.nan, r * 0.5, 1.0, np.nan]
+        df[poi_key] = np.roll(values, j)
+    # POI เป็น text ปน (ตัวเลขใน string, 'N/A', '')
+    df["cafe"] = df["cafe"].astype(object)
+    df.loc[[0, 3, 7], "cafe"] = ["150", "N/A", ""]
+    return df
+
+
+FRAMES = {
+    "full": fixture_frame(),
+    # CSV ที่ไม่มีบางคอลัมน์เลย (ใช้ค่า default ของ row.get)
+    "missing_columns": fixture_frame().drop(columns=["name_en", "fixed_type", "asset_details_number_of_bedrooms", "asset_details_description_en", "school", "park"]),
+}
+
+
+@pytest.mark.parametrize("name", list(FRAMES))
+def test_fix_asset_types_matches_row_wise(name):
+    df = FRAMES[name]
+    assert bv.fix_asset_types(df).tolist() == df.apply(fix_asset_type, axis=1).tolist()
+
+
+@pytest.mark.parametrize("name", list(FRAMES))
+def test_lifestyle_scores_match_row_wise(name):
+    df = FRAMES[name]
+    percentiles = bv.compute_poi_percentiles(df)
+    expected = df.apply(lambda row: compute_lifestyle_score(row, percentiles), axis=1)
+    assert bv.compute_lifestyle_scores(df, percentiles).tolist() == expected.tolist()  # bit-for-bit
+
+
+@pytest.mark.parametrize("name", list(FRAMES))
+def test_extract_features_matches_row_wise(name):
+    df = FRAMES[name]
+    expected = pd.DataFrame(df.apply(extract_features, axis=1).tolist(), index=df.index)
+    actual = bv.extract_features_columns(df)
+    assert list(actual.columns) == list(expected.columns)
+    for column in expected.columns:
+        pd.testing.assert_series_equal(actual[column], expected[column], check_dtype=False, obj=column)
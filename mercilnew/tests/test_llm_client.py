@@ -0,0 +1,88 @@
+"""OpenRouterClient / AsyncOpenRouterClient against the local stub server (openrouter_stub.py)."""
+import asyncio
+import json
+
+import pytest
+
+from llm_client import AsyncOpenRouterClient, LLMClientError, OpenRouterClient, get_async_openrouter_client
+from openrouter_stub import start_stub_server
+
+MESSAGES = [{"role": "system", "content": "อธิบายทรัพย์"}, {"role": "user", "content": "คอนโด"}]
+
+
+@pytest.fixture
+def stub(request):
+    server, state, base_url = start_stub_server(**getattr(request, "param", {}))
+    yield state, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def sync_chat(base_url: str, **kwargs) -> str:
+    client = OpenRouterClient("test-key", base_url=base_url, **kwargs)
+    try:
+        return client.chat(MESSAGES, "stub-model")
+    finally:
+        client.close()
+
+
+def async_chat(base_url: str, **kwargs) -> str:
+    async def run() -> str:
+        client = AsyncOpenRouterClient("test-key", base_url=base_url, **kwargs)
+        try:
+            return await client.chat(MESSAGES, "stub-model")
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+CHAT = {"sync": sync_chat, "async": async_chat}
+
+
+@pytest.mark.parametrize("flavor", list(CHAT))
+def test_chat_returns_content(stub, flavor):
+    state, base_url = stub
+    assert CHAT[flavor](base_url) == "ทรัพย์นี้อยู่ใกล้ BTS (stub)"
+    assert state.requests == 1
+
+
+@pytest.mark.parametrize("flavor", list(CHAT))
+@pytest.mark.parametrize("stub", [{"fail_first": 2}], indirect=True)
+def test_chat_retries_transient_errors(stub, flavor):
+    state, base_url = stub
+    assert CHAT[flavor](base_url, max_retries=2) == "ทรัพย์นี้อยู่ใกล้ BTS (stub)"
+    assert state.requests == 3
+
+
+@pytest.mark.parametrize("flavor", list(CHAT))
+@pytest.mark.parametrize("stub", [{"fail_first": 5}], indirect=True)
+def test_chat_gives_up_after_max_retries(stub, flavor):
+    state, base_url = stub
+    with pytest.raises(LLMClientError):
+        CHAT[flavor](base_url, max_retries=1)
+    assert state.requests == 2
+
+
+@pytest.mark.parametrize("flavor", list(CHAT))
+@pytest.mark.parametrize("stub", [
+    {"raw_body": b""},
+    {"raw_body": b"<html>gateway</html>"},
+    {"raw_body": b'{"choices": []}'},
+    {"raw_body": json.dumps({"choices": [{"message": {"content": None}}]}).encode()},
+], indirect=True)
+def test_malformed_200_raises_client_error(stub, flavor):
+    state, base_url = stub
+    with pytest.raises(LLMClientError, match="Malformed completion"):
+        CHAT[flavor](base_url)
+    assert state.requests == 1  # body เสียไม่ retry
+
+
+def test_async_client_is_per_event_loop():
+    async def get():
+        return get_async_openrouter_client("test-key")
+
+    async def get_twice():
+        return get_async_openrouter_client("test-key") is get_async_openrouter_client("test-key")
+
+    assert asyncio.run(get_twice())
+    assert asyncio.run(get()) is not asyncio.run(get())
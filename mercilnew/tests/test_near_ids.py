@@ -0,0 +1,46 @@
+"""Chunked `ids=` queries (NEAR_IDS_CHUNK) merge back to the same top-k as one query."""
+import numpy as np
+import pytest
+
+import search_pipeline as sp
+
+
+class ExactCollection:
+    """collection.query over a few hundred vectors with exact L2 distances."""
+
+    def __init__(self, n: int, dim: int = 8, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.ids = [f"a{i}" for i in range(n)]
+        self.vectors = rng.normal(size=(n, dim))
+        self.queries = []
+
+    def query(self, query_embeddings, n_results, where=None, ids=None, include=()):
+        self.queries.append(len(ids))
+        rows = [self.ids.index(i) for i in ids]
+        out = {"ids": [], "distances": []}
+        for q in np.asarray(query_embeddings):
+            distances = ((self.vectors[rows] - q) ** 2).sum(axis=1)
+            top = np.argsort(distances, kind="stable")[:n_results]
+            out["ids"].append([ids[i] for i in top])
+            out["distances"].append([float(distances[i]) for i in top])
+        return out
+
+
+@pytest.fixture
+def chroma_only(monkeypatch):
+    monkeypatch.setattr(sp, "retrieval_index", None)
+    monkeypatch.setattr(sp, "metadata_store", object())  # include=["distances"] เหมือนตอนมี columnar store
+
+
+def test_chunked_ids_match_single_query(chroma_only, monkeypatch):
+    collection = ExactCollection(300)
+    queries = np.random.default_rng(1).normal(size=(3, 8))
+    ids = collection.ids[::2]
+
+    monkeypatch.setattr(sp, "NEAR_IDS_CHUNK", 1000)
+    single = sp._query_rows(collection, queries, 20, None, ids)
+    monkeypatch.setattr(sp, "NEAR_IDS_CHUNK", 40)
+    chunked = sp._query_rows(collection, queries, 20, None, ids)
+
+    assert chunked == single
+    assert max(collection.queries[1:]) <= 40 and len(collection.queries) == 1 + 4
@@ -0,0 +1,60 @@
+"""Checkpoint / resume behaviour of poi_enrichment.enrich_parallel."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from poi_enrichment import Checkpoint, PoiBuffers, RateLimitedMaps, TokenBucket, enrich_parallel
+
+POI_TYPES = {"school": "school", "cafe": "cafe"}
+
+
+def properties(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": [str(i) for i in range(n)],
+        "location_latitude": np.linspace(13.7, 13.8, n),
+        "location_longitude": np.linspace(100.5, 100.6, n),
+    })
+
+
+def counting_resolver(calls: list):
+    def resolve(maps, lat, lon, poi_type):
+        calls.append((round(lat, 6), poi_type))
+        return {"distance": 100.0, "name": f"{poi_type} near"}
+    return resolve
+
+
+def run(df: pd.DataFrame, checkpoint: Checkpoint, calls: list, **kwargs) -> PoiBuffers:
+    return enrich_parallel(df, POI_TYPES, counting_resolver(calls), RateLimitedMaps(object(), TokenBucket(1000)),
+                           workers=2, checkpoint=checkpoint, checkpoint_every=1, **kwargs)
+
+
+@pytest.mark.parametrize("tail", ["2,5", "2,100.0,school near,100.0,caf"])
+def test_resume_refetches_row_cut_short_by_a_crash(tmp_path, tail):
+    df = properties(3)
+    checkpoint = Checkpoint(tmp_path / "poi.partial.csv")
+    checkpoint.append(PoiBuffers(df["id"].to_numpy()[:2], list(POI_TYPES)).to_frame())
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write(tail)  # โปรแกรมตายระหว่างเขียนแถวของ id 2
+
+    calls: list = []
+    buffers = run(df, checkpoint, calls, resume=True)
+    assert {lat for lat, _ in calls} == {round(df["location_latitude"][2], 6)}
+    assert buffers.done.all()
+
+    # แถวที่ขาดถูกตัดทิ้ง และแถวใหม่เริ่มบรรทัดใหม่: resume อีกรอบไม่ต้องดึงอะไรเพิ่ม
+    calls.clear()
+    run(df, checkpoint, calls, resume=True)
+    assert calls == []
+
+
+def test_existing_checkpoint_needs_resume_or_overwrite(tmp_path):
+    df = properties(2)
+    checkpoint = Checkpoint(tmp_path / "poi.partial.csv")
+    run(df, checkpoint, [])
+    with pytest.raises(FileExistsError):
+        run(df, checkpoint, [])
+    assert checkpoint.path.exists()
+
+    calls: list = []
+    run(df, checkpoint, calls, overwrite=True)
+    assert len(calls) == len(df) * len(POI_TYPES)
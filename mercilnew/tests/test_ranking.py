@@ -0,0 +1,78 @@
+"""RerankEngine (vectorized) vs the original per-candidate scoring loop."""
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from search_pipeline import apply_nice_to_have_boost, compute_intent_match_score, rerank_engine
+
+
+def scalar_rank(candidates: List[Dict[str, Any]], intent: Dict[str, Any]) -> List[tuple]:
+    """The original loop of rank_and_explain (before ranking.py), as the reference."""
+    ranked = []
+    for r in candidates:
+        meta = r["metadata"]
+        lifestyle_score = float(meta.get("lifestyle_score", 0))
+        intent_score, _, _ = compute_intent_match_score(meta, intent)
+        nice_boost, _ = apply_nice_to_have_boost(meta, intent)
+        final_score = ((intent_score * 0.7) + (r["semantic_score"] * 0.2) + (lifestyle_score * 0.05) + (nice_boost * 0.05))
+        ranked.append((r["id"], intent_score, nice_boost, final_score))
+    ranked.sort(key=lambda x: x[3], reverse=True)
+    return ranked
+
+
+def candidate(asset_id: str, semantic: float, **meta) -> Dict[str, Any]:
+    return {"id": asset_id, "semantic_score": semantic, "metadata": meta}
+
+
+CANDIDATES = [
+    candidate("condo-bts", 0.81, asset_type_id=3, pet_friendly=False, lifestyle_score=6.5, bts_station=400.0, shopping_mall=900.0, veterinary=2500.0),
+    # ซ้ำกับแถวบนทุกอย่าง: คะแนนเท่ากัน ต้องเรียงตามลำดับเดิม
+    candidate("condo-bts-twin", 0.81, asset_type_id=3, pet_friendly=False, lifestyle_score=6.5, bts_station=400.0, shopping_mall=900.0, veterinary=2500.0),
+    candidate("house-pet", 0.62, asset_type_id=4, pet_friendly=True, lifestyle_score=3.0, school=1500.0, market=300.0, veterinary=2000.0),
+    candidate("house-float-id", 0.62, asset_type_id=4.0, lifestyle_score=3.0, school=1500.0, market=300.0, veterinary=1999.0),
+    candidate("townhome-edge", 0.55, asset_type_id=1, pet_friendly=False, lifestyle_score=0.0, bts_station=1200.0, market=2000.0),
+    candidate("semi-detached", 0.55, asset_type_id=15, lifestyle_score=2.5, hospital=800.0),
+    # ไม่มี field เลย: asset_type_id=0, ไม่มี POI, ไม่มี lifestyle
+    candidate("no-metadata", 0.9),
+    candidate("pet-string", 0.4, asset_type_id=5, pet_friendly="True", lifestyle_score=1.0, park=100.0),
+    candidate("land", 0.3, asset_type_id=7, lifestyle_score=9.0, bts_station=50.0, mrt=50.0),
+    candidate("far-everything", 0.3, asset_type_id=3, lifestyle_score=9.0, bts_station=8000.0, mrt=8000.0, school=8000.0),
+]
+
+
+def intent(asset_types=(), must_have=(), nice_to_have=(), avoid_poi=(), pet_friendly=None) -> Dict[str, Any]:
+    return {
+        "asset_types": list(asset_types), "must_have": list(must_have), "nice_to_have": list(nice_to_have),
+        "avoid_poi": list(avoid_poi), "pet_friendly": pet_friendly, "price_range": {"min": None, "max": None},
+    }
+
+
+INTENTS = {
+    "empty": intent(),
+    "condo_near_bts": intent(["คอนโด"], must_have=["bts_station"]),
+    "house_pet": intent(["บ้านเดี่ยว", "บ้านแฝด"], pet_friendly=True, avoid_poi=["market"]),
+    "condo_pet": intent(["คอนโด"], pet_friendly=True),
+    "pet_no_type": intent(pet_friendly=True, nice_to_have=["park", "school"]),
+    "no_pets": intent(pet_friendly=False, must_have=["mrt", "unknown_poi"]),
+    "everything": intent(["ทาวน์โฮม", "ที่ดิน"], must_have=["bts_station", "school"], nice_to_have=["shopping_mall", "hospital"], avoid_poi=["market", "unknown_poi"], pet_friendly=True),
+}
+
+
+@pytest.mark.parametrize("name", list(INTENTS))
+def test_vectorized_scores_and_order_match_scalar(name):
+    query_intent = INTENTS[name]
+    expected = scalar_rank(CANDIDATES, query_intent)
+
+    arrays = rerank_engine.from_results(CANDIDATES)
+    intent_scores, nice_boosts, final_scores = rerank_engine.score(arrays, query_intent)
+    order = rerank_engine.order(final_scores)
+    actual = [(CANDIDATES[i]["id"], float(intent_scores[i]), float(nice_boosts[i]), float(final_scores[i])) for i in order]
+
+    assert [a[0] for a in actual] == [e[0] for e in expected]
+    assert actual == expected  # bit-for-bit, ไม่ใช่แค่ใกล้เคียง
+
+
+def test_ties_keep_input_order():
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1])
+    assert rerank_engine.order(scores).tolist() == [1, 3, 0, 2, 4]
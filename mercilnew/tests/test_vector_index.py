@@ -0,0 +1,71 @@
+"""vector_index export (whole-directory swap) and the HNSW filtered search."""
+import json
+
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import ExactIndex, HnswIndex, export_collection, export_status
+
+
+class FakeCollection:
+    """The parts of a Chroma collection export_collection reads."""
+
+    def __init__(self, vectors: np.ndarray, name: str = "fake", collection_id: str = "c1"):
+        self.name, self.id = name, collection_id
+        self.metadata, self.configuration = {"hnsw:space": "l2"}, {}
+        self.vectors = vectors
+        self.ids = [f"id{i}" for i in range(len(vectors))]
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def get(self, include, limit, offset):
+        rows = range(offset, min(offset + limit, len(self.ids)))
+        return {"ids": [self.ids[i] for i in rows], "embeddings": self.vectors[list(rows)],
+                "metadatas": [{"content_hash": f"h{i}"} for i in rows]}
+
+
+def vectors(n: int, dim: int = 8, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_export_replaces_whole_directory(tmp_path):
+    out = tmp_path / "index"
+    export_collection(FakeCollection(vectors(30)), out, page_size=7)
+    (out / "hnsw.bin").write_bytes(b"graph of the old export")
+
+    collection = FakeCollection(vectors(12, seed=1), collection_id="c2")
+    export_collection(collection, out, page_size=7)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index"]
+    assert sorted(p.name for p in out.iterdir()) == ["ids.json", "meta.json", "vectors.f32"]
+    assert json.loads((out / "ids.json").read_text()) == collection.ids
+    assert export_status(out, collection) is not None
+    assert np.array_equal(ExactIndex(out).vectors, collection.vectors)
+
+
+def test_failed_export_keeps_previous_one(tmp_path, monkeypatch):
+    out = tmp_path / "index"
+    collection = FakeCollection(vectors(30))
+    export_collection(collection, out)
+
+    def crash(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(vector_index, "_replace_dir", crash)
+    with pytest.raises(OSError):
+        export_collection(FakeCollection(vectors(12, seed=1), collection_id="c2"), out)
+    assert export_status(out, collection) is not None
+    assert json.loads((out / "ids.json").read_text()) == collection.ids
+
+
+def test_hnsw_filter_only_returns_allowed_rows(tmp_path):
+    pytest.importorskip("hnswlib")
+    out = export_collection(FakeCollection(vectors(400)), tmp_path / "index")
+    index = HnswIndex(out, exact_max_rows=10)
+    allowed = np.zeros(400, dtype=bool)
+    allowed[::3] = True
+    queries = vectors(5, seed=2)
+    for (rows, _), (exact_rows, _) in zip(index.search(queries, 10, allowed), index.exact.search(queries, 10, allowed)):
+        assert allowed[rows].all()
+        assert len(set(rows) & set(exact_rows)) >= 8
@@ -0,0 +1,267 @@
+"""
+In-process vector retrieval over an export of the Chroma collection, used
+by search_pipeline.py instead of collection.query when RETRIEVAL_ENGINE is
+not "chroma".
+
+The export is one directory holding
+  vectors.f32  raw float32 rows, read through np.memmap
+  ids.json     asset id of each row
+  meta.json    {"collection", "collection_id", "count", "dim", "space", "fingerprint"}
+  hnsw.bin     hnswlib graph (hnsw engine only), built on first load
+
+Engines:
+  exact  NumPy matmul over the memory map: all rows, or only the rows a
+         filter allows
+  hnsw   hnswlib graph (pip install hnswlib). A filter is passed to hnswlib
+         as the allowed-row mask; filters that leave at most
+         VECTOR_EXACT_MAX_ROWS rows are searched exactly instead
+  auto   exact up to VECTOR_EXACT_MAX_ROWS rows, hnsw above
+
+Distances follow the collection's space (l2 = squared euclidean, cosine,
+ip), the same values Chroma returns, so semantic scores are comparable. The
+export is written to a temporary directory and swapped into place whole, so
+vectors, ids and meta always come from the same export. It is a snapshot;
+its fingerprint (over every row's id and content_hash) tells a stale export
+apart even after an incremental build that kept the row count, and
+search_pipeline re-exports on mismatch.
+
+    python vector_index.py export --db_path npa_vectorstore --collection npa_assets_v2 --out npa_vector_index
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from content_fingerprint import ContentFingerprint, collection_fingerprint
+
+logger = logging.getLogger("vector_index")
+
+# catalogue (หรือจำนวนแถวที่ผ่าน filter) ไม่เกินนี้ใช้ exact search
+VECTOR_EXACT_MAX_ROWS = int(os.getenv("VECTOR_EXACT_MAX_ROWS", "50000"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "128"))
+
+SPACES = ("l2", "cosine", "ip")
+ENGINES = ("exact", "hnsw", "auto")
+
+# ผลต่อ query: (rows, distances) เรียงจากใกล้สุด
+Hits = Tuple[np.ndarray, np.ndarray]
+
+
+def collection_space(collection) -> str:
+    """Distance function of a Chroma collection ("l2" unless configured otherwise)."""
+    configuration = getattr(collection, "configuration", None) or {}
+    space = (configuration.get("hnsw") or {}).get("space") or (collection.metadata or {}).get("hnsw:space") or "l2"
+    if space not in SPACES:
+        raise ValueError(f"Unsupported collection space {space!r} (supported: {SPACES})")
+    return space
+
+
+def export_collection(collection, out_dir: Path, page_size: int = 5000) -> Path:
+    """Dump the collection's embeddings and ids, page by page, to out_dir."""
+    out_dir = Path(out_dir)
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    space = collection_space(collection)
+    ids: List[str] = []
+    dim = None
+    fingerprint = ContentFingerprint()
+    # เขียนทั้ง 3 ไฟล์ลง directory ชั่วคราวก่อน แล้วค่อยสลับทั้ง directory:
+    # vectors / ids / meta มาจาก export รอบเดียวกันเสมอ ไม่มีทางเหลื่อมกัน
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    with open(tmp_dir / "vectors.f32", "wb") as f:
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            page_ids = page.get("ids") or []
+            if not page_ids:
+                break
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            dim = dim or int(vectors.shape[1])
+            f.write(np.ascontiguousarray(vectors).tobytes())
+            ids.extend(page_ids)
+            fingerprint.update(page_ids, page["metadatas"])
+            offset += len(page_ids)
+    (tmp_dir / "ids.json").write_text(json.dumps(ids, ensure_ascii=False))
+    (tmp_dir / "meta.json").write_text(json.dumps({
+        "collection": collection.name, "collection_id": str(collection.id), "count": len(ids),
+        "dim": dim or 0, "space": space, "fingerprint": fingerprint.hexdigest(),
+    }))
+    _replace_dir(tmp_dir, out_dir)
+    logger.info(f"✅ Exported {len(ids)} embeddings ({space}, dim {dim}) from '{collection.name}' to {out_dir}")
+    return out_dir
+
+
+def _replace_dir(src: Path, dst: Path) -> None:
+    """
+    Move the finished export src to dst. A crash in between leaves either the
+    old export, the new one, or no export at dst (export_status -> None, so
+    search_pipeline exports again), never a mix of the two.
+    """
+    old = dst.with_name(dst.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if dst.exists():
+        dst.rename(old)
+    src.rename(dst)
+    shutil.rmtree(old, ignore_errors=True)  # hnsw.bin ของ export เดิมไปพร้อมกัน
+
+
+class ExactIndex:
+    """Brute-force search over the memory-mapped export."""
+
+    def __init__(self, directory: Path):
+        self.dir = Path(directory)
+        meta = json.loads((self.dir / "meta.json").read_text())
+        self.collection = meta["collection"]
+        self.space = meta["space"]
+        self.dim = meta["dim"]
+        self.ids: List[str] = json.loads((self.dir / "ids.json").read_text())
+        if meta["count"] == 0:
+            self.vectors = np.empty((0, self.dim), dtype=np.float32)
+        else:
+            self.vectors = np.memmap(self.dir / "vectors.f32", dtype=np.float32, mode="r", shape=(meta["count"], self.dim))
+        # norm ของทุกแถวคำนวณครั้งเดียว (l2 / cosine)
+        self._sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors) if len(self.vectors) else np.empty(0, dtype=np.float32)
+        self.name = "exact"
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _distances(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        sq_norms = self._sq_norms if rows is None else self._sq_norms[rows]
+        dots = queries @ vectors.T
+        if self.space == "ip":
+            return 1.0 - dots
+        q_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+        if self.space == "cosine":
+            return 1.0 - dots / np.clip(np.sqrt(q_sq) * np.sqrt(sq_norms)[None, :], 1e-12, None)
+        return np.maximum(q_sq + sq_norms[None, :] - 2.0 * dots, 0.0)
+
+    def search(self, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> List[Hits]:
+        """Top-k rows per query, restricted to rows where `allowed` is True."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rows = None if allowed is None else np.flatnonzero(allowed)
+        k = min(k, len(self) if rows is None else len(rows))
+        if k == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        if rows is not None and len(rows) > len(self) // 2:
+            # filter กว้าง: คำนวณทุกแถวแล้วตัดแถวที่ไม่ผ่านทิ้ง ถูกกว่า gather ครึ่งค่อน matrix
+            distances = self._distances(queries, None)
+            distances[:, ~allowed] = np.inf
+            rows = None
+        else:
+            distances = self._distances(queries, rows)
+        n = distances.shape[1]
+        hits = []
+        for d in distances:
+            top = np.argpartition(d, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.lexsort((top, d[top]))]  # ระยะเท่ากัน: แถวน้อยก่อน
+            hits.append((top if rows is None else rows[top], d[top].astype(np.float32)))
+        return hits
+
+
+class HnswIndex:
+    """hnswlib graph over the export; very selective filters go to the exact index."""
+
+    def __init__(self, directory: Path, exact_max_rows: int = VECTOR_EXACT_MAX_ROWS, m: int = HNSW_M,
+                 ef_construction: int = HNSW_EF_CONSTRUCTION, ef_search: int = HNSW_EF_SEARCH):
+        import hnswlib
+
+        self.exact = ExactIndex(directory)
+        self.ids = self.exact.ids
+        self.space = self.exact.space
+        self.exact_max_rows = exact_max_rows
+        self.name = "hnsw"
+        path = self.exact.dir / "hnsw.bin"
+        self.index = hnswlib.Index(space=self.space, dim=self.exact.dim)
+        if path.exists():
+            self.index.load_index(str(path), max_elements=len(self.ids))
+        if not path.exists() or self.index.get_current_count() != len(self.ids):
+            logger.info(f"Building HNSW index over {len(self.ids)} vectors (M={m}, ef_construction={ef_construction})")
+            self.index = hnswlib.Index(space=self.space, dim=self.exact.dim)
+            self.index.init_index(max_elements=max(1, len(self.ids)), M=m, ef_construction=ef_construction)
+            if len(self.ids):
+                self.index.add_items(self.exact.vectors, np.arange(len(self.ids)))
+            self.index.save_index(str(path))
+        # hnswlib ใช้ max(ef, k) ตอน query อยู่แล้ว ไม่ต้อง set_ef ต่อ query (set_ef ไม่ thread-safe)
+        self.index.set_ef(ef_search)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> List[Hits]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n = len(self) if allowed is None else int(allowed.sum())
+        if n <= self.exact_max_rows:
+            return self.exact.search(queries, k, allowed)
+        k = min(k, n)
+        try:
+            if allowed is None:
+                labels, distances = self.index.knn_query(queries, k=k, num_threads=1)
+            else:
+                # bitmap ของแถวที่ผ่าน filter (1 byte ต่อแถว): hnswlib เรียก bytes.__getitem__ ตรง ๆ ไม่ผ่าน lambda
+                labels, distances = self.index.knn_query(queries, k=k, num_threads=1, filter=np.asarray(allowed, dtype=bool).tobytes().__getitem__)
+        except RuntimeError:
+            # graph หา k แถวที่ผ่าน filter ไม่ครบ (filter แคบมาก): กลับไปใช้ exact
+            logger.warning(f"HNSW could not return {k} filtered neighbours, using exact search")
+            return self.exact.search(queries, k, allowed)
+        return [(labels[i].astype(np.int64), distances[i]) for i in range(len(queries))]
+
+
+VectorIndex = Union[ExactIndex, HnswIndex]
+
+
+def load_vector_index(directory: Path, engine: str = "auto", exact_max_rows: int = VECTOR_EXACT_MAX_ROWS) -> VectorIndex:
+    engine = engine.lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown retrieval engine {engine!r} (expected one of {ENGINES} or 'chroma')")
+    if engine == "auto":
+        count = json.loads((Path(directory) / "meta.json").read_text())["count"]
+        engine = "exact" if count <= exact_max_rows else "hnsw"
+    index = ExactIndex(directory) if engine == "exact" else HnswIndex(directory, exact_max_rows)
+    logger.info(f"✅ Vector index loaded: {index.name}, {len(index)} vectors ({index.space}) from {directory}")
+    return index
+
+
+def export_status(directory: Path, collection, fingerprint: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    meta.json of the export if it matches the collection (same collection,
+    row count and content fingerprint), else None. Pass `fingerprint` when
+    it is already known (ColumnarMetadataStore.fingerprint) to skip a pass
+    over the collection's metadata.
+    """
+    meta_path = Path(directory) / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    # build ใหม่ทั้งหมด = collection ใหม่ (id ใหม่); incremental (upsert ทับแถวเดิม) จับได้จาก fingerprint
+    if meta.get("collection_id") != str(collection.id) or meta.get("count") != collection.count():
+        return None
+    if meta.get("fingerprint") != (fingerprint or collection_fingerprint(collection)):
+        return None
+    return meta
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Vector index tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export a Chroma collection's embeddings for RETRIEVAL_ENGINE=exact/hnsw/auto")
+    export.add_argument("--db_path", type=str, default="npa_vectorstore")
+    export.add_argument("--collection", type=str, default="npa_assets_v2")
+    export.add_argument("--out", type=str, default="npa_vector_index")
+    export.add_argument("--page-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=args.db_path).get_collection(name=args.collection)
+    print(f"✅ Exported to {export_collection(collection, Path(args.out), args.page_size)}")